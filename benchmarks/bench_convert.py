@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the request and streaming response converters.
+
+Usage: python benchmarks/bench_convert.py [--repeat 5] [--only NAME] [--output FILE]
+                                          [--compare FILE] [--threshold 0.25]
+
+Times convert_claude_to_openai on synthetic Claude Code histories of 10 to
+2,000 messages (tool_use/tool_result round trips, with a screenshot every ten
+turns) with the conversion cache off, and the streaming converter on chunk
+streams of 10k and 50k text deltas and of multi-megabyte tool call arguments,
+in a few large fragments and in many small ones.
+
+Each case reports operations per second (best of --repeat runs) and, from a
+separate run under tracemalloc, the peak memory allocated during one
+operation. Results are written to benchmarks/results/; with --compare the run
+fails (exit status 1) when a case is slower, or allocates more, than the
+earlier file by more than --threshold.
+"""
+
+import argparse
+import asyncio
+import base64
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["CONVERSION_CACHE_ENABLED"] = "false"
+
+from bench_decode import SOURCE  # noqa: E402
+from bench_load import RESULTS_DIR, git_revision  # noqa: E402
+from src.conversion.request_converter import convert_claude_to_openai  # noqa: E402
+from src.conversion.response_converter import (  # noqa: E402
+    convert_openai_streaming_to_claude_with_cancellation,
+)
+from src.models.claude import ClaudeMessagesRequest  # noqa: E402
+
+HISTORY_SIZES = (10, 100, 500, 2000)
+TEXT_DELTAS = (10_000, 50_000)
+# (argument size in MiB, fragment size in bytes)
+TOOL_ARGUMENTS = ((4, 65536), (1, 32))
+# Each timed run repeats an operation until it has taken at least this long
+MIN_RUN_SECONDS = 0.2
+SCREENSHOT = base64.b64encode(os.urandom(48 * 1024)).decode()
+
+logger = logging.getLogger("bench_convert")
+
+
+def build_history(size: int) -> ClaudeMessagesRequest:
+    """A request whose history has exactly size messages."""
+    messages: List[Dict[str, Any]] = [{"role": "user", "content": "Fix the failing handler tests."}]
+    turn = 0
+    while len(messages) < size:
+        if turn % 10 == 9:
+            messages.append({"role": "assistant", "content": "Let me check how the page renders."})
+            messages.append({"role": "user", "content": [
+                {"type": "text", "text": "Here is the current state of the page."},
+                {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": SCREENSHOT}},
+            ]})
+        else:
+            tool_id = f"toolu_{turn:05d}"
+            messages.append({"role": "assistant", "content": [
+                {"type": "text", "text": "Let me edit the handler."},
+                {"type": "tool_use", "id": tool_id, "name": "Edit", "input": {
+                    "file_path": f"/repo/src/handler_{turn}.py",
+                    "old_string": SOURCE[:600],
+                    "new_string": SOURCE[:700],
+                }},
+            ]})
+            messages.append({"role": "user", "content": [
+                {"type": "tool_result", "tool_use_id": tool_id, "content": [{"type": "text", "text": SOURCE}]},
+            ]})
+        turn += 1
+    return ClaudeMessagesRequest(
+        model="claude-3-5-sonnet-20241022",
+        max_tokens=4096,
+        system=[{"type": "text", "text": "You are a coding assistant."}],
+        messages=messages[:size],
+        tools=[{"name": "Edit", "description": "Edit a file", "input_schema": {"type": "object"}}],
+    )
+
+
+def _chunk(delta: Dict[str, Any], finish_reason=None) -> Dict[str, Any]:
+    return {"choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+
+def _usage(completion_tokens: int) -> Dict[str, Any]:
+    return {"choices": [], "usage": {"prompt_tokens": 1000, "completion_tokens": completion_tokens}}
+
+
+def text_stream(deltas: int) -> List[Dict[str, Any]]:
+    chunks = [_chunk({"role": "assistant", "content": ""})]
+    chunks += [_chunk({"content": "word "}) for _ in range(deltas)]
+    return chunks + [_chunk({}, "stop"), _usage(deltas)]
+
+
+def tool_stream(mebibytes: int, fragment: int) -> List[Dict[str, Any]]:
+    """One Write tool call whose arguments arrive in fragments of the given size."""
+    content = (SOURCE * (mebibytes * 1024 * 1024 // len(SOURCE) + 1))[: mebibytes * 1024 * 1024]
+    arguments = json.dumps({"file_path": "/repo/src/generated.py", "content": content})
+    chunks = [_chunk({"tool_calls": [{
+        "index": 0, "id": "call_bench", "type": "function", "function": {"name": "Write", "arguments": ""},
+    }]})]
+    chunks += [
+        _chunk({"tool_calls": [{"index": 0, "function": {"arguments": arguments[start:start + fragment]}}]})
+        for start in range(0, len(arguments), fragment)
+    ]
+    return chunks + [_chunk({}, "tool_calls"), _usage(len(chunks))]
+
+
+async def _replay(chunks: List[Dict[str, Any]]):
+    for chunk in chunks:
+        yield chunk
+
+
+def stream_case(chunks: List[Dict[str, Any]]) -> Callable[[], Any]:
+    """Convert a recorded chunk stream to SSE events, as the messages endpoint does."""
+    request = build_history(1)
+    loop = asyncio.new_event_loop()
+
+    async def drain():
+        async for _ in convert_openai_streaming_to_claude_with_cancellation(
+            _replay(chunks), request, logger, None, None, "bench"
+        ):
+            pass
+
+    return lambda: loop.run_until_complete(drain())
+
+
+def cases() -> Dict[str, Callable[[], Any]]:
+    built: Dict[str, Callable[[], Any]] = {}
+    for size in HISTORY_SIZES:
+        request = build_history(size)
+        built[f"request {size} messages"] = lambda request=request: convert_claude_to_openai(request, "gpt-4o")
+    for deltas in TEXT_DELTAS:
+        built[f"stream {deltas} text deltas"] = stream_case(text_stream(deltas))
+    for mebibytes, fragment in TOOL_ARGUMENTS:
+        built[f"stream {mebibytes} MiB tool args / {fragment} B"] = stream_case(tool_stream(mebibytes, fragment))
+    return built
+
+
+def measure(operation: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Best operations per second over repeat runs, and peak KiB allocated by one operation."""
+    operation()  # warm up
+    best = float("inf")
+    # Like timeit, keep collector pauses out of the timings
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            number = 0
+            start = time.perf_counter()
+            while True:
+                operation()
+                number += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= MIN_RUN_SECONDS:
+                    break
+            best = min(best, elapsed / number)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        operation()
+        peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return {"ops_per_sec": round(1 / best, 2), "ms_per_op": round(best * 1000, 3), "peak_kib": round(peak / 1024, 1)}
+
+
+def regressions(results: Dict[str, Dict[str, float]], baseline_path: str, threshold: float) -> List[str]:
+    """Cases that got slower or allocate more than the baseline by more than threshold."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\nCompared with {baseline['revision']} ({baseline_path}), threshold {threshold:.0%}:")
+    failures = []
+    for name, result in results.items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            continue
+        speed = result["ops_per_sec"] / before["ops_per_sec"] - 1
+        memory = result["peak_kib"] / before["peak_kib"] - 1 if before["peak_kib"] else 0.0
+        slower, larger = speed < -threshold, memory > threshold
+        flag = " REGRESSION" if slower or larger else ""
+        print(f"  {name:<36}{speed:>+9.1%} ops/s{memory:>+9.1%} peak{flag}")
+        if slower or larger:
+            failures.append(name)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--only", help="run only cases whose name contains this text")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/convert-<revision>-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown or memory growth")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'':<36}{'ops/s':>10}{'ms/op':>12}{'peak KiB':>12}")
+    results = {}
+    for name, operation in cases().items():
+        if args.only and args.only not in name:
+            continue
+        result = results[name] = measure(operation, args.repeat)
+        print(f"{name:<36}{result['ops_per_sec']:>10}{result['ms_per_op']:>12}{result['peak_kib']:>12}")
+
+    revision = git_revision()
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"convert-{revision}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "revision": revision,
+        "python": platform.python_version(),
+        "machine": f"{platform.machine()}, {os.cpu_count()} CPUs",
+        "cases": results,
+    }, indent=2) + "\n")
+    print(f"\nSaved {output}")
+    if args.compare and regressions(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Compare the pydantic and msgspec (FAST_DECODE) paths for /v1/messages bodies.
+
+Usage: python benchmarks/bench_decode.py [--turns 200] [--repeat 20]
+
+Each run decodes a synthetic Claude Code conversation (tool calls editing
+source files and their results) and converts it to an OpenAI request, with
+the conversion cache disabled so every message is walked.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["CONVERSION_CACHE_ENABLED"] = "false"
+
+from src.conversion.request_converter import convert_claude_to_openai  # noqa: E402
+from src.models.claude_fast import decode_messages_request, fast_decode_available  # noqa: E402
+
+SOURCE = "def handler(request):\n    return {'status': 'ok', 'naïve': request.args}\n" * 40
+
+
+def build_body(turns: int) -> bytes:
+    """Serialize a conversation with the given number of tool round trips."""
+    messages = [{"role": "user", "content": "Fix the failing handler tests."}]
+    for turn in range(turns):
+        messages.append({
+            "role": "assistant",
+            "content": [
+                {"type": "text", "text": "Let me look at the handler."},
+                {
+                    "type": "tool_use",
+                    "id": f"toolu_{turn:05d}",
+                    "name": "Edit",
+                    "input": {
+                        "file_path": f"/repo/src/handler_{turn}.py",
+                        "old_string": SOURCE[:600],
+                        "new_string": SOURCE[:700],
+                    },
+                },
+            ],
+        })
+        messages.append({
+            "role": "user",
+            "content": [
+                {
+                    "type": "tool_result",
+                    "tool_use_id": f"toolu_{turn:05d}",
+                    "content": [{"type": "text", "text": SOURCE}],
+                }
+            ],
+        })
+    body = {
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 4096,
+        "system": [{"type": "text", "text": "You are a coding assistant."}],
+        "messages": messages,
+        "tools": [
+            {"name": "Edit", "description": "Edit a file", "input_schema": {"type": "object"}},
+        ],
+        "stream": True,
+    }
+    return json.dumps(body).encode("utf-8")
+
+
+def measure(body: bytes, fast: bool, convert: bool, repeat: int) -> float:
+    """Median wall time in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        request = decode_messages_request(body, fast=fast)
+        if convert:
+            convert_claude_to_openai(request, "gpt-4o")
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=200, help="tool round trips in the history")
+    parser.add_argument("--repeat", type=int, default=20, help="iterations per measurement")
+    args = parser.parse_args()
+
+    if not fast_decode_available():
+        print("msgspec is not installed; install the 'fast' extra to compare both paths")
+        sys.exit(1)
+
+    body = build_body(args.turns)
+    print(f"Body: {len(body) / 1024:.0f} KiB, {2 * args.turns + 1} messages, median of {args.repeat}")
+    print(f"{'':<20}{'pydantic':>12}{'msgspec':>12}{'speedup':>10}")
+    for label, convert in (("decode", False), ("decode + convert", True)):
+        slow = measure(body, fast=False, convert=convert, repeat=args.repeat)
+        fast = measure(body, fast=True, convert=convert, repeat=args.repeat)
+        print(f"{label:<20}{slow:>10.2f}ms{fast:>10.2f}ms{slow / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark for /v1/messages against a mock upstream.
+
+Usage: python benchmarks/bench_load.py [--concurrency 1,8,32] [--duration 10] [--mode stream,non-stream]
+                                       [--ttft 0.2] [--tokens-per-second 100] [--tokens 50] [--turns 20]
+                                       [--tool-calls] [--error-rate 0.0] [--stall 0.0]
+                                       [--output FILE] [--compare FILE]
+
+Starts the mock upstream (benchmarks/mock_upstream.py) in this process and
+the proxy as a subprocess pointed at it, then keeps each concurrency level
+busy for --duration seconds with closed-loop clients. Every prompt carries a
+"[request N]" tag, so the time the upstream spent on a request can be
+subtracted from what the client saw: the added latency is the proxy's own
+overhead (including any retries). Time to first token is compared the same
+way for streams.
+
+Per level it reports p50/p99 added latency, throughput, proxy CPU per output
+token and proxy RSS (read from /proc, so Linux only). Results are written to
+benchmarks/results/ as JSON, named after the commit; pass an earlier file to
+--compare to see the difference. Proxy settings come from the environment,
+e.g. FAST_DECODE=true python benchmarks/bench_load.py.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+# bench_decode turns the conversion cache off for itself; the proxy keeps its configured settings
+PROXY_ENVIRONMENT = dict(os.environ)
+
+from bench_decode import build_body  # noqa: E402
+from mock_upstream import MockUpstream  # noqa: E402
+
+WARMUP_REQUESTS = 20
+# Metrics compared by --compare, and whether a lower value is better
+COMPARED = (
+    ("added_p50_ms", True),
+    ("added_p99_ms", True),
+    ("added_ttft_p50_ms", True),
+    ("throughput_rps", False),
+    ("cpu_us_per_token", True),
+    ("rss_mib", True),
+)
+
+
+class Result:
+    """Client-side outcome of one request."""
+
+    __slots__ = ("tag", "ok", "started", "first_token", "finished")
+
+    def __init__(self, tag: int, started: float):
+        self.tag = tag
+        self.ok = False
+        self.started = started
+        self.first_token: Optional[float] = None
+        self.finished: Optional[float] = None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=ROOT).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{revision}-dirty" if dirty else revision
+
+
+def cpu_seconds(pid: int) -> Optional[float]:
+    """User plus system CPU time of a process, from /proc."""
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            fields = stat.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def memory_mib(pid: int) -> Dict[str, Optional[float]]:
+    """Current and peak resident set size of a process, from /proc."""
+    sizes: Dict[str, Optional[float]] = {"VmRSS": None, "VmHWM": None}
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                name, _, value = line.partition(":")
+                if name in sizes:
+                    sizes[name] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return {"rss_mib": sizes["VmRSS"], "peak_rss_mib": sizes["VmHWM"]}
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def milliseconds(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value * 1000, 2)
+
+
+async def start_proxy(upstream: MockUpstream):
+    """Launch the proxy as a subprocess and wait until it answers /health."""
+    port = free_port()
+    env = dict(
+        PROXY_ENVIRONMENT,
+        OPENAI_API_KEY="benchmark",
+        OPENAI_BASE_URL=upstream.base_url,
+        HOST="127.0.0.1",
+        PORT=str(port),
+        LOG_LEVEL="WARNING",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "start_proxy.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"{url}/health")
+                return process, url
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Proxy did not start")
+
+
+class LoadGenerator:
+    """Sends tagged /v1/messages requests and matches them with the upstream's records."""
+
+    def __init__(self, url: str, upstream: MockUpstream, turns: int):
+        self.url = url
+        self.upstream = upstream
+        self.template = json.loads(build_body(turns)) if turns else {
+            "model": "claude-3-5-sonnet-20241022",
+            "max_tokens": 1024,
+            "messages": [],
+        }
+        # Text next to tool results is not forwarded, so the tag goes in a turn of its own
+        if self.template["messages"]:
+            self.template["messages"].append({"role": "assistant", "content": "Done."})
+        self.next_tag = 0
+
+    def body(self, stream: bool):
+        """A fresh tag and the template conversation ending in a user turn that carries it."""
+        self.next_tag += 1
+        messages = self.template["messages"] + [{"role": "user", "content": f"[request {self.next_tag}] Continue."}]
+        return self.next_tag, {**self.template, "messages": messages, "stream": stream}
+
+    async def send(self, client: httpx.AsyncClient, stream: bool) -> Result:
+        tag, body = self.body(stream)
+        result = Result(tag, time.perf_counter())
+        if not stream:
+            response = await client.post("/v1/messages", json=body)
+            result.finished = result.first_token = time.perf_counter()
+            result.ok = response.status_code == 200
+            return result
+        async with client.stream("POST", "/v1/messages", json=body) as response:
+            result.ok = response.status_code == 200
+            async for line in response.aiter_lines():
+                if line.startswith("event: content_block_delta") and result.first_token is None:
+                    result.first_token = time.perf_counter()
+                elif line.startswith("event: error"):
+                    result.ok = False
+        result.finished = time.perf_counter()
+        return result
+
+    async def run_level(self, stream: bool, concurrency: int, duration: float, pid: int) -> Dict[str, Any]:
+        """Keep concurrency clients busy for duration seconds and summarize the level."""
+        results: List[Result] = []
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+        async with httpx.AsyncClient(base_url=self.url, timeout=300, limits=limits) as client:
+            async def worker(deadline: float):
+                while time.perf_counter() < deadline:
+                    try:
+                        results.append(await self.send(client, stream))
+                    except httpx.HTTPError:
+                        pass
+
+            first_record = len(self.upstream.records)
+            cpu_before = cpu_seconds(pid)
+            started = time.perf_counter()
+            deadline = started + duration
+            await asyncio.gather(*(worker(deadline) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+            cpu_after = cpu_seconds(pid)
+
+        records = {}
+        for record in self.upstream.records[first_record:]:
+            # A retried request is matched with its last (answered) attempt
+            records[record.tag] = record
+        attempts = len(self.upstream.records) - first_record
+        added, added_ttft, latencies = [], [], []
+        completed = [result for result in results if result.ok]
+        for result in completed:
+            record = records.get(result.tag)
+            if record is None or record.finished is None:
+                continue
+            latencies.append(result.finished - result.started)
+            added.append((result.finished - result.started) - (record.finished - record.started))
+            if stream and result.first_token is not None and record.first_token is not None:
+                added_ttft.append((result.first_token - result.started) - (record.first_token - record.started))
+
+        output_tokens = len(completed) * self.upstream.chunks
+        cpu = None if cpu_before is None or cpu_after is None else cpu_after - cpu_before
+        return {
+            "mode": "stream" if stream else "non-stream",
+            "concurrency": concurrency,
+            "requests": len(results),
+            "errors": len(results) - len(completed),
+            "upstream_attempts": attempts,
+            "throughput_rps": round(len(completed) / elapsed, 2),
+            "output_tokens_per_second": round(output_tokens / elapsed, 1),
+            "latency_p50_ms": milliseconds(percentile(latencies, 0.5)),
+            "latency_p99_ms": milliseconds(percentile(latencies, 0.99)),
+            "added_p50_ms": milliseconds(percentile(added, 0.5)),
+            "added_p99_ms": milliseconds(percentile(added, 0.99)),
+            "added_ttft_p50_ms": milliseconds(percentile(added_ttft, 0.5)),
+            "added_ttft_p99_ms": milliseconds(percentile(added_ttft, 0.99)),
+            "cpu_percent": None if cpu is None else round(cpu / elapsed * 100, 1),
+            "cpu_us_per_token": None if cpu is None or not output_tokens else round(cpu / output_tokens * 1e6, 1),
+            **{name: None if value is None else round(value, 1) for name, value in memory_mib(pid).items()},
+        }
+
+
+def print_level(level: Dict[str, Any]) -> None:
+    def show(value, suffix=""):
+        return "n/a" if value is None else f"{value}{suffix}"
+
+    print(
+        f"{level['mode']:<11}{level['concurrency']:>5}{level['requests']:>8}{level['errors']:>7}"
+        f"{show(level['throughput_rps']):>9}{show(level['added_p50_ms']):>10}{show(level['added_p99_ms']):>10}"
+        f"{show(level['added_ttft_p50_ms']):>10}{show(level['cpu_us_per_token']):>10}{show(level['rss_mib']):>9}"
+    )
+
+
+def compare(levels: List[Dict[str, Any]], baseline_path: str) -> None:
+    baseline = json.loads(Path(baseline_path).read_text())
+    previous = {(level["mode"], level["concurrency"]): level for level in baseline["levels"]}
+    print(f"\nCompared with {baseline['revision']} ({baseline_path}):")
+    for level in levels:
+        before = previous.get((level["mode"], level["concurrency"]))
+        if before is None:
+            continue
+        changes = []
+        for name, lower_is_better in COMPARED:
+            old, new = before.get(name), level.get(name)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            better = change < 0 if lower_is_better else change > 0
+            changes.append(f"{name} {old} -> {new} ({change:+.1f}%{'' if better or abs(change) < 1 else ' worse'})")
+        print(f"  {level['mode']} x{level['concurrency']}: " + "; ".join(changes))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--mode", default="stream,non-stream", help="stream, non-stream or both")
+    parser.add_argument("--ttft", type=float, default=0.2, help="upstream seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="upstream generation speed")
+    parser.add_argument("--tokens", type=int, default=50, help="output tokens (chunks) per response")
+    parser.add_argument("--turns", type=int, default=20, help="tool round trips in each request's history")
+    parser.add_argument("--tool-calls", action="store_true", help="upstream answers with tool call streams")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls that fail")
+    parser.add_argument("--stall", type=float, default=0.0, help="seconds the upstream stalls mid-response")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<revision>-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare with")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    upstream = await MockUpstream(
+        ttft=args.ttft, chunk_interval=1 / args.tokens_per_second, chunks=args.tokens,
+        tool_calls=args.tool_calls, error_rate=args.error_rate, stall=args.stall, seed=0,
+    ).start()
+    process, url = await start_proxy(upstream)
+    generator = LoadGenerator(url, upstream, args.turns)
+    modes = [mode.strip() for mode in args.mode.split(",")]
+    concurrencies = [int(value) for value in args.concurrency.split(",")]
+    print(f"Proxy {url} -> mock upstream {upstream.base_url}, {args.duration:g}s per level")
+    print(f"{'mode':<11}{'conc':>5}{'reqs':>8}{'errors':>7}{'req/s':>9}{'add p50':>10}{'add p99':>10}"
+          f"{'ttft p50':>10}{'cpu us/t':>10}{'rss MiB':>9}")
+    levels = []
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+            for _ in range(WARMUP_REQUESTS):
+                await generator.send(client, stream=True)
+        for mode in modes:
+            for concurrency in concurrencies:
+                level = await generator.run_level(mode == "stream", concurrency, args.duration, process.pid)
+                print_level(level)
+                levels.append(level)
+    finally:
+        process.terminate()
+        process.wait()
+        await upstream.stop()
+
+    revision = git_revision()
+    result = {
+        "revision": revision,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.machine()}, {os.cpu_count()} CPUs",
+        "settings": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        "levels": levels,
+    }
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"{revision}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2) + "\n")
+    print(f"\nSaved {output}")
+    if args.compare:
+        compare(levels, args.compare)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
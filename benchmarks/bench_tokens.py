@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Measure /v1/messages/count_tokens throughput.
+
+Usage: python benchmarks/bench_tokens.py [--turns 200] [--repeat 20] [--model gpt-4o]
+
+Counts a synthetic Claude Code conversation (tool calls editing source files
+and their results) with the tokenizer of the given upstream model, without
+and with the per-block count cache (as when count_tokens is called again for
+the same conversation), and with the four-characters-per-token estimate for
+comparison. The tokenizer rows need tiktoken and the model's vocabulary in
+TOKENIZER_VOCAB_DIR.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from bench_decode import build_body  # noqa: E402
+from src.core.tokenizer import token_counter  # noqa: E402
+from src.models.claude import ClaudeTokenCountRequest  # noqa: E402
+
+
+def measure(request: ClaudeTokenCountRequest, encoding, repeat: int):
+    """Median wall time in milliseconds and the token count."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = token_counter.count(request, encoding)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=200, help="tool round trips in the history")
+    parser.add_argument("--repeat", type=int, default=20, help="iterations per measurement")
+    parser.add_argument("--model", default="gpt-4o", help="upstream model whose tokenizer is used")
+    args = parser.parse_args()
+
+    body = build_body(args.turns)
+    request = ClaudeTokenCountRequest(**json.loads(body))
+    encoding = token_counter.encoding_for(args.model)
+    print(f"Body: {len(body) / 1024:.0f} KiB, {2 * args.turns + 1} messages, median of {args.repeat}")
+    print(f"{'':<12}{'tokens':>10}{'time':>12}{'MiB/s':>10}{'Mtok/s':>10}")
+    rows = [("estimate", None, 0)]
+    if encoding is not None:
+        rows[:0] = [(encoding.name, encoding, 0), ("cached", encoding, token_counter.max_entries)]
+    cache_size = token_counter.max_entries
+    for label, row_encoding, token_counter.max_entries in rows:
+        elapsed, tokens = measure(request, row_encoding, args.repeat)
+        rate = len(body) / 1024 / 1024 / (elapsed / 1000)
+        print(f"{label:<12}{tokens:>10}{elapsed:>10.2f}ms{rate:>10.1f}{tokens / elapsed / 1000:>10.2f}")
+    token_counter.max_entries = cache_size
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Minimal OpenAI-compatible upstream for benchmarks.
+
+Serves POST /v1/chat/completions over raw asyncio sockets (HTTP/1.1 with
+keep-alive) and records, for every request, when it arrived, when the first
+byte and the first token were sent and when the proxy closed the connection.
+Timings use time.perf_counter(), so they are comparable with measurements
+taken in the same process. A "[request N]" tag anywhere in the prompt is
+recorded too, so a load generator can match upstream requests to its own.
+
+Usage: python benchmarks/mock_upstream.py [--port 9911] [--ttft 0.2] [--chunk-interval 0.02] [--chunks 50]
+                                          [--tool-calls] [--error-rate 0.0] [--stall 0.0]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from typing import List, Optional, Set
+
+# Tag a load generator puts in its prompts to find the matching upstream request
+REQUEST_TAG = re.compile(rb"\[request (\d+)\]")
+
+
+class RequestRecord:
+    """Timeline of one upstream request."""
+
+    __slots__ = ("stream", "tag", "status", "started", "first_byte", "first_token", "finished", "closed")
+
+    def __init__(self, stream: bool, tag: Optional[int] = None):
+        self.stream = stream
+        self.tag = tag
+        self.status = 200
+        self.started = time.perf_counter()
+        self.first_byte: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.closed: Optional[float] = None
+
+
+class MockUpstream:
+    """Scriptable chat completions server.
+
+    Each response waits ``ttft`` seconds, then produces ``chunks`` text
+    deltas ``chunk_interval`` seconds apart (streamed as SSE, or all at once
+    for non-streaming requests). With ``tool_calls`` the deltas are the
+    arguments of one tool call instead. A fraction ``error_rate`` of
+    requests fail with ``error_status``, and ``stall`` seconds of silence
+    are inserted halfway through every response.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, ttft: float = 0.0,
+                 chunk_interval: float = 0.0, chunks: int = 5, text: str = "tok ",
+                 tool_calls: bool = False, error_rate: float = 0.0, error_status: int = 500,
+                 stall: float = 0.0, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.ttft = ttft
+        self.chunk_interval = chunk_interval
+        self.chunks = chunks
+        self.text = text
+        self.tool_calls = tool_calls
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stall = stall
+        self._random = random.Random(seed)
+        self.records: List[RequestRecord] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.StreamWriter] = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> "MockUpstream":
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        # Close idle keep-alive connections so their handlers end instead of being cancelled
+        for writer in list(self._connections):
+            writer.close()
+        for _ in range(100):
+            if not self._connections:
+                break
+            await asyncio.sleep(0.01)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # First byte of the next request, if the close watch below read it
+        pending = b""
+        self._connections.add(writer)
+        try:
+            while True:
+                head = pending + await reader.readuntil(b"\r\n\r\n")
+                headers = {}
+                for line in head.decode("latin-1").split("\r\n")[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                request = json.loads(body or b"{}")
+                tag = REQUEST_TAG.search(body)
+                record = RequestRecord(bool(request.get("stream")), int(tag.group(1)) if tag else None)
+                self.records.append(record)
+
+                # Notice the proxy closing the connection while the response is produced
+                eof = asyncio.ensure_future(reader.read(1))
+                respond = asyncio.ensure_future(self._respond(writer, request, record))
+                await asyncio.wait([eof, respond], return_when=asyncio.FIRST_COMPLETED)
+                if not respond.done():
+                    record.closed = time.perf_counter()
+                    respond.cancel()
+                    return
+                # Let the cancelled read finish before the next readuntil() on this reader
+                eof.cancel()
+                await asyncio.wait([eof])
+                pending = b"" if eof.cancelled() else eof.result()
+                if respond.exception() is not None:
+                    record.closed = time.perf_counter()
+                    return
+                record.finished = time.perf_counter()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    def _chunk(self, model: str, delta: dict, finish_reason: Optional[str] = None, usage=None) -> bytes:
+        payload = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage:
+            payload["usage"] = usage
+        data = f"data: {json.dumps(payload)}\n\n".encode()
+        return b"%x\r\n%s\r\n" % (len(data), data)
+
+    def _delta(self, index: int) -> dict:
+        """Delta number index of the response (0 opens the tool call)."""
+        if not self.tool_calls:
+            return {"content": self.text}
+        call = {"index": 0, "function": {"arguments": self.text if index else ""}}
+        if index == 0:
+            call.update(id="call_mock", type="function")
+            call["function"]["name"] = "mock_tool"
+        return {"tool_calls": [call]}
+
+    async def _pause(self, index: int) -> None:
+        await asyncio.sleep(self.chunk_interval)
+        if self.stall and index == self.chunks // 2:
+            await asyncio.sleep(self.stall)
+
+    def _message(self) -> dict:
+        if not self.tool_calls:
+            return {"role": "assistant", "content": self.text * self.chunks}
+        arguments = self.text * self.chunks
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": "call_mock", "type": "function",
+                "function": {"name": "mock_tool", "arguments": arguments},
+            }],
+        }
+
+    async def _respond(self, writer: asyncio.StreamWriter, request: dict, record: RequestRecord):
+        model = request.get("model", "mock")
+        usage = {"prompt_tokens": 10, "completion_tokens": self.chunks, "total_tokens": 10 + self.chunks}
+        finish_reason = "tool_calls" if self.tool_calls else "stop"
+        await asyncio.sleep(self.ttft)
+        if self.error_rate and self._random.random() < self.error_rate:
+            record.status = self.error_status
+            body = json.dumps({"error": {"message": "mock upstream error", "type": "server_error"}}).encode()
+            writer.write(
+                b"HTTP/1.1 %d Error\r\nContent-Type: application/json\r\n"
+                b"Content-Length: %d\r\n\r\n%s" % (self.error_status, len(body), body)
+            )
+            record.first_byte = time.perf_counter()
+            await writer.drain()
+            return
+        if not record.stream:
+            for index in range(self.chunks):
+                await self._pause(index)
+            body = json.dumps({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": self._message(), "finish_reason": finish_reason}],
+                "usage": usage,
+            }).encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+            )
+            record.first_byte = record.first_token = time.perf_counter()
+            await writer.drain()
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        writer.write(self._chunk(model, {"role": "assistant", "content": ""}))
+        record.first_byte = time.perf_counter()
+        await writer.drain()
+        for index in range(self.chunks):
+            await self._pause(index)
+            writer.write(self._chunk(model, self._delta(index)))
+            if record.first_token is None:
+                record.first_token = time.perf_counter()
+            await writer.drain()
+        writer.write(self._chunk(model, {}, finish_reason=finish_reason))
+        writer.write(self._chunk(model, {}, usage=usage))
+        done = b"data: [DONE]\n\n"
+        writer.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(done), done))
+        await writer.drain()
+
+
+async def _serve(args):
+    upstream = await MockUpstream(
+        args.host, args.port, args.ttft, args.chunk_interval, args.chunks,
+        tool_calls=args.tool_calls, error_rate=args.error_rate, stall=args.stall,
+    ).start()
+    print(f"Mock upstream listening on {upstream.base_url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible upstream")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9911)
+    parser.add_argument("--ttft", type=float, default=0.2, help="seconds before the first chunk")
+    parser.add_argument("--chunk-interval", type=float, default=0.02, help="seconds between chunks")
+    parser.add_argument("--chunks", type=int, default=50, help="text chunks per response")
+    parser.add_argument("--tool-calls", action="store_true", help="stream tool call arguments instead of text")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--stall", type=float, default=0.0, help="seconds of silence halfway through responses")
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
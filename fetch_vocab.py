@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Download the BPE vocabularies used for token counting.
+
+Usage: python fetch_vocab.py [--dir vocab] [ENCODING ...]
+
+Has tiktoken fetch o200k_base and cl100k_base (or the encodings named) into
+the vocabulary directory (TOKENIZER_VOCAB_DIR, default vocab/), which the
+proxy uses as tiktoken's cache (TIKTOKEN_CACHE_DIR). tiktoken checks each
+file against the hash it pins and skips vocabularies already there. The
+proxy itself never downloads vocabularies. Needs the tokenizer extra.
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+import tiktoken
+
+ENCODINGS = ("o200k_base", "cl100k_base")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--dir",
+        default=os.environ.get("TOKENIZER_VOCAB_DIR") or str(Path(__file__).resolve().parent / "vocab"),
+        help="vocabulary directory (default: TOKENIZER_VOCAB_DIR or vocab/)",
+    )
+    parser.add_argument("encodings", nargs="*", metavar="ENCODING", help=f"one of {', '.join(ENCODINGS)} (default: all)")
+    args = parser.parse_args()
+    unknown = sorted(set(args.encodings) - set(ENCODINGS))
+    if unknown:
+        parser.error(f"unknown encoding: {', '.join(unknown)}")
+
+    Path(args.dir).mkdir(parents=True, exist_ok=True)
+    os.environ["TIKTOKEN_CACHE_DIR"] = args.dir
+    for name in args.encodings or ENCODINGS:
+        encoding = tiktoken.get_encoding(name)
+        print(f"{name}: {encoding.n_vocab} tokens in {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,100 @@
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from datetime import datetime
+import asyncio
+import time
 import uuid
 
 from src.core.config import config
-from src.core.logging import logger
+from src.core.logging import logger, bind_request_id
 from src.core.client import OpenAIClient
-from src.models.claude import ClaudeMessagesRequest, ClaudeTokenCountRequest
+from src.core.client_pool import client_pool
+from src.core.circuit_breaker import UpstreamUnavailableError
+from src.core.concurrency import OverloadedError
+from src.core.rate_limit import RateLimitedError
+from src.core.disconnect import DisconnectWatcher
+from src.models.claude import ClaudeTokenCountRequest
+from src.models.claude_fast import decode_messages_request
 from src.conversion.request_converter import convert_claude_to_openai
+from src.conversion.conversion_cache import conversion_cache
 from src.conversion.response_converter import (
     convert_openai_to_claude_response,
     convert_openai_streaming_to_claude_with_cancellation,
+    convert_claude_response_to_sse,
 )
 from src.core.model_manager import model_manager
+from src.core.response_cache import response_cache, canonical_request_key, is_deterministic
+from src.core.hedging import hedger
+from src.core.retry import retry_policy
+from src.core.single_flight import single_flight
+from src.core.tokenizer import token_counter
+from src.core.metrics import metrics
+from src.core.timing import request_timing
 
 router = APIRouter()
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "*",
+}
+
+def _record_failure(series, timer, status_code: int, started: float) -> None:
+    if series is not None:
+        series.finish(status_code, started)
+    if timer is not None:
+        timer.status = status_code
+
+
+async def _primed(stream):
+    """Wait for the first chunk of an upstream stream, then replay it with the rest.
+
+    Admission (rate limit pacing, the bulkhead queue) and upstream rejections
+    happen before the first chunk, so they surface here as errors while a
+    proper status code can still be sent.
+    """
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except BaseException:
+        await stream.aclose()
+        raise
+    return _replay(first, stream)
+
+
+async def _replay(first, stream):
+    try:
+        if first is not None:
+            yield first
+            async for chunk in stream:
+                yield chunk
+    finally:
+        await stream.aclose()
+
+
 @router.post("/v1/messages")
-async def create_message(request: ClaudeMessagesRequest, http_request: Request):
+async def create_message(http_request: Request, response: Response):
+    started = time.monotonic()
+    # Phase breakdown for Server-Timing and the slow request log
+    timer = request_timing.start()
+    body = await http_request.body()
+    if timer is not None:
+        timer.stamp("received")
+    # Decode the body ourselves so the compiled msgspec decoder can replace
+    # pydantic validation when FAST_DECODE is enabled
+    request = decode_messages_request(body, fast=config.fast_decode)
+    series = None
+    # Streams finish their timer once the last event is written
+    timer_handed_off = False
+    if timer is not None:
+        timer.stamp("parsed")
+        timer.model = request.model
+        timer.stream = bool(request.stream)
     try:
         logger.debug(
-            f"Processing Claude request: model={request.model}, stream={request.stream}"
+            "Processing Claude request: model=%s, stream=%s", request.model, request.stream
         )
 
         # Get model-specific configuration from the manager
@@ -28,20 +102,50 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request):
         
         # This is the actual model name to be passed to the provider
         openai_model_name = model_config["model_name"]
+        # Metric children for this tier and upstream model, fetched once per request
+        series = metrics.request_series(model_config["tier"], openai_model_name, bool(request.stream))
 
-        # Dynamically create an OpenAI client for this specific request
-        openai_client = OpenAIClient(
-            api_key=model_config["api_key"],
-            base_url=model_config["base_url"],
-            timeout=config.request_timeout,
-            api_version=model_config["api_version"],
-        )
+        # Load-balanced group of pooled clients serving this model's tier
+        openai_client = model_config["client"]
+        # Race slow calls against a duplicate on routes with hedging enabled
+        hedge = model_config["hedge"]
 
         # Generate a unique ID for this request for cancellation tracking
         request_id = str(uuid.uuid4())
+        bind_request_id(request_id)
 
         # Convert the incoming Claude-formatted request to the OpenAI format
-        openai_request = convert_claude_to_openai(request, openai_model_name)
+        openai_request = convert_claude_to_openai(request, openai_model_name, body)
+        if timer is not None:
+            timer.request_id = request_id
+            timer.stamp("converted")
+
+        # Canonical identity of the upstream call, shared by the cache and single-flight
+        request_key = None
+        if response_cache.enabled or single_flight.enabled:
+            request_key = canonical_request_key(openai_request)
+
+        # Serve deterministic requests from the response cache when enabled
+        cache_key = None
+        if response_cache.enabled and is_deterministic(request):
+            cache_key = request_key
+            cached_response = await response_cache.get(cache_key)
+            if cached_response is not None:
+                logger.debug("Response cache hit for request %s", request_id)
+                cached_response = {**cached_response, "model": request.model}
+                if series is not None:
+                    series.finish(200, started)
+                if request.stream:
+                    cached_events = convert_claude_response_to_sse(cached_response)
+                    if timer is not None:
+                        cached_events = request_timing.time_output(timer, cached_events)
+                        timer_handed_off = True
+                    return StreamingResponse(
+                        cached_events,
+                        media_type="text/event-stream",
+                        headers=SSE_HEADERS,
+                    )
+                return cached_response
 
         # Before making the API call, check if the client has already disconnected
         if await http_request.is_disconnected():
@@ -50,31 +154,73 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request):
 
         if request.stream:
             try:
-                # For streaming responses, create an async generator
-                openai_stream = openai_client.create_chat_completion_stream(
-                    openai_request, request_id
-                )
-                # Stream the converted response back to the client
-                return StreamingResponse(
-                    convert_openai_streaming_to_claude_with_cancellation(
+                async def open_claude_stream(watched_request, shared=False):
+                    # For streaming responses, create an async generator and wait
+                    # until the upstream has admitted it and sent its first chunk
+                    openai_stream = await _primed(
+                        openai_client.create_chat_completion_stream(openai_request, request_id, hedge=hedge)
+                    )
+                    if shared:
+                        # Each subscriber records its own request and timing below;
+                        # the upstream call's tokens are counted once
+                        if series is not None:
+                            openai_stream = series.track_usage(openai_stream)
+                    else:
+                        if series is not None:
+                            openai_stream = series.track_stream(openai_stream, started)
+                        if timer is not None:
+                            openai_stream = request_timing.time_upstream(timer, openai_stream)
+                    return convert_openai_streaming_to_claude_with_cancellation(
                         openai_stream,
                         request,
                         logger,
-                        http_request,
+                        watched_request,
                         openai_client,
                         request_id,
-                    ),
+                        on_complete=(
+                            (lambda message: response_cache.put(cache_key, message))
+                            if cache_key
+                            else None
+                        ),
+                    )
+
+                # Nothing is sent before the stream is open, so a shed or rejected
+                # stream gets the same error response as a non-streaming request
+                async with DisconnectWatcher(http_request) as watcher:
+                    if single_flight.enabled:
+                        # Identical concurrent streams share one upstream call; each
+                        # subscriber detaches on its own disconnect
+                        if timer is not None:
+                            # Followers never reach the upstream; their wait starts here
+                            timer.stamp("upstream_sent")
+                        claude_stream = await watcher.guard(
+                            single_flight.stream(
+                                f"{request_key}:{request.model}", lambda: open_claude_stream(None, shared=True)
+                            )
+                        )
+                        if series is not None:
+                            claude_stream = series.track_subscriber(claude_stream, started)
+                        if timer is not None:
+                            claude_stream = request_timing.time_upstream(timer, claude_stream)
+                    else:
+                        claude_stream = await watcher.guard(open_claude_stream(http_request))
+                if timer is not None:
+                    # The breakdown goes out as a final SSE comment, since headers are long gone
+                    claude_stream = request_timing.time_output(timer, claude_stream)
+                    timer_handed_off = True
+
+                # Stream the converted response back to the client
+                return StreamingResponse(
+                    claude_stream,
                     media_type="text/event-stream",
-                    headers={
-                        "Cache-Control": "no-cache",
-                        "Connection": "keep-alive",
-                        "Access-Control-Allow-Origin": "*",
-                        "Access-Control-Allow-Headers": "*",
-                    },
+                    headers=SSE_HEADERS,
                 )
+            except (OverloadedError, RateLimitedError, UpstreamUnavailableError):
+                raise
             except HTTPException as e:
                 # Handle potential HTTP exceptions during streaming setup
                 logger.error(f"Streaming error for request {request_id}: {e.detail}")
+                _record_failure(series, timer, e.status_code, started)
                 error_message = OpenAIClient.classify_openai_error(e.detail)
                 error_response = {
                     "type": "error",
@@ -83,20 +229,55 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request):
                 # Return a JSON error response even for a streaming request
                 return JSONResponse(status_code=e.status_code, content=error_response)
         else:
-            # For non-streaming responses, make a single API call
-            openai_response = await openai_client.create_chat_completion(
-                openai_request, request_id
-            )
+            # For non-streaming responses, make a single API call; the watcher
+            # abandons it as soon as the client disconnects
+            async with DisconnectWatcher(http_request) as watcher:
+                if single_flight.enabled:
+                    # Only this caller detaches; the shared call keeps serving the others
+                    openai_response = await watcher.guard(
+                        single_flight.call(
+                            request_key,
+                            lambda: openai_client.create_chat_completion(openai_request, request_id, hedge=hedge),
+                        )
+                    )
+                else:
+                    openai_response = await watcher.guard(
+                        openai_client.create_chat_completion(openai_request, request_id, hedge=hedge)
+                    )
+            if timer is not None:
+                timer.stamp("upstream_done")
             # Convert the OpenAI response back to the Claude format
             claude_response = convert_openai_to_claude_response(
                 openai_response, request
             )
+            if timer is not None:
+                timer.stamp("response_converted")
+                response.headers["Server-Timing"] = timer.server_timing()
+            if series is not None:
+                series.observe_usage(openai_response.get("usage"), time.monotonic() - started)
+                series.finish(200, started)
+            if cache_key:
+                response_cache.put(cache_key, claude_response)
             return claude_response
             
-    except HTTPException:
+    except (OverloadedError, RateLimitedError, UpstreamUnavailableError) as e:
+        # The upstream has no capacity, rate limit budget or healthy endpoint left for this request
+        logger.warning(f"Rejecting request: {e.detail}")
+        _record_failure(series, timer, e.status_code, started)
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"type": "error", "error": {"type": e.error_type, "message": e.detail}},
+            headers=e.headers,
+        )
+    except asyncio.CancelledError:
+        _record_failure(series, timer, 499, started)
+        raise
+    except HTTPException as e:
         # Re-raise known HTTP exceptions
+        _record_failure(series, timer, e.status_code, started)
         raise
     except Exception as e:
+        _record_failure(series, timer, 500, started)
         # Handle unexpected errors
         import traceback
         logger.error(f"""Unexpected error processing request: {e}
@@ -104,34 +285,29 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request):
         # Classify the error to provide a more helpful message to the client
         error_message = OpenAIClient.classify_openai_error(str(e))
         raise HTTPException(status_code=500, detail=error_message)
+    finally:
+        if timer is not None and not timer_handed_off:
+            request_timing.finish(timer)
 
 
 @router.post("/v1/messages/count_tokens")
 async def count_tokens(request: ClaudeTokenCountRequest):
     try:
-        total_chars = 0
-        if request.system:
-            if isinstance(request.system, str):
-                total_chars += len(request.system)
-            elif isinstance(request.system, list):
-                for block in request.system:
-                    if hasattr(block, "text"):
-                        total_chars += len(block.text)
-        for msg in request.messages:
-            if msg.content is None:
-                continue
-            elif isinstance(msg.content, str):
-                total_chars += len(msg.content)
-            elif isinstance(msg.content, list):
-                for block in msg.content:
-                    if hasattr(block, "text") and block.text is not None:
-                        total_chars += len(block.text)
-        estimated_tokens = max(1, total_chars // 4)
-        return {"input_tokens": estimated_tokens}
+        # Count with the tokenizer of the model the request would actually be sent to
+        upstream_model = model_manager.upstream_model(request.model)
+        return {"input_tokens": max(1, token_counter.count_request(request, upstream_model))}
     except Exception as e:
         logger.error(f"Error counting tokens: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/metrics")
+async def prometheus_metrics():
+    """Request, token and upstream metrics in the Prometheus text format."""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -142,6 +318,13 @@ async def health_check():
         "small_model_api_configured": bool(config.small_model_api_key),
         "big_model_api_key_valid": config.validate_api_key(config.big_model_api_key),
         "small_model_api_key_valid": config.validate_api_key(config.small_model_api_key),
+        "conversion_cache": conversion_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "upstreams": client_pool.stats(),
+        "retries": retry_policy.stats(),
+        "hedging": hedger.stats(),
+        "single_flight": single_flight.stats(),
+        "tokenizer": token_counter.stats(),
     }
 
 
@@ -152,17 +335,17 @@ async def test_connection():
     
     # Test Big Model Connection
     try:
-        big_model_client = OpenAIClient(
-            api_key=config.big_model_api_key,
-            base_url=config.big_model_base_url,
-            timeout=10, # Shorter timeout for tests
-            api_version=config.big_model_azure_api_version,
+        big_model_client = client_pool.get_client(
+            config.big_model_base_url,
+            config.big_model_api_key,
+            config.big_model_azure_api_version,
         )
         test_response = await big_model_client.create_chat_completion(
             {
                 "model": config.big_model_name,
                 "messages": [{"role": "user", "content": "Hello"}],
                 "max_tokens": 5,
+                "timeout": 10, # Shorter timeout for tests
             }
         )
         results["big_model_connection"] = {
@@ -181,17 +364,17 @@ async def test_connection():
 
     # Test Small Model Connection
     try:
-        small_model_client = OpenAIClient(
-            api_key=config.small_model_api_key,
-            base_url=config.small_model_base_url,
-            timeout=10, # Shorter timeout for tests
-            api_version=config.small_model_azure_api_version,
+        small_model_client = client_pool.get_client(
+            config.small_model_base_url,
+            config.small_model_api_key,
+            config.small_model_azure_api_version,
         )
         test_response = await small_model_client.create_chat_completion(
             {
                 "model": config.small_model_name,
                 "messages": [{"role": "user", "content": "Hello"}],
                 "max_tokens": 5,
+                "timeout": 10, # Shorter timeout for tests
             }
         )
         results["small_model_connection"] = {
@@ -236,6 +419,7 @@ async def root():
             "messages": "/v1/messages",
             "count_tokens": "/v1/messages/count_tokens",
             "health": "/health",
+            "metrics": "/metrics",
             "test_connection": "/test-connection",
         },
     }
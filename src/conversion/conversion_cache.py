@@ -0,0 +1,206 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.core.config import config
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - msgspec is an optional dependency
+    msgspec = None
+
+if msgspec is not None:
+
+    class _RawMessages(msgspec.Struct):
+        """Just the messages of a /v1/messages body, each left as its raw JSON bytes."""
+
+        messages: List[msgspec.Raw] = []
+
+    _raw_messages_decoder = msgspec.json.Decoder(_RawMessages)
+
+_LEAF_TAGS = {bool: "b", int: "i", float: "f"}
+
+
+def fingerprint(value: Any) -> Any:
+    """Hashable, type-aware key for JSON-like data, pydantic models and msgspec structs.
+
+    Keys compare equal only when the content is equal, so dicts keyed by them
+    never confuse -1 with -2 or 1 with True and 1.0 (whose hash() values
+    collide). Containers and non-string leaves are tagged with their type.
+    """
+    kind = type(value)
+    if kind is str or value is None:
+        return value
+    if kind is dict:
+        return ("d", tuple([
+            (key, item if type(item) is str or item is None else fingerprint(item))
+            for key, item in value.items()
+        ]))
+    if kind is list:
+        return ("l", tuple([item if type(item) is str else fingerprint(item) for item in value]))
+    tag = _LEAF_TAGS.get(kind)
+    if tag is not None:
+        return (tag, value)
+    # Subclasses (str enums, custom mappings) keep their own class as the tag
+    if isinstance(value, dict):
+        return (kind, fingerprint(dict(value)))
+    if isinstance(value, (list, tuple)):
+        return (kind, fingerprint(list(value)))
+    if isinstance(value, (str, int, float)):
+        return (kind, value)
+    fields = getattr(value, "__dict__", None)
+    if fields is None and hasattr(value, "__struct_fields__"):
+        fields = {name: getattr(value, name) for name in value.__struct_fields__}
+    if fields is not None:
+        # Blocks of one class share their field names, so the class stands in for them
+        return (kind, tuple([
+            item if type(item) is str or item is None else fingerprint(item)
+            for item in fields.values()
+        ]))
+    return (kind, repr(value))
+
+
+def fingerprint_message(message: Any) -> Any:
+    """Key of a Claude message's role and content (see fingerprint)."""
+    return (message.role, fingerprint(message.content))
+
+
+def serialize_message(message: Any) -> bytes:
+    """Canonical bytes of a Claude message's role and content.
+
+    JSON keeps 1, 1.0 and true apart, so equal bytes mean equal messages.
+    """
+    if hasattr(message, "model_dump_json"):
+        return message.model_dump_json().encode()
+    if msgspec is not None and hasattr(message, "__struct_fields__"):
+        return msgspec.json.encode(message)
+    return repr(fingerprint_message(message)).encode()
+
+
+def raw_messages(body: Optional[bytes], count: int) -> Optional[List[Any]]:
+    """The JSON bytes of each message in a request body, as the client sent them.
+
+    None without msgspec, or when the body does not hold ``count`` messages.
+    """
+    if body is None or msgspec is None:
+        return None
+    try:
+        messages = _raw_messages_decoder.decode(body).messages
+    except (msgspec.ValidationError, msgspec.DecodeError):
+        return None
+    return messages if len(messages) == count else None
+
+
+def converted_size(openai_messages: Sequence[Dict[str, Any]]) -> int:
+    """Approximate size in characters of converted OpenAI messages."""
+    size = 0
+    for message in openai_messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            size += len(content)
+        elif content:
+            for part in content:
+                size += len(part.get("text") or part.get("image_url", {}).get("url", ""))
+        for tool_call in message.get("tool_calls") or ():
+            size += len(tool_call["function"]["arguments"])
+    return size
+
+
+class ConversionCache:
+    """Memoize converted OpenAI message lists by message-prefix digests.
+
+    Claude Code resends the entire conversation every turn. Each entry maps the
+    digest of a message prefix to the OpenAI messages it converted to, so a new
+    turn only converts the messages after the longest cached prefix. The
+    digests come from one SHA-256 hash fed each message in turn, preferably as
+    the raw JSON bytes from the request body (located by msgspec without
+    parsing them), otherwise serialized; either way no Python objects are
+    built per message and a lookup compares only digests, so a collision
+    between different prefixes is not a practical concern. Cached message
+    dicts are shared between requests and must be treated as immutable.
+    Entries are evicted LRU once their estimated size, digests included,
+    exceeds CONVERSION_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._entries: "OrderedDict[bytes, Tuple[List[Dict[str, Any]], int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.reused_messages = 0
+        self.converted_messages = 0
+        self.reload()
+
+    def reload(self) -> None:
+        """Apply the current cache settings."""
+        self.enabled = self.config.conversion_cache_enabled
+        self.max_bytes = self.config.conversion_cache_max_bytes
+        if not self.enabled:
+            self._entries.clear()
+            self._bytes = 0
+        else:
+            self._evict()
+
+    @staticmethod
+    def prefix_digests(messages: Sequence[Any], body: Optional[bytes] = None) -> List[bytes]:
+        """One digest per message prefix, hashing each message once.
+
+        body is the raw request the messages were decoded from, if available.
+        """
+        # Each message is a complete JSON object, so concatenating them is unambiguous
+        encoded = raw_messages(body, len(messages)) or map(serialize_message, messages)
+        digests = []
+        hasher = hashlib.sha256()
+        for data in encoded:
+            hasher.update(data)
+            digests.append(hasher.digest())
+        return digests
+
+    def longest_prefix(self, digests: Sequence[bytes]) -> Tuple[int, List[Dict[str, Any]], int]:
+        """Find the longest cached prefix.
+
+        Returns the number of messages it covers, their converted form and its
+        estimated size.
+        """
+        for end in range(len(digests), 0, -1):
+            entry = self._entries.get(digests[end - 1])
+            if entry is not None:
+                self._entries.move_to_end(digests[end - 1])
+                self.hits += 1
+                self.reused_messages += end
+                return end, entry[0], entry[1]
+        self.misses += 1
+        return 0, [], 0
+
+    def store(self, digest: bytes, converted: List[Dict[str, Any]], size: int) -> None:
+        """Remember the converted messages for the prefix with the given digest."""
+        if size + len(digest) > self.max_bytes:
+            return
+        previous = self._entries.pop(digest, None)
+        if previous is not None:
+            self._bytes -= previous[1] + len(digest)
+        self._entries[digest] = (converted, size)
+        self._bytes += size + len(digest)
+        self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current occupancy."""
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reused_messages": self.reused_messages,
+            "converted_messages": self.converted_messages,
+        }
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            digest, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size + len(digest)
+
+
+conversion_cache = ConversionCache(config)
+config.add_reload_listener(conversion_cache.reload)
@@ -0,0 +1,95 @@
+import re
+from typing import List
+
+# Characters that can change the structural state of a JSON document
+_STRUCTURAL_CHARS = re.compile(r'[\\"{}\[\]]')
+# Inside a string only quotes and escapes matter
+_STRING_CHARS = re.compile(r'[\\"]')
+
+
+class IncrementalJSONTracker:
+    """Track the structure of a JSON document that arrives in fragments.
+
+    Every fragment is scanned once, so detecting when the document is complete
+    costs O(n) over the whole stream instead of re-parsing the growing buffer
+    on every fragment.
+    """
+
+    def __init__(self):
+        self._fragments: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape_pending = False
+        self._has_content = False
+        self.complete = False
+
+    def feed(self, fragment: str) -> bool:
+        """Consume the next fragment and return whether the document is complete."""
+        if not fragment:
+            return self.complete
+        self._fragments.append(fragment)
+        if not self._has_content and not fragment.isspace():
+            self._has_content = True
+
+        pos = 0
+        if self._escape_pending:
+            # The previous fragment ended with a backslash inside a string
+            self._escape_pending = False
+            pos = 1
+
+        length = len(fragment)
+        stack = self._stack
+        while True:
+            pattern = _STRING_CHARS if self._in_string else _STRUCTURAL_CHARS
+            match = pattern.search(fragment, pos)
+            if match is None:
+                break
+            char = match.group()
+            index = match.start()
+
+            if self._in_string:
+                if char == "\\":
+                    if index + 1 >= length:
+                        self._escape_pending = True
+                        break
+                    pos = index + 2
+                    continue
+                if char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{" or char == "[":
+                stack.append(char)
+            elif char == "}" or char == "]":
+                if stack:
+                    stack.pop()
+                    if not stack:
+                        self.complete = True
+            pos = index + 1
+
+        return self.complete
+
+    def text(self) -> str:
+        """Return everything fed so far."""
+        if len(self._fragments) > 1:
+            self._fragments = ["".join(self._fragments)]
+        return self._fragments[0] if self._fragments else ""
+
+    def completion_suffix(self) -> str:
+        """Best-effort text that closes any open string, object or array.
+
+        Returns an empty string when the document is already complete and "{}"
+        when nothing but whitespace was ever received.
+        """
+        if self.complete:
+            return ""
+        if not self._has_content:
+            return "{}"
+        suffix = []
+        if self._escape_pending:
+            suffix.append("\\")
+        if self._in_string:
+            suffix.append('"')
+        for opener in reversed(self._stack):
+            suffix.append("}" if opener == "{" else "]")
+        return "".join(suffix)
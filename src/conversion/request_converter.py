@@ -1,18 +1,23 @@
 import json
-from typing import Dict, Any, List
-from venv import logger
+from typing import Dict, Any, List, Optional
 from src.core.constants import Constants
 from src.models.claude import ClaudeMessagesRequest, ClaudeMessage
 from src.core.config import config
+from src.core.logging import LazyJSON
+from src.conversion.conversion_cache import conversion_cache, converted_size
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 def convert_claude_to_openai(
-    claude_request: ClaudeMessagesRequest, openai_model_name: str
+    claude_request: ClaudeMessagesRequest, openai_model_name: str, body: Optional[bytes] = None
 ) -> Dict[str, Any]:
-    """Convert Claude API request format to OpenAI format."""
+    """Convert Claude API request format to OpenAI format.
+
+    body is the raw request body, which lets the conversion cache hash the
+    messages as sent instead of serializing them again.
+    """
 
     openai_model = openai_model_name
 
@@ -41,10 +46,19 @@ def convert_claude_to_openai(
                 {"role": Constants.ROLE_SYSTEM, "content": system_text.strip()}
             )
 
-    # Process Claude messages
+    # Reuse the converted form of the longest previously seen message prefix
+    messages = claude_request.messages
+    history_offset = len(openai_messages)
     i = 0
-    while i < len(claude_request.messages):
-        msg = claude_request.messages[i]
+    if conversion_cache.enabled:
+        digests = conversion_cache.prefix_digests(messages, body)
+        i, cached_messages, cached_size = conversion_cache.longest_prefix(digests)
+        openai_messages.extend(cached_messages)
+
+    # Process Claude messages
+    converted_from = i
+    while i < len(messages):
+        msg = messages[i]
 
         if msg.role == Constants.ROLE_USER:
             openai_message = convert_claude_user_message(msg)
@@ -54,8 +68,8 @@ def convert_claude_to_openai(
             openai_messages.append(openai_message)
 
             # Check if next message contains tool results
-            if i + 1 < len(claude_request.messages):
-                next_msg = claude_request.messages[i + 1]
+            if i + 1 < len(messages):
+                next_msg = messages[i + 1]
                 if (
                     next_msg.role == Constants.ROLE_USER
                     and isinstance(next_msg.content, list)
@@ -72,6 +86,18 @@ def convert_claude_to_openai(
 
         i += 1
 
+    # A prefix ending in an assistant message may still pair with the tool
+    # results that follow it, so only prefixes ending elsewhere are stored
+    if conversion_cache.enabled and messages and converted_from < len(messages):
+        conversion_cache.converted_messages += len(messages) - converted_from
+        if messages[-1].role != Constants.ROLE_ASSISTANT:
+            tail = openai_messages[history_offset + len(cached_messages):]
+            conversion_cache.store(
+                digests[-1],
+                openai_messages[history_offset:],
+                cached_size + converted_size(tail),
+            )
+
     # Build OpenAI request
     openai_request = {
         "model": openai_model,
@@ -83,9 +109,8 @@ def convert_claude_to_openai(
         "temperature": claude_request.temperature,
         "stream": claude_request.stream,
     }
-    logger.debug(
-        f"Converted Claude request to OpenAI format: {json.dumps(openai_request, indent=2, ensure_ascii=False)}"
-    )
+    # Serialized (and redacted) only if a DEBUG record is actually emitted
+    logger.debug("Converted Claude request to OpenAI format: %s", LazyJSON(openai_request))
     # Add optional parameters
     if claude_request.stop_sequences:
         openai_request["stop"] = claude_request.stop_sequences
@@ -1,7 +1,11 @@
 import json
 import uuid
+from typing import Optional
 from fastapi import HTTPException, Request
 from src.core.constants import Constants
+from src.conversion import sse
+from src.conversion.json_stream import IncrementalJSONTracker
+from src.core.disconnect import DisconnectWatcher
 from src.models.claude import ClaudeMessagesRequest
 
 
@@ -86,11 +90,11 @@ async def convert_openai_streaming_to_claude(
     message_id = f"msg_{uuid.uuid4().hex[:24]}"
 
     # Send initial SSE events
-    yield f"event: {Constants.EVENT_MESSAGE_START}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_START, 'message': {'id': message_id, 'type': 'message', 'role': Constants.ROLE_ASSISTANT, 'model': original_request.model, 'content': [], 'stop_reason': None, 'stop_sequence': None, 'usage': {'input_tokens': 0, 'output_tokens': 0}}}, ensure_ascii=False)}\n\n"
+    yield sse.message_start(_initial_message(message_id, original_request.model))
 
-    yield f"event: {Constants.EVENT_CONTENT_BLOCK_START}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_START, 'index': 0, 'content_block': {'type': Constants.CONTENT_TEXT, 'text': ''}}, ensure_ascii=False)}\n\n"
+    yield sse.text_block_start(0)
 
-    yield f"event: {Constants.EVENT_PING}\ndata: {json.dumps({'type': Constants.EVENT_PING}, ensure_ascii=False)}\n\n"
+    yield sse.PING
 
     # Process streaming chunks
     text_block_index = 0
@@ -99,94 +103,78 @@ async def convert_openai_streaming_to_claude(
     final_stop_reason = Constants.STOP_END_TURN
 
     try:
-        async for line in openai_stream:
-            if line.strip():
-                if line.startswith("data: "):
-                    chunk_data = line[6:]
-                    if chunk_data.strip() == "[DONE]":
-                        break
-
-                    try:
-                        chunk = json.loads(chunk_data)
-                        choices = chunk.get("choices", [])
-                        if not choices:
-                            continue
-                    except json.JSONDecodeError as e:
-                        logger.warning(
-                            f"Failed to parse chunk: {chunk_data}, error: {e}"
-                        )
-                        continue
-
-                    choice = choices[0]
-                    delta = choice.get("delta", {})
-                    finish_reason = choice.get("finish_reason")
-
-                    # Handle text delta
-                    if delta and "content" in delta and delta["content"] is not None:
-                        yield f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': text_block_index, 'delta': {'type': Constants.DELTA_TEXT, 'text': delta['content']}}, ensure_ascii=False)}\n\n"
-
-                    # Handle tool call deltas with improved incremental processing
-                    if "tool_calls" in delta:
-                        for tc_delta in delta["tool_calls"]:
-                            tc_index = tc_delta.get("index", 0)
-                            
-                            # Initialize tool call tracking by index if not exists
-                            if tc_index not in current_tool_calls:
-                                current_tool_calls[tc_index] = {
-                                    "id": None,
-                                    "name": None,
-                                    "args_buffer": "",
-                                    "json_sent": False,
-                                    "claude_index": None,
-                                    "started": False
-                                }
-                            
-                            tool_call = current_tool_calls[tc_index]
-                            
-                            # Update tool call ID if provided
-                            if tc_delta.get("id"):
-                                tool_call["id"] = tc_delta["id"]
-                            
-                            # Update function name and start content block if we have both id and name
-                            function_data = tc_delta.get(Constants.TOOL_FUNCTION, {})
-                            if function_data.get("name"):
-                                tool_call["name"] = function_data["name"]
-                            
-                            # Start content block when we have complete initial data
-                            if (tool_call["id"] and tool_call["name"] and not tool_call["started"]):
-                                tool_block_counter += 1
-                                claude_index = text_block_index + tool_block_counter
-                                tool_call["claude_index"] = claude_index
-                                tool_call["started"] = True
-                                
-                                yield f"event: {Constants.EVENT_CONTENT_BLOCK_START}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_START, 'index': claude_index, 'content_block': {'type': Constants.CONTENT_TOOL_USE, 'id': tool_call['id'], 'name': tool_call['name'], 'input': {}}}, ensure_ascii=False)}\n\n"
-                            
-                            # Handle function arguments
-                            if "arguments" in function_data and tool_call["started"] and function_data["arguments"] is not None:
-                                tool_call["args_buffer"] += function_data["arguments"]
-                                
-                                # Try to parse complete JSON and send delta when we have valid JSON
-                                try:
-                                    json.loads(tool_call["args_buffer"])
-                                    # If parsing succeeds and we haven't sent this JSON yet
-                                    if not tool_call["json_sent"]:
-                                        yield f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': tool_call['claude_index'], 'delta': {'type': Constants.DELTA_INPUT_JSON, 'partial_json': tool_call['args_buffer']}}, ensure_ascii=False)}\n\n"
-                                        tool_call["json_sent"] = True
-                                except json.JSONDecodeError:
-                                    # JSON is incomplete, continue accumulating
-                                    pass
-
-                    # Handle finish reason
-                    if finish_reason:
-                        if finish_reason == "length":
-                            final_stop_reason = Constants.STOP_MAX_TOKENS
-                        elif finish_reason in ["tool_calls", "function_call"]:
-                            final_stop_reason = Constants.STOP_TOOL_USE
-                        elif finish_reason == "stop":
-                            final_stop_reason = Constants.STOP_END_TURN
-                        else:
-                            final_stop_reason = Constants.STOP_END_TURN
-                        break
+        async for chunk in openai_stream:
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+
+            choice = choices[0]
+            delta = choice.get("delta") or {}
+            finish_reason = choice.get("finish_reason")
+
+            # Handle text delta
+            if delta and "content" in delta and delta["content"] is not None:
+                yield sse.text_delta(text_block_index, delta["content"])
+
+            # Handle tool call deltas with improved incremental processing
+            if delta.get("tool_calls"):
+                for tc_delta in delta["tool_calls"]:
+                    tc_index = tc_delta.get("index", 0)
+                    
+                    # Initialize tool call tracking by index if not exists
+                    if tc_index not in current_tool_calls:
+                        current_tool_calls[tc_index] = {
+                            "id": None,
+                            "name": None,
+                            "arguments": IncrementalJSONTracker(),
+                            "claude_index": None,
+                            "started": False
+                        }
+                    
+                    tool_call = current_tool_calls[tc_index]
+                    
+                    # Update tool call ID if provided
+                    if tc_delta.get("id"):
+                        tool_call["id"] = tc_delta["id"]
+                    
+                    # Update function name and start content block if we have both id and name
+                    function_data = tc_delta.get(Constants.TOOL_FUNCTION) or {}
+                    if function_data.get("name"):
+                        tool_call["name"] = function_data["name"]
+                    
+                    # Start content block when we have complete initial data
+                    if (tool_call["id"] and tool_call["name"] and not tool_call["started"]):
+                        tool_block_counter += 1
+                        claude_index = text_block_index + tool_block_counter
+                        tool_call["claude_index"] = claude_index
+                        tool_call["started"] = True
+                        
+                        yield sse.tool_use_block_start(claude_index, tool_call["id"], tool_call["name"])
+
+                        # Flush any arguments that arrived before the block could start
+                        pending_arguments = tool_call["arguments"].text()
+                        if pending_arguments:
+                            yield sse.input_json_delta(claude_index, pending_arguments)
+                    
+                    # Forward argument fragments as they arrive; the tracker only
+                    # follows the JSON structure so completeness is known in O(n)
+                    arguments = function_data.get("arguments")
+                    if arguments:
+                        tool_call["arguments"].feed(arguments)
+                        if tool_call["started"]:
+                            yield sse.input_json_delta(tool_call["claude_index"], arguments)
+
+            # Handle finish reason
+            if finish_reason:
+                if finish_reason == "length":
+                    final_stop_reason = Constants.STOP_MAX_TOKENS
+                elif finish_reason in ["tool_calls", "function_call"]:
+                    final_stop_reason = Constants.STOP_TOOL_USE
+                elif finish_reason == "stop":
+                    final_stop_reason = Constants.STOP_END_TURN
+                else:
+                    final_stop_reason = Constants.STOP_END_TURN
+                break
 
     except Exception as e:
         # Handle any streaming errors gracefully
@@ -194,43 +182,51 @@ async def convert_openai_streaming_to_claude(
         import traceback
 
         logger.error(traceback.format_exc())
-        error_event = {
-            "type": "error",
-            "error": {"type": "api_error", "message": f"Streaming error: {str(e)}"},
-        }
-        yield f"event: error\ndata: {json.dumps(error_event, ensure_ascii=False)}\n\n"
+        yield sse.error("api_error", f"Streaming error: {str(e)}")
         return
 
     # Send final SSE events
-    yield f"event: {Constants.EVENT_CONTENT_BLOCK_STOP}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_STOP, 'index': text_block_index}, ensure_ascii=False)}\n\n"
+    yield sse.content_block_stop(text_block_index)
 
     for tool_data in current_tool_calls.values():
         if tool_data.get("started") and tool_data.get("claude_index") is not None:
-            yield f"event: {Constants.EVENT_CONTENT_BLOCK_STOP}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_STOP, 'index': tool_data['claude_index']}, ensure_ascii=False)}\n\n"
+            # Best-effort close of arguments that never formed complete JSON
+            closing_json = tool_data["arguments"].completion_suffix()
+            if closing_json:
+                logger.warning(
+                    f"Tool call {tool_data['id']} arguments incomplete at end of stream, closing with {closing_json!r}"
+                )
+                yield sse.input_json_delta(tool_data["claude_index"], closing_json)
+            yield sse.content_block_stop(tool_data["claude_index"])
 
     usage_data = {"input_tokens": 0, "output_tokens": 0}
-    yield f"event: {Constants.EVENT_MESSAGE_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_DELTA, 'delta': {'stop_reason': final_stop_reason, 'stop_sequence': None}, 'usage': usage_data}, ensure_ascii=False)}\n\n"
-    yield f"event: {Constants.EVENT_MESSAGE_STOP}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_STOP}, ensure_ascii=False)}\n\n"
+    yield sse.message_delta(final_stop_reason, usage_data)
+    yield sse.MESSAGE_STOP
 
 
 async def convert_openai_streaming_to_claude_with_cancellation(
     openai_stream,
     original_request: ClaudeMessagesRequest,
     logger,
-    http_request: Request,
+    http_request: Optional[Request],
     openai_client,
     request_id: str,
+    on_complete=None,
 ):
-    """Convert OpenAI streaming response to Claude streaming format with cancellation support."""
+    """Convert OpenAI streaming response to Claude streaming format with cancellation support.
+
+    If on_complete is given it is called with the assembled Claude message once the
+    upstream stream finishes normally (used to populate the response cache).
+    """
 
     message_id = f"msg_{uuid.uuid4().hex[:24]}"
 
     # Send initial SSE events
-    yield f"event: {Constants.EVENT_MESSAGE_START}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_START, 'message': {'id': message_id, 'type': 'message', 'role': Constants.ROLE_ASSISTANT, 'model': original_request.model, 'content': [], 'stop_reason': None, 'stop_sequence': None, 'usage': {'input_tokens': 0, 'output_tokens': 0}}}, ensure_ascii=False)}\n\n"
+    yield sse.message_start(_initial_message(message_id, original_request.model))
 
-    yield f"event: {Constants.EVENT_CONTENT_BLOCK_START}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_START, 'index': 0, 'content_block': {'type': Constants.CONTENT_TEXT, 'text': ''}}, ensure_ascii=False)}\n\n"
+    yield sse.text_block_start(0)
 
-    yield f"event: {Constants.EVENT_PING}\ndata: {json.dumps({'type': Constants.EVENT_PING}, ensure_ascii=False)}\n\n"
+    yield sse.PING
 
     # Process streaming chunks
     text_block_index = 0
@@ -238,148 +234,236 @@ async def convert_openai_streaming_to_claude_with_cancellation(
     current_tool_calls = {}
     final_stop_reason = Constants.STOP_END_TURN
     usage_data = {"input_tokens": 0, "output_tokens": 0}
+    text_parts = [] if on_complete is not None else None
+    client_disconnected = False
+
+    # One watcher per request cancels the upstream call on disconnect, so the
+    # hot loop never polls the ASGI channel (shared single-flight streams pass no request)
+    watcher = None
+    if http_request is not None:
+
+        def cancel_upstream():
+            logger.info(f"Client disconnected, cancelling request {request_id}")
+            openai_client.cancel_request(request_id)
+
+        watcher = DisconnectWatcher(http_request, on_disconnect=cancel_upstream).start()
 
     try:
-        async for line in openai_stream:
-            # Check if client disconnected
-            if await http_request.is_disconnected():
-                logger.info(f"Client disconnected, cancelling request {request_id}")
-                openai_client.cancel_request(request_id)
+        async for chunk in openai_stream:
+            if watcher is not None and watcher.disconnected:
+                client_disconnected = True
                 break
 
-            if line.strip():
-                if line.startswith("data: "):
-                    chunk_data = line[6:]
-                    if chunk_data.strip() == "[DONE]":
-                        break
-
-                    try:
-                        chunk = json.loads(chunk_data)
-                        # logger.info(f"OpenAI chunk: {chunk}")
-                        usage = chunk.get("usage", None)
-                        if usage:
-                            cache_read_input_tokens = 0
-                            prompt_tokens_details = usage.get('prompt_tokens_details', {})
-                            if prompt_tokens_details:
-                                cache_read_input_tokens = prompt_tokens_details.get('cached_tokens', 0)
-                            usage_data = {
-                                'input_tokens': usage.get('prompt_tokens', 0),
-                                'output_tokens': usage.get('completion_tokens', 0),
-                                'cache_read_input_tokens': cache_read_input_tokens
-                            }
-                        choices = chunk.get("choices", [])
-                        if not choices:
-                            continue
-                    except json.JSONDecodeError as e:
-                        logger.warning(
-                            f"Failed to parse chunk: {chunk_data}, error: {e}"
-                        )
-                        continue
-
-                    choice = choices[0]
-                    delta = choice.get("delta", {})
-                    finish_reason = choice.get("finish_reason")
-
-                    # Handle text delta
-                    if delta and "content" in delta and delta["content"] is not None:
-                        yield f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': text_block_index, 'delta': {'type': Constants.DELTA_TEXT, 'text': delta['content']}}, ensure_ascii=False)}\n\n"
-
-                    # Handle tool call deltas with improved incremental processing
-                    if "tool_calls" in delta and delta["tool_calls"]:
-                        for tc_delta in delta["tool_calls"]:
-                            tc_index = tc_delta.get("index", 0)
-                            
-                            # Initialize tool call tracking by index if not exists
-                            if tc_index not in current_tool_calls:
-                                current_tool_calls[tc_index] = {
-                                    "id": None,
-                                    "name": None,
-                                    "args_buffer": "",
-                                    "json_sent": False,
-                                    "claude_index": None,
-                                    "started": False
-                                }
-                            
-                            tool_call = current_tool_calls[tc_index]
-                            
-                            # Update tool call ID if provided
-                            if tc_delta.get("id"):
-                                tool_call["id"] = tc_delta["id"]
-                            
-                            # Update function name and start content block if we have both id and name
-                            function_data = tc_delta.get(Constants.TOOL_FUNCTION, {})
-                            if function_data.get("name"):
-                                tool_call["name"] = function_data["name"]
-                            
-                            # Start content block when we have complete initial data
-                            if (tool_call["id"] and tool_call["name"] and not tool_call["started"]):
-                                tool_block_counter += 1
-                                claude_index = text_block_index + tool_block_counter
-                                tool_call["claude_index"] = claude_index
-                                tool_call["started"] = True
-                                
-                                yield f"event: {Constants.EVENT_CONTENT_BLOCK_START}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_START, 'index': claude_index, 'content_block': {'type': Constants.CONTENT_TOOL_USE, 'id': tool_call['id'], 'name': tool_call['name'], 'input': {}}}, ensure_ascii=False)}\n\n"
-                            
-                            # Handle function arguments
-                            if "arguments" in function_data and tool_call["started"] and function_data["arguments"] is not None:
-                                tool_call["args_buffer"] += function_data["arguments"]
-                                
-                                # Try to parse complete JSON and send delta when we have valid JSON
-                                try:
-                                    json.loads(tool_call["args_buffer"])
-                                    # If parsing succeeds and we haven't sent this JSON yet
-                                    if not tool_call["json_sent"]:
-                                        yield f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': tool_call['claude_index'], 'delta': {'type': Constants.DELTA_INPUT_JSON, 'partial_json': tool_call['args_buffer']}}, ensure_ascii=False)}\n\n"
-                                        tool_call["json_sent"] = True
-                                except json.JSONDecodeError:
-                                    # JSON is incomplete, continue accumulating
-                                    pass
-
-                    # Handle finish reason
-                    if finish_reason:
-                        if finish_reason == "length":
-                            final_stop_reason = Constants.STOP_MAX_TOKENS
-                        elif finish_reason in ["tool_calls", "function_call"]:
-                            final_stop_reason = Constants.STOP_TOOL_USE
-                        elif finish_reason == "stop":
-                            final_stop_reason = Constants.STOP_END_TURN
-                        else:
-                            final_stop_reason = Constants.STOP_END_TURN
+            usage = chunk.get("usage")
+            if usage:
+                cache_read_input_tokens = 0
+                prompt_tokens_details = usage.get('prompt_tokens_details', {})
+                if prompt_tokens_details:
+                    cache_read_input_tokens = prompt_tokens_details.get('cached_tokens', 0)
+                usage_data = {
+                    'input_tokens': usage.get('prompt_tokens', 0),
+                    'output_tokens': usage.get('completion_tokens', 0),
+                    'cache_read_input_tokens': cache_read_input_tokens
+                }
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+
+            choice = choices[0]
+            delta = choice.get("delta") or {}
+            finish_reason = choice.get("finish_reason")
+
+            # Handle text delta
+            if delta and "content" in delta and delta["content"] is not None:
+                yield sse.text_delta(text_block_index, delta["content"])
+                if text_parts is not None:
+                    text_parts.append(delta["content"])
+
+            # Handle tool call deltas with improved incremental processing
+            if "tool_calls" in delta and delta["tool_calls"]:
+                for tc_delta in delta["tool_calls"]:
+                    tc_index = tc_delta.get("index", 0)
+                    
+                    # Initialize tool call tracking by index if not exists
+                    if tc_index not in current_tool_calls:
+                        current_tool_calls[tc_index] = {
+                            "id": None,
+                            "name": None,
+                            "arguments": IncrementalJSONTracker(),
+                            "claude_index": None,
+                            "started": False
+                        }
+                    
+                    tool_call = current_tool_calls[tc_index]
+                    
+                    # Update tool call ID if provided
+                    if tc_delta.get("id"):
+                        tool_call["id"] = tc_delta["id"]
+                    
+                    # Update function name and start content block if we have both id and name
+                    function_data = tc_delta.get(Constants.TOOL_FUNCTION) or {}
+                    if function_data.get("name"):
+                        tool_call["name"] = function_data["name"]
+                    
+                    # Start content block when we have complete initial data
+                    if (tool_call["id"] and tool_call["name"] and not tool_call["started"]):
+                        tool_block_counter += 1
+                        claude_index = text_block_index + tool_block_counter
+                        tool_call["claude_index"] = claude_index
+                        tool_call["started"] = True
+                        
+                        yield sse.tool_use_block_start(claude_index, tool_call["id"], tool_call["name"])
+
+                        # Flush any arguments that arrived before the block could start
+                        pending_arguments = tool_call["arguments"].text()
+                        if pending_arguments:
+                            yield sse.input_json_delta(claude_index, pending_arguments)
+                    
+                    # Forward argument fragments as they arrive; the tracker only
+                    # follows the JSON structure so completeness is known in O(n)
+                    arguments = function_data.get("arguments")
+                    if arguments:
+                        tool_call["arguments"].feed(arguments)
+                        if tool_call["started"]:
+                            yield sse.input_json_delta(tool_call["claude_index"], arguments)
+
+            # Handle finish reason
+            if finish_reason:
+                if finish_reason == "length":
+                    final_stop_reason = Constants.STOP_MAX_TOKENS
+                elif finish_reason in ["tool_calls", "function_call"]:
+                    final_stop_reason = Constants.STOP_TOOL_USE
+                elif finish_reason == "stop":
+                    final_stop_reason = Constants.STOP_END_TURN
+                else:
+                    final_stop_reason = Constants.STOP_END_TURN
 
     except HTTPException as e:
         # Handle cancellation
         if e.status_code == 499:
             logger.info(f"Request {request_id} was cancelled")
-            error_event = {
-                "type": "error",
-                "error": {
-                    "type": "cancelled",
-                    "message": "Request was cancelled by client",
-                },
-            }
-            yield f"event: error\ndata: {json.dumps(error_event, ensure_ascii=False)}\n\n"
+            yield sse.error("cancelled", "Request was cancelled by client")
             return
+        # The response has already started, so report upstream failures
+        # (including an open circuit breaker) as an SSE error event
+        logger.error(f"Upstream error for request {request_id}: {e.detail}")
+        if e.status_code == 429:
+            error_type = "rate_limit_error"
+        elif e.status_code in (503, 529):
+            error_type = "overloaded_error"
         else:
-            raise
+            error_type = "api_error"
+        yield sse.error(error_type, str(e.detail))
+        return
     except Exception as e:
         # Handle any streaming errors gracefully
         logger.error(f"Streaming error: {e}")
         import traceback
 
         logger.error(traceback.format_exc())
-        error_event = {
-            "type": "error",
-            "error": {"type": "api_error", "message": f"Streaming error: {str(e)}"},
-        }
-        yield f"event: error\ndata: {json.dumps(error_event, ensure_ascii=False)}\n\n"
+        yield sse.error("api_error", f"Streaming error: {str(e)}")
         return
+    finally:
+        if watcher is not None:
+            watcher.stop()
+
+    if on_complete is not None and not client_disconnected:
+        on_complete(
+            _assemble_claude_message(
+                message_id, original_request, text_parts, current_tool_calls, final_stop_reason, usage_data
+            )
+        )
 
     # Send final SSE events
-    yield f"event: {Constants.EVENT_CONTENT_BLOCK_STOP}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_STOP, 'index': text_block_index}, ensure_ascii=False)}\n\n"
+    yield sse.content_block_stop(text_block_index)
 
     for tool_data in current_tool_calls.values():
         if tool_data.get("started") and tool_data.get("claude_index") is not None:
-            yield f"event: {Constants.EVENT_CONTENT_BLOCK_STOP}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_STOP, 'index': tool_data['claude_index']}, ensure_ascii=False)}\n\n"
+            # Best-effort close of arguments that never formed complete JSON
+            closing_json = tool_data["arguments"].completion_suffix()
+            if closing_json:
+                logger.warning(
+                    f"Tool call {tool_data['id']} arguments incomplete at end of stream, closing with {closing_json!r}"
+                )
+                yield sse.input_json_delta(tool_data["claude_index"], closing_json)
+            yield sse.content_block_stop(tool_data["claude_index"])
+
+    yield sse.message_delta(final_stop_reason, usage_data)
+    yield sse.MESSAGE_STOP
+
+
+def _initial_message(message_id: str, model: str) -> dict:
+    """The empty message announced by message_start."""
+    return {
+        "id": message_id,
+        "type": "message",
+        "role": Constants.ROLE_ASSISTANT,
+        "model": model,
+        "content": [],
+        "stop_reason": None,
+        "stop_sequence": None,
+        "usage": {"input_tokens": 0, "output_tokens": 0},
+    }
 
-    yield f"event: {Constants.EVENT_MESSAGE_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_DELTA, 'delta': {'stop_reason': final_stop_reason, 'stop_sequence': None}, 'usage': usage_data}, ensure_ascii=False)}\n\n"
-    yield f"event: {Constants.EVENT_MESSAGE_STOP}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_STOP}, ensure_ascii=False)}\n\n"
+
+def _assemble_claude_message(
+    message_id, original_request, text_parts, tool_calls, stop_reason, usage
+) -> dict:
+    """Build the non-streaming Claude message equivalent to a finished stream."""
+    content_blocks = []
+    text = "".join(text_parts)
+    if text:
+        content_blocks.append({"type": Constants.CONTENT_TEXT, "text": text})
+    for tool_data in tool_calls.values():
+        if not tool_data.get("started"):
+            continue
+        arguments = tool_data["arguments"]
+        raw_arguments = arguments.text() + arguments.completion_suffix()
+        try:
+            tool_input = json.loads(raw_arguments)
+        except json.JSONDecodeError:
+            tool_input = {"raw_arguments": arguments.text()}
+        content_blocks.append(
+            {
+                "type": Constants.CONTENT_TOOL_USE,
+                "id": tool_data["id"],
+                "name": tool_data["name"],
+                "input": tool_input,
+            }
+        )
+    if not content_blocks:
+        content_blocks.append({"type": Constants.CONTENT_TEXT, "text": ""})
+
+    return {
+        "id": message_id,
+        "type": "message",
+        "role": Constants.ROLE_ASSISTANT,
+        "model": original_request.model,
+        "content": content_blocks,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": dict(usage),
+    }
+
+
+async def convert_claude_response_to_sse(claude_response: dict):
+    """Replay a complete Claude message as a correctly framed Claude SSE stream."""
+
+    yield sse.message_start(_initial_message(claude_response["id"], claude_response["model"]))
+
+    yield sse.PING
+
+    for index, block in enumerate(claude_response["content"]):
+        if block["type"] == Constants.CONTENT_TOOL_USE:
+            yield sse.tool_use_block_start(index, block["id"], block["name"])
+            yield sse.input_json_delta(index, json.dumps(block["input"], ensure_ascii=False))
+        else:
+            yield sse.text_block_start(index)
+            if block.get("text"):
+                yield sse.text_delta(index, block["text"])
+        yield sse.content_block_stop(index)
+
+    yield sse.message_delta(
+        claude_response["stop_reason"], claude_response["usage"], claude_response.get("stop_sequence")
+    )
+    yield sse.MESSAGE_STOP
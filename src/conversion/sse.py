@@ -0,0 +1,103 @@
+import json
+from functools import lru_cache
+from json.encoder import encode_basestring
+from typing import Any, Dict, Optional
+
+from src.core.constants import Constants
+
+# Frames are byte-identical to f"event: {type}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n",
+# built so that per-chunk work is limited to escaping the streamed text.
+
+
+def encode_event(event_type: str, payload: Dict[str, Any]) -> bytes:
+    """Encode an arbitrary Claude SSE event."""
+    return f"event: {event_type}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+PING = encode_event(Constants.EVENT_PING, {"type": Constants.EVENT_PING})
+MESSAGE_STOP = encode_event(Constants.EVENT_MESSAGE_STOP, {"type": Constants.EVENT_MESSAGE_STOP})
+
+_DELTA_SUFFIX = b'}}\n\n'
+
+
+@lru_cache(maxsize=None)
+def _delta_prefix(index: int, delta_type: str, field: str) -> bytes:
+    # Everything before the streamed JSON string value
+    frame = encode_event(
+        Constants.EVENT_CONTENT_BLOCK_DELTA,
+        {"type": Constants.EVENT_CONTENT_BLOCK_DELTA, "index": index, "delta": {"type": delta_type, field: ""}},
+    )
+    return frame[: -len(b'""}}\n\n')]
+
+
+def text_delta(index: int, text: str) -> bytes:
+    """content_block_delta carrying a text_delta."""
+    return b"".join((
+        _delta_prefix(index, Constants.DELTA_TEXT, "text"),
+        encode_basestring(text).encode("utf-8"),
+        _DELTA_SUFFIX,
+    ))
+
+
+def input_json_delta(index: int, partial_json: str) -> bytes:
+    """content_block_delta carrying an input_json_delta."""
+    return b"".join((
+        _delta_prefix(index, Constants.DELTA_INPUT_JSON, "partial_json"),
+        encode_basestring(partial_json).encode("utf-8"),
+        _DELTA_SUFFIX,
+    ))
+
+
+@lru_cache(maxsize=None)
+def text_block_start(index: int) -> bytes:
+    """content_block_start for an empty text block."""
+    return encode_event(
+        Constants.EVENT_CONTENT_BLOCK_START,
+        {
+            "type": Constants.EVENT_CONTENT_BLOCK_START,
+            "index": index,
+            "content_block": {"type": Constants.CONTENT_TEXT, "text": ""},
+        },
+    )
+
+
+def tool_use_block_start(index: int, tool_id: str, name: str) -> bytes:
+    """content_block_start for a tool_use block."""
+    return encode_event(
+        Constants.EVENT_CONTENT_BLOCK_START,
+        {
+            "type": Constants.EVENT_CONTENT_BLOCK_START,
+            "index": index,
+            "content_block": {"type": Constants.CONTENT_TOOL_USE, "id": tool_id, "name": name, "input": {}},
+        },
+    )
+
+
+@lru_cache(maxsize=None)
+def content_block_stop(index: int) -> bytes:
+    """content_block_stop for the given block index."""
+    return encode_event(
+        Constants.EVENT_CONTENT_BLOCK_STOP, {"type": Constants.EVENT_CONTENT_BLOCK_STOP, "index": index}
+    )
+
+
+def message_start(message: Dict[str, Any]) -> bytes:
+    """message_start wrapping the initial message object."""
+    return encode_event(Constants.EVENT_MESSAGE_START, {"type": Constants.EVENT_MESSAGE_START, "message": message})
+
+
+def message_delta(stop_reason: str, usage: Dict[str, Any], stop_sequence: Optional[str] = None) -> bytes:
+    """message_delta with the final stop reason and usage."""
+    return encode_event(
+        Constants.EVENT_MESSAGE_DELTA,
+        {
+            "type": Constants.EVENT_MESSAGE_DELTA,
+            "delta": {"stop_reason": stop_reason, "stop_sequence": stop_sequence},
+            "usage": usage,
+        },
+    )
+
+
+def error(error_type: str, message: str) -> bytes:
+    """error event."""
+    return encode_event("error", {"type": "error", "error": {"type": error_type, "message": message}})
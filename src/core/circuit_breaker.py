@@ -0,0 +1,138 @@
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Recent outcomes used for the error rate
+_OUTCOME_WINDOW = 50
+# Weight of the newest sample in the latency moving average
+_LATENCY_ALPHA = 0.2
+
+
+class UpstreamUnavailableError(HTTPException):
+    """Raised when every upstream of a model tier is ejected."""
+
+    error_type = "overloaded_error"
+
+    def __init__(self, detail: str):
+        super().__init__(status_code=503, detail=detail)
+
+
+class CircuitBreaker:
+    """Health of one upstream endpoint.
+
+    The breaker opens (ejecting the endpoint) after BREAKER_CONSECUTIVE_FAILURES
+    failures in a row, when the recent error rate exceeds BREAKER_ERROR_RATE, or
+    when the owning group reports it as a latency outlier. While open the
+    endpoint receives no traffic; once the ejection period is over a single
+    half-open probe request decides whether it closes again or is ejected for
+    twice as long. The owning group keeps its last healthy endpoint in
+    service however it fails, since ejecting it would fail every request.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.outcomes = deque(maxlen=_OUTCOME_WINDOW)
+        # Moving average latency, kept separately for streams (first chunk) and full responses
+        self.latency: Dict[bool, float] = {}
+        self.latency_samples: Dict[bool, int] = {False: 0, True: 0}
+        self.ejections = 0
+        self.last_reason: Optional[str] = None
+        self._opened_until = 0.0
+        self._closed_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def available(self) -> bool:
+        """Whether the endpoint may receive a request right now."""
+        if self.state == CLOSED or not self.config.breaker_enabled:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() < self._opened_until:
+                return False
+            self.state = HALF_OPEN
+        return not self._probe_in_flight
+
+    def acquire(self) -> bool:
+        """Mark a request as started; returns True when it is the half-open probe."""
+        if self.state == HALF_OPEN and self.config.breaker_enabled:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release(self, probe: bool) -> None:
+        """Forget a request that ended without an outcome (e.g. the client left)."""
+        if probe:
+            self._probe_in_flight = False
+
+    def record_success(self, probe: bool, latency: Optional[float] = None, stream: bool = False) -> None:
+        self.consecutive_failures = 0
+        self.outcomes.append(True)
+        if latency is not None:
+            previous = self.latency.get(stream)
+            self.latency[stream] = latency if previous is None else previous + _LATENCY_ALPHA * (latency - previous)
+            self.latency_samples[stream] += 1
+        if probe:
+            self._probe_in_flight = False
+            self.state = CLOSED
+            self._closed_at = time.monotonic()
+
+    def record_failure(self, probe: bool, can_eject: bool = True) -> None:
+        """Count a failure, ejecting the endpoint unless ``can_eject`` says it is the last one left."""
+        self.consecutive_failures += 1
+        self.outcomes.append(False)
+        if not can_eject:
+            if probe:
+                # Nothing else can take the traffic, so keep serving
+                self._probe_in_flight = False
+                self.state = CLOSED
+                self._closed_at = time.monotonic()
+            return
+        if probe:
+            self._probe_in_flight = False
+            self.trip("half-open probe failed")
+        elif self.consecutive_failures >= self.config.breaker_consecutive_failures:
+            self.trip(f"{self.consecutive_failures} consecutive failures")
+        elif len(self.outcomes) >= self.config.breaker_min_requests and self.error_rate() > self.config.breaker_error_rate:
+            self.trip(f"error rate {self.error_rate():.0%}")
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def trip(self, reason: str) -> None:
+        """Eject the endpoint, backing off exponentially on repeated ejections."""
+        if not self.config.breaker_enabled or self.state == OPEN:
+            return
+        now = time.monotonic()
+        if self.state == CLOSED and now - self._closed_at > self.config.breaker_max_ejection:
+            # Healthy for a full ejection cycle: start the backoff over
+            self.ejections = 0
+        self.ejections += 1
+        duration = min(self.config.breaker_max_ejection, self.config.breaker_base_ejection * 2 ** (self.ejections - 1))
+        self.state = OPEN
+        self.last_reason = reason
+        self._opened_until = now + duration
+        self.consecutive_failures = 0
+        self.outcomes.clear()
+        self.latency.clear()
+        self.latency_samples = {False: 0, True: 0}
+
+    def stats(self) -> Dict[str, Any]:
+        """Breaker state for /health."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "error_rate": round(self.error_rate(), 3),
+            "latency": {("stream" if stream else "response"): round(value, 3) for stream, value in self.latency.items()},
+            "ejections": self.ejections,
+            "last_reason": self.last_reason,
+            "ejected_for": round(max(0.0, self._opened_until - time.monotonic()), 1) if self.state == OPEN else 0,
+        }
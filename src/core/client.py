@@ -1,141 +1,302 @@
 import asyncio
-import json
+import time
 from fastapi import HTTPException
-from typing import Optional, AsyncGenerator, Dict, Any
-from openai import AsyncOpenAI, AsyncAzureOpenAI
+from typing import Optional, AsyncGenerator, Awaitable, Callable, Dict, Any, TypeVar
+import httpx
+from openai import AsyncOpenAI, AsyncAzureOpenAI, AsyncStream, DefaultAsyncHttpxClient
 from openai.types.chat import ChatCompletion, ChatCompletionChunk
-from openai._exceptions import APIError, RateLimitError, AuthenticationError, BadRequestError
+from openai._exceptions import APIError, APIStatusError, RateLimitError, AuthenticationError, BadRequestError
+from src.core.concurrency import AdaptiveLimit, Bulkhead
+from src.core.rate_limit import Charge, RateLimiter, estimate_prompt_tokens
+from src.core.timing import UPSTREAM_EVENT_HOOKS
+from src.models.openai import OpenAIStreamChunk
+
+T = TypeVar("T")
 
 class OpenAIClient:
     """Async OpenAI client with cancellation support."""
     
-    def __init__(self, api_key: str, base_url: str, timeout: int = 90, api_version: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        timeout: int = 90,
+        api_version: Optional[str] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        retry_policy=None,
+        max_concurrency: int = 0,
+        max_queue: int = 100,
+        queue_timeout: float = 30.0,
+        adaptive_limit: Optional[Dict[str, Any]] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ):
         self.api_key = api_key
         self.base_url = base_url
-        
+        self.api_version = api_version
+        self.retry_policy = retry_policy
+
+        # One long-lived httpx pool per client so keep-alive connections are reused
+        self.http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            # Stamp the current request's timer when the upstream call is sent and answered
+            event_hooks=UPSTREAM_EVENT_HOOKS,
+        )
+
         # Detect if using Azure and instantiate the appropriate client
         if api_version:
             self.client = AsyncAzureOpenAI(
                 api_key=api_key,
                 azure_endpoint=base_url,
                 api_version=api_version,
-                timeout=timeout
+                timeout=timeout,
+                max_retries=0,
+                http_client=self.http_client,
             )
         else:
             self.client = AsyncOpenAI(
                 api_key=api_key,
                 base_url=base_url,
-                timeout=timeout
+                timeout=timeout,
+                max_retries=0,
+                http_client=self.http_client,
             )
-        self.active_requests: Dict[str, asyncio.Event] = {}
+        self.active_requests: Dict[str, _ActiveRequest] = {}
+        # Bulkhead limiting concurrent requests to this upstream; queued requests count as in flight
+        self.bulkhead = Bulkhead(max_concurrency, max_queue, queue_timeout)
+        # Optionally let observed latency move the bulkhead limit
+        self.limiter = AdaptiveLimit(self.bulkhead, **adaptive_limit) if adaptive_limit else None
+        # Client-side RPM/TPM pacing for this upstream account
+        self.rate_limiter = rate_limiter
+        self.in_flight = 0
+        self.retired = False
+        self.closed = False
     
     async def create_chat_completion(self, request: Dict[str, Any], request_id: Optional[str] = None) -> Dict[str, Any]:
         """Send chat completion to OpenAI API with cancellation support."""
         
-        # Create cancellation token if request_id provided
-        if request_id:
-            cancel_event = asyncio.Event()
-            self.active_requests[request_id] = cancel_event
+        self.in_flight += 1
+        completion_task = None
+        active = None
+        acquired = False
         
         try:
-            # Create task that can be cancelled
+            # Pace against the account's rate limits before taking a concurrency slot
+            charged = await self._charge(request)
+            await self._acquire_slot(charged)
+            acquired = True
+            started = time.monotonic()
+
+            # Run the call as its own task so cancel_request() can abort it mid-flight;
+            # cancelling the task makes httpx drop the upstream connection
             completion_task = asyncio.create_task(
-                self.client.chat.completions.create(**request)
+                self._with_retries(lambda: self._create(request))
             )
-            
             if request_id:
-                # Wait for either completion or cancellation
-                cancel_task = asyncio.create_task(cancel_event.wait())
-                done, pending = await asyncio.wait(
-                    [completion_task, cancel_task],
-                    return_when=asyncio.FIRST_COMPLETED
-                )
-                
-                # Cancel pending tasks
-                for task in pending:
-                    task.cancel()
-                    try:
-                        await task
-                    except asyncio.CancelledError:
-                        pass
-                
-                # Check if request was cancelled
-                if cancel_task in done:
-                    completion_task.cancel()
-                    raise HTTPException(status_code=499, detail="Request cancelled by client")
-                
-                completion = await completion_task
-            else:
+                active = _ActiveRequest(completion_task)
+                self.active_requests[request_id] = active
+            
+            try:
                 completion = await completion_task
+            except asyncio.CancelledError:
+                # Abandoned requests do not use up the token budget either
+                self._settle(charged, 0)
+                if active is not None and active.cancelled:
+                    raise HTTPException(status_code=499, detail="Request cancelled by client")
+                # The caller gave up (e.g. its client disconnected); stop the upstream call too
+                completion_task.cancel()
+                raise
+            except APIError:
+                # Failed or rejected requests do not use up the token budget
+                self._settle(charged, 0)
+                raise
+            self._settle(charged, completion.usage.total_tokens if completion.usage else None)
             
+            if self.limiter is not None:
+                self.limiter.record(time.monotonic() - started, stream=False)
+
             # Convert to dict format that matches the original interface
             return completion.model_dump()
         
         except AuthenticationError as e:
             raise HTTPException(status_code=401, detail=OpenAIClient.classify_openai_error(str(e)))
         except RateLimitError as e:
+            self._observe_failure()
             raise HTTPException(status_code=429, detail=OpenAIClient.classify_openai_error(str(e)))
         except BadRequestError as e:
             raise HTTPException(status_code=400, detail=OpenAIClient.classify_openai_error(str(e)))
         except APIError as e:
             status_code = getattr(e, 'status_code', 500)
+            if status_code >= 500:
+                self._observe_failure()
             raise HTTPException(status_code=status_code, detail=OpenAIClient.classify_openai_error(str(e)))
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
         
         finally:
             # Clean up active request tracking
-            if request_id and request_id in self.active_requests:
-                del self.active_requests[request_id]
+            if request_id and self.active_requests.get(request_id) is active:
+                self.active_requests.pop(request_id, None)
+            if acquired:
+                self.bulkhead.release()
+            self.in_flight -= 1
+            if self.retired and self.in_flight == 0:
+                await self.aclose()
     
-    async def create_chat_completion_stream(self, request: Dict[str, Any], request_id: Optional[str] = None) -> AsyncGenerator[str, None]:
-        """Send streaming chat completion to OpenAI API with cancellation support."""
+    async def create_chat_completion_stream(self, request: Dict[str, Any], request_id: Optional[str] = None) -> AsyncGenerator[OpenAIStreamChunk, None]:
+        """Send streaming chat completion to OpenAI API with cancellation support.
+
+        Yields each chunk as an already-parsed dict; the stream simply ends after the last chunk.
+        The upstream response is always closed on exit, so an abandoned or cancelled stream
+        releases its connection immediately instead of reading on until the model finishes.
+        """
         
-        # Create cancellation token if request_id provided
-        if request_id:
-            cancel_event = asyncio.Event()
-            self.active_requests[request_id] = cancel_event
+        self.in_flight += 1
+        streaming_completion = None
+        active = None
+        acquired = False
         
         try:
+            # The task iterating this generator is the one cancel_request() interrupts
+            if request_id:
+                active = _ActiveRequest(asyncio.current_task())
+                self.active_requests[request_id] = active
+
+            charged = await self._charge(request)
+            # The slot is held until the stream is fully consumed or closed
+            await self._acquire_slot(charged)
+            acquired = True
+            started = time.monotonic()
+
             # Ensure stream is enabled
             request["stream"] = True
             if "stream_options" not in request:
                 request["stream_options"] = {}
             request["stream_options"]["include_usage"] = True
             
-            # Create the streaming completion
-            streaming_completion = await self.client.chat.completions.create(**request)
-            
+            async def open_stream():
+                # Create the streaming completion and wait for its first chunk; until that
+                # chunk is forwarded nothing has reached the client, so this is safe to retry
+                stream = await self._create(request)
+                if active is not None:
+                    active.stream = stream
+                try:
+                    return stream, await stream.__anext__()
+                except StopAsyncIteration:
+                    return stream, None
+                except BaseException:
+                    await _close_stream(stream)
+                    raise
+
+            try:
+                streaming_completion, first_chunk = await self._with_retries(open_stream)
+            except APIError:
+                self._settle(charged, 0)
+                raise
+            if self.limiter is not None:
+                # Time to first token is the latency signal for streams
+                self.limiter.record(time.monotonic() - started, stream=True)
+            if first_chunk is None:
+                return
+            yield first_chunk.model_dump()
+            if active is not None:
+                # The first chunk may have been awaited by another task than the one reading the rest
+                active.task = asyncio.current_task()
+            usage = first_chunk.usage
+
             async for chunk in streaming_completion:
-                # Check for cancellation before yielding each chunk
-                if request_id and request_id in self.active_requests:
-                    if self.active_requests[request_id].is_set():
-                        raise HTTPException(status_code=499, detail="Request cancelled by client")
-                
-                # Convert chunk to SSE format matching original HTTP client format
-                chunk_dict = chunk.model_dump()
-                chunk_json = json.dumps(chunk_dict, ensure_ascii=False)
-                yield f"data: {chunk_json}"
-            
-            # Signal end of stream
-            yield "data: [DONE]"
-                
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                yield chunk.model_dump()
+            if usage is not None:
+                self._settle(charged, usage.total_tokens)
+
+        except asyncio.CancelledError:
+            if active is not None and active.cancelled:
+                raise HTTPException(status_code=499, detail="Request cancelled by client")
+            raise
         except AuthenticationError as e:
             raise HTTPException(status_code=401, detail=OpenAIClient.classify_openai_error(str(e)))
         except RateLimitError as e:
+            self._observe_failure()
             raise HTTPException(status_code=429, detail=OpenAIClient.classify_openai_error(str(e)))
         except BadRequestError as e:
             raise HTTPException(status_code=400, detail=OpenAIClient.classify_openai_error(str(e)))
         except APIError as e:
             status_code = getattr(e, 'status_code', 500)
+            if status_code >= 500:
+                self._observe_failure()
             raise HTTPException(status_code=status_code, detail=OpenAIClient.classify_openai_error(str(e)))
+        except HTTPException:
+            raise
         except Exception as e:
+            if active is not None and active.cancelled:
+                raise HTTPException(status_code=499, detail="Request cancelled by client")
             raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
         
         finally:
             # Clean up active request tracking
-            if request_id and request_id in self.active_requests:
-                del self.active_requests[request_id]
+            if request_id and self.active_requests.get(request_id) is active:
+                self.active_requests.pop(request_id, None)
+            if streaming_completion is not None:
+                await _close_stream(streaming_completion)
+            if acquired:
+                self.bulkhead.release()
+            self.in_flight -= 1
+            if self.retired and self.in_flight == 0:
+                await self.aclose()
+
+    def _observe_failure(self) -> None:
+        """Report an overload symptom (5xx, timeout, 429) to the adaptive limiter."""
+        if self.limiter is not None:
+            self.limiter.drop()
+
+    async def _with_retries(self, operation: Callable[[], Awaitable[T]]) -> T:
+        """Run operation through the retry policy, if one is configured."""
+        if self.retry_policy is None:
+            return await operation()
+        return await self.retry_policy.run(operation)
+
+    async def _create(self, request: Dict[str, Any]):
+        """Create a completion, feeding the response's rate limit headers to the limiter."""
+        if self.rate_limiter is None:
+            return await self.client.chat.completions.create(**request)
+        try:
+            raw = await self.client.chat.completions.with_raw_response.create(**request)
+        except APIStatusError as e:
+            self.rate_limiter.observe_headers(e.response.headers)
+            raise
+        self.rate_limiter.observe_headers(raw.headers)
+        return raw.parse()
+
+    async def _charge(self, request: Dict[str, Any]) -> Optional[Charge]:
+        """Wait for rate limit budget for a request; returns the charge."""
+        if self.rate_limiter is None:
+            return None
+        max_tokens = request.get("max_tokens") or request.get("max_completion_tokens") or 0
+        return await self.rate_limiter.acquire(estimate_prompt_tokens(request) + max_tokens)
+
+    async def _acquire_slot(self, charged: Optional[Charge]) -> None:
+        """Take a bulkhead slot, refunding the rate limit charge if none is granted."""
+        try:
+            await self.bulkhead.acquire()
+        except BaseException:
+            # Rejected, timed out or cancelled while queued: nothing reached the upstream
+            if charged is not None:
+                self.rate_limiter.refund(charged)
+            raise
+
+    def _settle(self, charged: Optional[Charge], actual: Optional[int]) -> None:
+        """Replace a token pre-charge with the tokens the request actually used, if known."""
+        if charged is not None and actual is not None:
+            self.rate_limiter.reconcile(charged, actual)
 
     @staticmethod
     def classify_openai_error(error_detail: Any) -> str:
@@ -166,8 +327,70 @@ class OpenAIClient:
         return str(error_detail)
     
     def cancel_request(self, request_id: str) -> bool:
-        """Cancel an active request by request_id."""
-        if request_id in self.active_requests:
-            self.active_requests[request_id].set()
-            return True
-        return False
\ No newline at end of file
+        """Cancel an active request by request_id.
+
+        Interrupts the task waiting on the upstream and closes an open upstream
+        stream right away, returning its connection slot to the pool.
+        """
+        active = self.active_requests.get(request_id)
+        if active is None:
+            return False
+        active.cancel()
+        return True
+
+    def retire(self) -> None:
+        """Stop handing this client out and close it once in-flight requests finish."""
+        self.retired = True
+        if self.in_flight == 0:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            _track(loop.create_task(self.aclose()))
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP connection pool."""
+        if self.closed:
+            return
+        self.closed = True
+        await self.client.close()
+
+
+class _ActiveRequest:
+    """Handles needed to tear down one in-flight upstream request."""
+
+    __slots__ = ("task", "stream", "cancelled")
+
+    def __init__(self, task: Optional[asyncio.Task]):
+        self.task = task
+        self.stream: Optional[AsyncStream] = None
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        if self.stream is not None:
+            # The consumer may be parked outside the stream (e.g. on a slow client);
+            # close the response now rather than when the generator is finalized
+            _track(asyncio.ensure_future(_close_stream(self.stream)))
+
+
+async def _close_stream(stream: AsyncStream) -> None:
+    """Close an upstream response, even from a task that is being cancelled."""
+    close = asyncio.ensure_future(stream.close())
+    _track(close)
+    try:
+        await asyncio.shield(close)
+    except (asyncio.CancelledError, Exception):
+        # Best effort; if this task is cancelled the close finishes in the background
+        pass
+
+
+def _track(task: asyncio.Future) -> None:
+    _closing_tasks.add(task)
+    task.add_done_callback(_closing_tasks.discard)
+
+
+# Keep references to background close tasks so they are not garbage collected
+_closing_tasks = set()
\ No newline at end of file
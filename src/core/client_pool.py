@@ -0,0 +1,133 @@
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.core.client import OpenAIClient
+from src.core.config import config
+from src.core.hedging import hedger
+from src.core.metrics import metrics
+from src.core.rate_limit import RateLimiter
+from src.core.retry import retry_policy
+from src.core.upstream import UpstreamGroup, parse_upstreams
+
+ClientKey = Tuple[str, str, Optional[str]]
+
+
+class ClientPool:
+    """Process-wide pool of long-lived upstream clients.
+
+    Clients are keyed by (base_url, api_key, api_version) so every request routed
+    to the same upstream reuses one httpx connection pool and its keep-alive
+    connections instead of paying for new TCP+TLS handshakes. Each model tier
+    is served by an UpstreamGroup balancing over one or more of these clients.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._clients: Dict[ClientKey, OpenAIClient] = {}
+        self._groups: Dict[str, UpstreamGroup] = {}
+
+    def get_client(
+        self, base_url: str, api_key: str, api_version: Optional[str] = None
+    ) -> OpenAIClient:
+        """Return the shared client for an upstream, creating it on first use."""
+        key = (base_url, api_key, api_version or None)
+        client = self._clients.get(key)
+        if client is None:
+            client = OpenAIClient(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=self.config.request_timeout,
+                api_version=api_version,
+                max_connections=self.config.max_connections,
+                max_keepalive_connections=self.config.max_keepalive_connections,
+                keepalive_expiry=self.config.keepalive_expiry,
+                retry_policy=retry_policy,
+                max_concurrency=self.config.upstream_max_concurrency,
+                max_queue=self.config.upstream_max_queue,
+                queue_timeout=self.config.upstream_queue_timeout,
+                adaptive_limit=self._adaptive_limit_settings(),
+                rate_limiter=self._rate_limiter(),
+            )
+            self._clients[key] = client
+        return client
+
+    def _adaptive_limit_settings(self) -> Optional[Dict[str, Any]]:
+        if not self.config.adaptive_concurrency_enabled:
+            return None
+        return {
+            "initial_limit": self.config.adaptive_initial_limit,
+            "min_limit": self.config.adaptive_min_limit,
+            "max_limit": self.config.adaptive_max_limit,
+            "tolerance": self.config.adaptive_tolerance,
+        }
+
+    def _rate_limiter(self) -> Optional[RateLimiter]:
+        if not self.config.rate_limit_enabled:
+            return None
+        # Every worker process paces on its own, so each gets a share of the account's limits,
+        # including those learned from rate limit headers
+        workers = self.config.workers
+        rpm, tpm = self.config.rate_limit_rpm, self.config.rate_limit_tpm
+        return RateLimiter(
+            rpm=max(1, rpm // workers) if rpm > 0 else 0,
+            tpm=max(1, tpm // workers) if tpm > 0 else 0,
+            max_wait=self.config.rate_limit_max_wait,
+            share=1 / workers,
+        )
+
+    def get_group(
+        self, name: str, upstreams: str, base_url: str, api_key: str, api_version: Optional[str] = None,
+        successor: Optional[Callable[[str], UpstreamGroup]] = None,
+    ) -> UpstreamGroup:
+        """Return the load-balanced group of pooled clients serving a model tier.
+
+        upstreams is the tier's endpoint list (see parse_upstreams); when empty the
+        group has the single base_url/api_key endpoint. successor returns the
+        tier's current group, which takes over once a reload retires this one.
+        """
+        group = self._groups.get(name)
+        if group is None:
+            endpoints = parse_upstreams(upstreams, base_url, api_key)
+            group = UpstreamGroup(
+                name,
+                [self.get_client(endpoint.base_url, endpoint.api_key, api_version) for endpoint in endpoints],
+                [endpoint.weight for endpoint in endpoints],
+                strategy=self.config.load_balancing,
+                hedger=hedger,
+                config=self.config,
+                successor=successor,
+            )
+            self._groups[name] = group
+        return group
+
+    def stats(self) -> Dict[str, Any]:
+        """Endpoints and outstanding requests of every tier."""
+        return {name: group.stats() for name, group in self._groups.items()}
+
+    def collect_metrics(self) -> None:
+        """Publish outstanding upstream calls per endpoint to the in-flight gauge."""
+        metrics.upstream_in_flight.clear()
+        for client in self._clients.values():
+            metrics.upstream_in_flight.labels(client.base_url).inc(client.in_flight)
+
+    def reset(self) -> None:
+        """Drop all pooled clients so they are rebuilt from the current config.
+
+        Clients still serving requests are retired and closed once they drain;
+        groups handed out earlier send new requests through the new clients.
+        """
+        clients, self._clients = self._clients, {}
+        self._groups = {}
+        for client in clients.values():
+            client.retire()
+
+    async def aclose(self) -> None:
+        """Close every pooled client (used on application shutdown)."""
+        clients, self._clients = self._clients, {}
+        self._groups = {}
+        for client in clients.values():
+            await client.aclose()
+
+
+client_pool = ClientPool(config)
+config.add_reload_listener(client_pool.reset)
+metrics.add_collector(client_pool.collect_metrics)
@@ -0,0 +1,191 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict
+
+from fastapi import HTTPException
+
+# Status Anthropic uses for overloaded_error
+OVERLOADED_STATUS = 529
+
+
+class OverloadedError(HTTPException):
+    """Raised when an upstream's wait queue is full or the wait timed out."""
+
+    error_type = "overloaded_error"
+
+    def __init__(self, detail: str):
+        super().__init__(status_code=OVERLOADED_STATUS, detail=detail)
+
+
+class Bulkhead:
+    """Concurrency limit for one upstream with a bounded FIFO wait queue.
+
+    Up to ``limit`` requests run at once (0 means unlimited); up to
+    ``max_queue`` more wait in arrival order for at most ``queue_timeout``
+    seconds. Anything beyond that fails fast with OverloadedError instead of
+    piling more work onto a saturated backend.
+    """
+
+    def __init__(self, limit: int = 0, max_queue: int = 100, queue_timeout: float = 30.0):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _has_capacity(self) -> bool:
+        return self.limit <= 0 or self.active < self.limit
+
+    async def acquire(self) -> None:
+        """Wait for a slot; raises OverloadedError when the queue is full or the wait times out."""
+        self.admitted += 1
+        if self._has_capacity() and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise OverloadedError("Upstream is overloaded: too many queued requests")
+
+        self.queued += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise OverloadedError(f"Upstream is overloaded: no capacity within {self.queue_timeout:g}s")
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the longest waiting request."""
+        self.active -= 1
+        self._wake()
+
+    def set_limit(self, limit: int) -> None:
+        """Change the limit; waiters are admitted immediately if it grew."""
+        self.limit = limit
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Limit, occupancy and queueing counters."""
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": self.queue_depth,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "avg_wait": round(self.total_wait / self.queued, 4) if self.queued else 0.0,
+            "max_wait": round(self.max_wait, 4),
+        }
+
+
+class AdaptiveLimit:
+    """Gradient-style adaptive concurrency limit for one upstream's bulkhead.
+
+    Tracks a short-term moving average of latency and, as the no-load
+    baseline, the lowest that average has been over the last few hundred
+    requests. Latency is kept separately for time to first token (streams)
+    and full response time. While the average stays within ``tolerance`` of
+    the baseline and the limit is in use, the limit grows by about
+    sqrt(limit) per update; when latency inflates the limit shrinks in
+    proportion (at most halving), which keeps the backend near the knee of
+    its throughput curve. Errors and timeouts count as maximally inflated.
+    """
+
+    _SHORT_ALPHA = 0.2
+    _SMOOTHING = 0.2
+    # Samples after which the baseline is re-learned, so it can follow a slower backend
+    _BASELINE_WINDOW = 500
+
+    def __init__(self, bulkhead: Bulkhead, initial_limit: int, min_limit: int, max_limit: int, tolerance: float = 1.5):
+        self.bulkhead = bulkhead
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.estimated_limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._short: Dict[bool, float] = {}
+        self._baseline: Dict[bool, float] = {}
+        self._next_baseline: Dict[bool, float] = {}
+        self._samples: Dict[bool, int] = {}
+        self.increases = 0
+        self.decreases = 0
+        bulkhead.set_limit(int(self.estimated_limit))
+
+    def record(self, latency: float, stream: bool) -> None:
+        """Feed one successful request's latency (first token for streams)."""
+        short = self._short.get(stream)
+        short = latency if short is None else short + self._SHORT_ALPHA * (latency - short)
+        self._short[stream] = short
+
+        # Windowed minimum: the current window's minimum becomes the baseline for the next one
+        samples = self._samples.get(stream, 0) + 1
+        self._next_baseline[stream] = min(short, self._next_baseline.get(stream, short))
+        if samples >= self._BASELINE_WINDOW:
+            self._baseline[stream] = self._next_baseline.pop(stream)
+            samples = 0
+        self._samples[stream] = samples
+        baseline = min(self._baseline.get(stream, short), self._next_baseline.get(stream, short))
+        self._update(max(0.5, min(1.0, self.tolerance * baseline / short)))
+
+    def drop(self) -> None:
+        """Feed a failed or timed-out request."""
+        self._update(0.5)
+
+    def _update(self, gradient: float) -> None:
+        limit = self.estimated_limit
+        if gradient >= 1.0 and self.bulkhead.active < limit / 2:
+            # Not using the current limit; no evidence it should grow
+            return
+        target = limit * gradient + limit ** 0.5
+        limit = limit * (1 - self._SMOOTHING) + target * self._SMOOTHING
+        limit = min(max(limit, self.min_limit), self.max_limit)
+        if int(limit) > self.bulkhead.limit:
+            self.increases += 1
+        elif int(limit) < self.bulkhead.limit:
+            self.decreases += 1
+        self.estimated_limit = limit
+        self.bulkhead.set_limit(int(limit))
+
+    def stats(self) -> Dict[str, Any]:
+        """Current estimate and latency averages."""
+        return {
+            "estimated_limit": round(self.estimated_limit, 2),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "latency": {("stream" if stream else "response"): round(value, 4) for stream, value in self._short.items()},
+            "baseline": {
+                ("stream" if stream else "response"): round(min(self._baseline.get(stream, value), value), 4)
+                for stream, value in self._next_baseline.items()
+            },
+        }
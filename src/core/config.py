@@ -4,6 +4,7 @@ import sys
 # Configuration
 class Config:
     def __init__(self):
+        self._reload_listeners = []
         self._load_config()
 
     def _load_config(self):
@@ -14,6 +15,8 @@ class Config:
         self.big_model_base_url = os.environ.get("BIG_MODEL_BASE_URL", os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1"))
         self.big_model_name = os.environ.get("BIG_MODEL_NAME", os.environ.get("BIG_MODEL", "gpt-4o"))
         self.big_model_azure_api_version = os.environ.get("BIG_MODEL_AZURE_API_VERSION", os.environ.get("AZURE_API_VERSION"))
+        # Optional weighted replicas replacing BIG_MODEL_BASE_URL: "base_url[|weight[|api_key]],..."
+        self.big_model_upstreams = os.environ.get("BIG_MODEL_UPSTREAMS", "")
 
         # Provider for the SMALL model
         self.small_model_provider = os.environ.get("SMALL_MODEL_PROVIDER", "openai")
@@ -21,13 +24,20 @@ class Config:
         self.small_model_base_url = os.environ.get("SMALL_MODEL_BASE_URL", os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1"))
         self.small_model_name = os.environ.get("SMALL_MODEL_NAME", os.environ.get("SMALL_MODEL", "gpt-4o-mini"))
         self.small_model_azure_api_version = os.environ.get("SMALL_MODEL_AZURE_API_VERSION", os.environ.get("AZURE_API_VERSION"))
+        self.small_model_upstreams = os.environ.get("SMALL_MODEL_UPSTREAMS", "")
 
         if not self.big_model_api_key or not self.small_model_api_key:
             raise ValueError("API key not found for one or more models in environment variables")
 
         self.host = os.environ.get("HOST", "0.0.0.0")
         self.port = int(os.environ.get("PORT", "8082"))
+        # Server processes; with several, each polls the .env file to pick up admin changes
+        self.workers = max(1, int(os.environ.get("WORKERS", "1")))
+        self.config_watch_interval = float(os.environ.get("CONFIG_WATCH_INTERVAL", "2"))
         self.log_level = os.environ.get("LOG_LEVEL", "INFO")
+        self.log_format = os.environ.get("LOG_FORMAT", "text")
+        self.log_sample_rates = os.environ.get("LOG_SAMPLE_RATES", "")
+        self.log_max_field_chars = int(os.environ.get("LOG_MAX_FIELD_CHARS", "500"))
         self.max_tokens_limit = int(os.environ.get("MAX_TOKENS_LIMIT", "8196"))
         self.min_tokens_limit = int(os.environ.get("MIN_TOKENS_LIMIT", "100"))
 
@@ -35,11 +45,98 @@ class Config:
         self.request_timeout = int(os.environ.get("REQUEST_TIMEOUT", "90"))
         self.max_retries = int(os.environ.get("MAX_RETRIES", "2"))
 
+        # Per-upstream concurrency limit (0 = unlimited) with a bounded wait queue
+        self.upstream_max_concurrency = int(os.environ.get("UPSTREAM_MAX_CONCURRENCY", "0"))
+        self.upstream_max_queue = int(os.environ.get("UPSTREAM_MAX_QUEUE", "100"))
+        self.upstream_queue_timeout = float(os.environ.get("UPSTREAM_QUEUE_TIMEOUT", "30"))
+
+        # Adaptive concurrency: let upstream latency move the per-upstream limit
+        self.adaptive_concurrency_enabled = os.environ.get("ADAPTIVE_CONCURRENCY_ENABLED", "false").lower() == "true"
+        self.adaptive_initial_limit = int(os.environ.get("ADAPTIVE_INITIAL_LIMIT", "20"))
+        self.adaptive_min_limit = int(os.environ.get("ADAPTIVE_MIN_LIMIT", "2"))
+        self.adaptive_max_limit = int(os.environ.get("ADAPTIVE_MAX_LIMIT", "200"))
+        self.adaptive_tolerance = float(os.environ.get("ADAPTIVE_TOLERANCE", "1.5"))
+
+        # Client-side rate limiting per upstream account
+        self.rate_limit_enabled = os.environ.get("RATE_LIMIT_ENABLED", "false").lower() == "true"
+        self.rate_limit_rpm = int(os.environ.get("RATE_LIMIT_RPM", "0"))
+        self.rate_limit_tpm = int(os.environ.get("RATE_LIMIT_TPM", "0"))
+        self.rate_limit_max_wait = float(os.environ.get("RATE_LIMIT_MAX_WAIT", "30"))
+
+        # Retry backoff and the process-wide retry budget
+        self.retry_base_delay = float(os.environ.get("RETRY_BASE_DELAY", "0.5"))
+        self.retry_max_delay = float(os.environ.get("RETRY_MAX_DELAY", "8"))
+        self.retry_budget_ratio = float(os.environ.get("RETRY_BUDGET_RATIO", "0.1"))
+        self.retry_budget_min_per_second = float(os.environ.get("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+
+        # Replica selection within a tier: least_outstanding or p2c
+        self.load_balancing = os.environ.get("LOAD_BALANCING", "least_outstanding")
+
+        # Per-upstream circuit breakers and outlier ejection
+        self.breaker_enabled = os.environ.get("BREAKER_ENABLED", "true").lower() == "true"
+        self.breaker_consecutive_failures = int(os.environ.get("BREAKER_CONSECUTIVE_FAILURES", "5"))
+        self.breaker_error_rate = float(os.environ.get("BREAKER_ERROR_RATE", "0.5"))
+        self.breaker_min_requests = int(os.environ.get("BREAKER_MIN_REQUESTS", "20"))
+        self.breaker_latency_factor = float(os.environ.get("BREAKER_LATENCY_FACTOR", "3"))
+        self.breaker_base_ejection = float(os.environ.get("BREAKER_BASE_EJECTION", "30"))
+        self.breaker_max_ejection = float(os.environ.get("BREAKER_MAX_EJECTION", "300"))
+
+        # Hedged requests: race a slow call against a duplicate
+        self.hedge_enabled = os.environ.get("HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_tiers = os.environ.get("HEDGE_TIERS", "small")
+        self.hedge_percentile = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+        self.hedge_min_samples = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+        self.hedge_min_delay = float(os.environ.get("HEDGE_MIN_DELAY", "0.1"))
+
+        # Upstream connection pool settings
+        self.max_connections = int(os.environ.get("MAX_CONNECTIONS", "100"))
+        self.max_keepalive_connections = int(os.environ.get("MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.keepalive_expiry = float(os.environ.get("KEEPALIVE_EXPIRY", "60"))
+
+        # Exact-match response cache for deterministic (temperature 0) requests
+        self.response_cache_enabled = os.environ.get("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+        self.response_cache_ttl = int(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+        self.response_cache_max_bytes = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.response_cache_dir = os.environ.get("RESPONSE_CACHE_DIR", "")
+        self.response_cache_disk_max_bytes = int(os.environ.get("RESPONSE_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+        # Decode /v1/messages bodies with msgspec instead of pydantic (requires the "fast" extra)
+        self.fast_decode = os.environ.get("FAST_DECODE", "false").lower() == "true"
+
+        # Local BPE vocabularies (<encoding>.tiktoken) for count_tokens; never downloaded
+        self.tokenizer_vocab_dir = os.environ.get("TOKENIZER_VOCAB_DIR", "")
+        self.token_count_cache_size = int(os.environ.get("TOKEN_COUNT_CACHE_SIZE", "20000"))
+
+        # Memoized conversion of the repeated conversation prefix
+        self.conversion_cache_enabled = os.environ.get("CONVERSION_CACHE_ENABLED", "true").lower() == "true"
+        self.conversion_cache_max_bytes = int(os.environ.get("CONVERSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+        # Single-flight coalescing of identical concurrent requests
+        self.single_flight_enabled = os.environ.get("SINGLE_FLIGHT_ENABLED", "false").lower() == "true"
+        self.single_flight_buffer_events = int(os.environ.get("SINGLE_FLIGHT_BUFFER_EVENTS", "1024"))
+
+        # Prometheus metrics at /metrics
+        self.metrics_enabled = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+
+        # Per-request phase timing and the slow request log
+        self.request_timing_enabled = os.environ.get("REQUEST_TIMING_ENABLED", "true").lower() == "true"
+        self.slow_request_threshold = float(os.environ.get("SLOW_REQUEST_THRESHOLD", "10"))
+        self.slow_request_log_size = int(os.environ.get("SLOW_REQUEST_LOG_SIZE", "100"))
+
     def reload(self):
         """Reload configuration from environment variables"""
         print("🔄 Reloading configuration...")
         self._load_config()
+        for listener in self._reload_listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"Warning: Config reload listener failed: {e}")
         print("✅ Configuration reloaded successfully")
+
+    def add_reload_listener(self, listener):
+        """Register a callback invoked after every successful reload."""
+        self._reload_listeners.append(listener)
         
     def validate_api_key(self, key):
         """Basic API key validation. Just checks for presence."""
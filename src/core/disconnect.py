@@ -0,0 +1,74 @@
+import asyncio
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from fastapi import HTTPException, Request
+
+from src.core.logging import logger
+
+T = TypeVar("T")
+
+
+class DisconnectWatcher:
+    """Watch one request for a client disconnect without polling.
+
+    A single background task waits on the ASGI receive channel, so a
+    disconnect is noticed as soon as the server reports it, even while the
+    upstream call is still waiting for its next chunk.
+    """
+
+    def __init__(self, request: Request, on_disconnect: Optional[Callable[[], None]] = None):
+        self.request = request
+        self.on_disconnect = on_disconnect
+        self.disconnected = False
+        self._event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "DisconnectWatcher":
+        """Start listening; the request body must already have been read."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+        return self
+
+    def stop(self) -> None:
+        """Stop listening."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def __aenter__(self) -> "DisconnectWatcher":
+        return self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.stop()
+
+    async def guard(self, awaitable: Awaitable[T]) -> T:
+        """Await awaitable, cancelling it and raising 499 if the client disconnects first."""
+        work = asyncio.ensure_future(awaitable)
+        disconnect = asyncio.create_task(self._event.wait())
+        try:
+            await asyncio.wait([work, disconnect], return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            work.cancel()
+            raise
+        finally:
+            disconnect.cancel()
+        if not work.done():
+            work.cancel()
+            try:
+                await work
+            except (asyncio.CancelledError, HTTPException):
+                pass
+            raise HTTPException(status_code=499, detail="Client disconnected")
+        return work.result()
+
+    async def _watch(self) -> None:
+        while True:
+            message = await self.request.receive()
+            if message["type"] == "http.disconnect":
+                break
+        self.disconnected = True
+        self._event.set()
+        if self.on_disconnect is not None:
+            try:
+                self.on_disconnect()
+            except Exception as e:
+                logger.warning(f"Disconnect callback failed: {e}")
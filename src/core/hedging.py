@@ -0,0 +1,180 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from src.core.config import config
+from src.core.logging import logger
+
+T = TypeVar("T")
+
+# Recent latencies kept per upstream/model/mode for the hedge threshold
+_WINDOW_SIZE = 256
+
+
+class LatencyWindow:
+    """Sliding window of recent latencies with a cached percentile."""
+
+    __slots__ = ("samples", "_threshold")
+
+    def __init__(self):
+        self.samples = deque(maxlen=_WINDOW_SIZE)
+        self._threshold: Optional[float] = None
+
+    def record(self, latency: float) -> None:
+        self.samples.append(latency)
+        self._threshold = None
+
+    def percentile(self, percentile: float) -> float:
+        if self._threshold is None:
+            ordered = sorted(self.samples)
+            index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+            self._threshold = ordered[index]
+        return self._threshold
+
+
+class Hedger:
+    """Hedged requests: if an attempt is slower than a recent latency percentile,
+    start an identical second attempt and keep whichever succeeds first.
+
+    Latency is measured to the full response for non-streaming calls and to the
+    first chunk for streams, always from the start of the first attempt, so a
+    hedged request records at least the time its primary was known to take.
+    Hedging only starts once enough samples exist.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._windows: Dict[Hashable, LatencyWindow] = {}
+        self._pending = set()
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.reload()
+
+    def reload(self) -> None:
+        """Apply the current hedging settings."""
+        self.enabled = self.config.hedge_enabled
+        self.tiers = {tier.strip() for tier in self.config.hedge_tiers.split(",") if tier.strip()}
+        self.percentile = self.config.hedge_percentile
+        self.min_samples = self.config.hedge_min_samples
+        self.min_delay = self.config.hedge_min_delay
+
+    def enabled_for(self, tier: str) -> bool:
+        """Whether requests routed to a model tier ("big" or "small") are hedged."""
+        return self.enabled and tier in self.tiers
+
+    def hedge_delay(self, key: Hashable) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples."""
+        window = self._windows.get(key)
+        if window is None or len(window.samples) < self.min_samples:
+            return None
+        return max(self.min_delay, window.percentile(self.percentile))
+
+    def record(self, key: Hashable, latency: float) -> None:
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = LatencyWindow()
+        window.record(latency)
+
+    async def run(
+        self,
+        key: Hashable,
+        attempt: Callable[[], Awaitable[T]],
+        discard: Optional[Callable[[T], Awaitable[None]]] = None,
+    ) -> T:
+        """Run attempt(), hedging it with a second attempt once it is slower than usual.
+
+        discard releases the result of an attempt that completed but lost the race.
+        """
+        self.requests += 1
+        delay = self.hedge_delay(key)
+        started = time.monotonic()
+        primary = asyncio.ensure_future(attempt())
+        if delay is not None:
+            try:
+                await asyncio.wait([primary], timeout=delay)
+            except asyncio.CancelledError:
+                self._abandon({primary}, discard)
+                raise
+        if delay is None or primary.done():
+            # Fast path: no hedge was needed
+            return await self._finish(key, primary, started, discard)
+
+        try:
+            secondary = asyncio.ensure_future(attempt())
+        except Exception as e:
+            # No second attempt can start (e.g. the other members are ejected); keep the first
+            logger.debug(f"Not hedging request: {e}")
+            return await self._finish(key, primary, started, discard)
+        except BaseException:
+            self._abandon({primary}, discard)
+            raise
+        self.hedged += 1
+        logger.debug(f"Hedging request after {delay:.3f}s")
+        pending = {primary, secondary}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in (primary, secondary):
+                    if task not in done:
+                        continue
+                    if task.exception() is not None:
+                        # Let the other attempt finish; report the primary's error if both fail
+                        if task is primary or error is None:
+                            error = task.exception()
+                        continue
+                    if task is secondary:
+                        self.hedge_wins += 1
+                    # Timed from the primary's start even when the hedge wins: the
+                    # primary took at least this long, and hedge-relative times would
+                    # pull the threshold down and hedge ever more requests
+                    self.record(key, time.monotonic() - started)
+                    self._abandon(pending, discard)
+                    # Both may have completed in the same iteration
+                    self._abandon(done - {task}, discard)
+                    return task.result()
+            raise error
+        except asyncio.CancelledError:
+            self._abandon({primary, secondary}, discard)
+            raise
+
+    async def _finish(self, key: Hashable, primary: asyncio.Future, started: float, discard) -> Any:
+        """Await an unhedged attempt, abandoning it if the caller is cancelled."""
+        try:
+            result = await primary
+        except asyncio.CancelledError:
+            self._abandon({primary}, discard)
+            raise
+        self.record(key, time.monotonic() - started)
+        return result
+
+    def _abandon(self, tasks, discard) -> None:
+        """Cancel losing attempts and release any result they still produce."""
+        for task in tasks:
+            task.cancel()
+            task.add_done_callback(lambda done: self._discard(done, discard))
+
+    def _discard(self, task: asyncio.Future, discard) -> None:
+        # Retrieving the exception also keeps asyncio from logging it as unhandled
+        if task.cancelled() or task.exception() is not None or discard is None:
+            return
+        cleanup = asyncio.ensure_future(discard(task.result()))
+        self._pending.add(cleanup)
+        cleanup.add_done_callback(self._pending.discard)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hedge counters."""
+        return {
+            "enabled": self.enabled,
+            "tiers": sorted(self.tiers),
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+hedger = Hedger(config)
+config.add_reload_listener(hedger.reload)
@@ -1,4 +1,13 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import queue
+import random
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
 from src.core.config import config
 
 # Parse log level - extract just the first word to handle comments
@@ -9,13 +18,155 @@ valid_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
 if log_level not in valid_levels:
     log_level = 'INFO'
 
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Per-request logging context (route, request id and sampling decision)
+_log_context: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "log_context", default=None
+)
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse LOG_SAMPLE_RATES, e.g. "/v1/messages=0.1,/v1/messages/count_tokens=0"."""
+    rates = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        route, rate = item.split("=", 1)
+        try:
+            rates[route.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+_sample_rates = parse_sample_rates(config.log_sample_rates)
+
+
+def bind_request_context(route: str, request_id: Optional[str] = None) -> None:
+    """Bind the current request's route and decide whether its logs are sampled."""
+    rate = _sample_rates.get(route, 1.0)
+    _log_context.set(
+        {"route": route, "request_id": request_id, "sampled": rate >= 1.0 or random.random() < rate}
+    )
+
+
+def bind_request_id(request_id: str) -> None:
+    """Attach a request id to the current logging context."""
+    context = _log_context.get()
+    if context is not None:
+        context["request_id"] = request_id
+
+
+def redact(value: Any, max_chars: Optional[int] = None) -> Any:
+    """Return a copy of a payload that is safe and cheap to log.
+
+    Base64 image data is replaced by a size marker and long strings (tool
+    results, file contents) are truncated to max_chars.
+    """
+    if max_chars is None:
+        max_chars = config.log_max_field_chars
+    if isinstance(value, str):
+        if value.startswith("data:") and ";base64," in value[:100]:
+            return f"<{value[:value.index(';')]} base64 {len(value)} chars>"
+        if len(value) > max_chars:
+            return f"{value[:max_chars]}...<{len(value) - max_chars} more chars>"
+        return value
+    if isinstance(value, dict):
+        if value.get("type") == "base64" and isinstance(value.get("data"), str):
+            return {**value, "data": f"<base64 {len(value['data'])} chars>"}
+        return {key: redact(item, max_chars) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item, max_chars) for item in value]
+    return value
+
+
+class LazyJSON:
+    """Defer redaction and JSON serialization of a payload until a record is emitted.
+
+    Use as a %-style logging argument: ``logger.debug("Request: %s", LazyJSON(payload))``.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        return json.dumps(redact(self.value), ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach request context to records and drop unsampled low-severity records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        if context is None:
+            record.route = None
+            record.request_id = None
+            return True
+        if not context["sampled"] and record.levelno < logging.WARNING:
+            return False
+        record.route = context["route"]
+        record.request_id = context["request_id"]
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "route", None):
+            entry["route"] = record.route
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RequestLogContextMiddleware:
+    """ASGI middleware binding the logging context for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            bind_request_context(scope["path"])
+        await self.app(scope, receive, send)
+
+
 # Logging Configuration
+# The event loop only enqueues records; a listener thread formats and writes them.
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_output_handler = logging.StreamHandler()
+if config.log_format.lower() == "json":
+    _output_handler.setFormatter(JSONFormatter())
+else:
+    _output_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+# Only merge message args on the caller's side; layout happens in the listener
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))
+_queue_handler.addFilter(RequestContextFilter())
+
 logging.basicConfig(
     level=getattr(logging, log_level),
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[_queue_handler],
 )
+_listener = logging.handlers.QueueListener(_log_queue, _output_handler, respect_handler_level=True)
+_listener.start()
+atexit.register(_listener.stop)
+
 logger = logging.getLogger(__name__)
 
 # Configure uvicorn to be quieter
 for uvicorn_logger in ["uvicorn", "uvicorn.access", "uvicorn.error"]:
-    logging.getLogger(uvicorn_logger).setLevel(logging.WARNING)
\ No newline at end of file
+    logging.getLogger(uvicorn_logger).setLevel(logging.WARNING)
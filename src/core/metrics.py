@@ -0,0 +1,359 @@
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from typing import Any, AsyncGenerator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.core.config import config
+
+# Bucket upper bounds (seconds, or tokens per second)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+TTFT_BUCKETS = (0.05, 0.1, 0.2, 0.35, 0.5, 0.75, 1.0, 2.0, 5.0, 10.0, 30.0)
+TOKEN_RATE_BUCKETS = (1.0, 5.0, 10.0, 20.0, 35.0, 50.0, 75.0, 100.0, 200.0, 500.0, 1000.0)
+
+# Status recorded for a client that went away before the response finished
+CANCELLED_STATUS = 499
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class GaugeChild(CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bucket plus +Inf; made cumulative only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """A metric family whose label children are created once and then reused."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Drop every child (for gauges rebuilt by a collector)."""
+        self._children.clear()
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in list(self._children.items()):
+            yield from self._render_child(values, child)
+
+    def _render_child(self, values, child) -> Iterable[str]:
+        yield f"{self.name}{self._label_text(values)} {_number(child.value)}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return GaugeChild()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], buckets: Tuple[float, ...]):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def _render_child(self, values, child) -> Iterable[str]:
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_number(bound)}"'
+            yield f"{self.name}_bucket{self._label_text(values, le)} {cumulative}"
+        yield f"{self.name}_sum{self._label_text(values)} {_number(child.sum)}"
+        yield f"{self.name}_count{self._label_text(values)} {child.count}"
+
+
+class RequestSeries:
+    """Every child a /v1/messages request for one tier and upstream model records into.
+
+    Fetched once per request so observations are plain attribute updates.
+    """
+
+    __slots__ = ("_metrics", "_labels", "_statuses", "duration", "ttft", "token_rate",
+                 "input_tokens", "output_tokens", "cached_tokens", "streams_in_flight", "cancellations")
+
+    def __init__(self, metrics: "ProxyMetrics", labels: Tuple[str, str, str]):
+        self._metrics = metrics
+        self._labels = labels
+        self._statuses: Dict[int, CounterChild] = {}
+        models = labels[:2]
+        self.duration = metrics.request_duration.labels(*labels)
+        self.ttft = metrics.time_to_first_token.labels(*models)
+        self.token_rate = metrics.output_tokens_per_second.labels(*labels)
+        self.input_tokens = metrics.input_tokens.labels(*models)
+        self.output_tokens = metrics.output_tokens.labels(*models)
+        self.cached_tokens = metrics.cached_prompt_tokens.labels(*models)
+        self.streams_in_flight = metrics.streams_in_flight.labels(*models)
+        self.cancellations = metrics.cancellations.labels(*labels)
+
+    def status(self, status_code: int) -> CounterChild:
+        child = self._statuses.get(status_code)
+        if child is None:
+            child = self._statuses[status_code] = self._metrics.requests.labels(*self._labels, str(status_code))
+        return child
+
+    def finish(self, status_code: int, started: float) -> None:
+        """Count a request and its total latency."""
+        self.status(status_code).inc()
+        self.duration.observe(time.monotonic() - started)
+        if status_code == CANCELLED_STATUS:
+            self.cancellations.inc()
+
+    def observe_usage(self, usage: Optional[Dict[str, Any]], generation_time: float) -> None:
+        """Token counters and output rate from an OpenAI usage object."""
+        if not usage:
+            return
+        completion_tokens = usage.get("completion_tokens") or 0
+        self.input_tokens.inc(usage.get("prompt_tokens") or 0)
+        self.output_tokens.inc(completion_tokens)
+        details = usage.get("prompt_tokens_details")
+        if details:
+            self.cached_tokens.inc(details.get("cached_tokens") or 0)
+        if completion_tokens and generation_time > 0:
+            self.token_rate.observe(completion_tokens / generation_time)
+
+    async def track_stream(
+        self, stream: AsyncGenerator[Dict[str, Any], None], started: float
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Pass an OpenAI chunk stream through, timing its first token and reading its usage."""
+        self.streams_in_flight.inc()
+        first_token = None
+        usage = None
+        status_code = CANCELLED_STATUS
+        try:
+            async for chunk in stream:
+                if first_token is None:
+                    first_token = time.monotonic()
+                    self.ttft.observe(first_token - started)
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                yield chunk
+            status_code = 200
+        except (asyncio.CancelledError, GeneratorExit):
+            raise
+        except BaseException as e:
+            status_code = getattr(e, "status_code", 500)
+            raise
+        finally:
+            self.streams_in_flight.dec()
+            if status_code == 200:
+                self.observe_usage(usage, time.monotonic() - (first_token or started))
+            self.finish(status_code, started)
+            await stream.aclose()
+
+    async def track_usage(
+        self, stream: AsyncGenerator[Dict[str, Any], None]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Pass a shared OpenAI chunk stream through, counting its tokens once for all subscribers."""
+        first_chunk = None
+        usage = None
+        complete = False
+        try:
+            async for chunk in stream:
+                if first_chunk is None:
+                    first_chunk = time.monotonic()
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                yield chunk
+            complete = True
+        finally:
+            if complete and first_chunk is not None:
+                self.observe_usage(usage, time.monotonic() - first_chunk)
+            await stream.aclose()
+
+    async def track_subscriber(
+        self, events: AsyncGenerator[Any, None], started: float
+    ) -> AsyncGenerator[Any, None]:
+        """Pass one client's copy of a shared stream through, counting it as a request of its own."""
+        self.streams_in_flight.inc()
+        first_event = True
+        status_code = CANCELLED_STATUS
+        try:
+            async for event in events:
+                if first_event:
+                    self.ttft.observe(time.monotonic() - started)
+                    first_event = False
+                yield event
+            status_code = 200
+        except (asyncio.CancelledError, GeneratorExit):
+            raise
+        except BaseException as e:
+            status_code = getattr(e, "status_code", 500)
+            raise
+        finally:
+            self.streams_in_flight.dec()
+            self.finish(status_code, started)
+            await events.aclose()
+
+
+class UpstreamSeries:
+    """Children for calls of one upstream model on one endpoint."""
+
+    __slots__ = ("success", "error", "rejected", "cancelled", "latency")
+
+    def __init__(self, metrics: "ProxyMetrics", upstream_model: str, endpoint: str):
+        self.success = metrics.upstream_requests.labels(upstream_model, endpoint, "success")
+        self.error = metrics.upstream_requests.labels(upstream_model, endpoint, "error")
+        self.rejected = metrics.upstream_requests.labels(upstream_model, endpoint, "rejected")
+        self.cancelled = metrics.upstream_requests.labels(upstream_model, endpoint, "cancelled")
+        # Indexed by the stream flag
+        self.latency = (
+            metrics.upstream_latency.labels(upstream_model, endpoint, "false"),
+            metrics.upstream_latency.labels(upstream_model, endpoint, "true"),
+        )
+
+
+class ProxyMetrics:
+    """Process-wide request, token and upstream metrics in the Prometheus text format.
+
+    Label children are created on first use and cached, so recording an
+    observation never allocates; only /metrics rendering builds strings.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.enabled = config.metrics_enabled
+        # Tiers and configured upstream models only, so clients cannot create series at will
+        request_labels = ("tier", "upstream_model", "stream")
+        model_labels = ("tier", "upstream_model")
+        upstream_labels = ("upstream_model", "endpoint")
+        self.requests = Counter(
+            "claude_proxy_requests_total", "Messages requests by response status.", request_labels + ("status",))
+        self.request_duration = Histogram(
+            "claude_proxy_request_duration_seconds", "Total time to serve a messages request.",
+            request_labels, LATENCY_BUCKETS)
+        self.time_to_first_token = Histogram(
+            "claude_proxy_time_to_first_token_seconds", "Time until the first upstream chunk of a stream.",
+            model_labels, TTFT_BUCKETS)
+        self.output_tokens_per_second = Histogram(
+            "claude_proxy_output_tokens_per_second", "Generation speed after the first token.",
+            request_labels, TOKEN_RATE_BUCKETS)
+        self.input_tokens = Counter("claude_proxy_input_tokens_total", "Prompt tokens reported upstream.", model_labels)
+        self.output_tokens = Counter("claude_proxy_output_tokens_total", "Completion tokens reported upstream.", model_labels)
+        self.cached_prompt_tokens = Counter(
+            "claude_proxy_cached_prompt_tokens_total", "Prompt tokens served from the upstream prompt cache.", model_labels)
+        self.streams_in_flight = Gauge("claude_proxy_streams_in_flight", "Streams currently being served.", model_labels)
+        self.cancellations = Counter(
+            "claude_proxy_cancellations_total", "Requests abandoned by their client.", request_labels)
+        self.upstream_requests = Counter(
+            "claude_proxy_upstream_requests_total", "Upstream calls by outcome.", upstream_labels + ("outcome",))
+        self.upstream_latency = Histogram(
+            "claude_proxy_upstream_latency_seconds",
+            "Upstream response time, or time to first chunk for streams.",
+            upstream_labels + ("stream",), LATENCY_BUCKETS)
+        self.upstream_in_flight = Gauge("claude_proxy_upstream_in_flight", "Outstanding upstream calls.", upstream_labels[1:])
+        self._families: List[Metric] = [
+            self.requests, self.request_duration, self.time_to_first_token, self.output_tokens_per_second,
+            self.input_tokens, self.output_tokens, self.cached_prompt_tokens, self.streams_in_flight,
+            self.cancellations, self.upstream_requests, self.upstream_latency, self.upstream_in_flight,
+        ]
+        self._series: Dict[Tuple[str, str, str], RequestSeries] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def reload(self) -> None:
+        self.enabled = self.config.metrics_enabled
+
+    def request_series(self, tier: str, upstream_model: str, stream: bool) -> Optional[RequestSeries]:
+        """Cached children for a request to a model tier, or None while metrics are disabled."""
+        if not self.enabled:
+            return None
+        key = (tier, self.model_label(upstream_model), "true" if stream else "false")
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = RequestSeries(self, key)
+        return series
+
+    def upstream_series(self, upstream_model: str, endpoint: str) -> UpstreamSeries:
+        """Children for one upstream model and endpoint; callers keep the result."""
+        return UpstreamSeries(self, self.model_label(upstream_model), endpoint)
+
+    def model_label(self, upstream_model: str) -> str:
+        """The upstream model as a label value; names passed through from clients become "other"."""
+        if upstream_model in (self.config.big_model_name, self.config.small_model_name):
+            return upstream_model
+        return "other"
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callback that refreshes gauges right before rendering."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = [line for family in self._families for line in family.render()]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+metrics = ProxyMetrics(config)
+config.add_reload_listener(metrics.reload)
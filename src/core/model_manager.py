@@ -1,36 +1,66 @@
 from src.core.config import config
+from src.core.client_pool import client_pool
+from src.core.hedging import hedger
 
 class ModelManager:
-    def __init__(self, config):
+    def __init__(self, config, client_pool):
         self.config = config
+        self.client_pool = client_pool
     
     def get_model_config(self, claude_model: str) -> dict:
         """Map Claude model names to the corresponding provider configuration."""
+        model_config = self._resolve_model_config(claude_model)
+        # Hand out the shared, load-balanced group of clients for the resolved tier
+        model_config["client"] = self.tier_group(model_config["tier"])
+        model_config["hedge"] = hedger.enabled_for(model_config["tier"])
+        return model_config
+
+    def tier_group(self, tier: str):
+        """The current load-balanced group of clients serving a tier."""
+        settings = self._tier_settings(tier)
+        return self.client_pool.get_group(
+            tier,
+            settings["upstreams"],
+            settings["base_url"],
+            settings["api_key"],
+            settings["api_version"],
+            successor=self.tier_group,
+        )
+
+    def upstream_model(self, claude_model: str) -> str:
+        """Name of the upstream model a Claude model is mapped to."""
+        return self._resolve_model_config(claude_model)["model_name"]
+
+    def _resolve_model_config(self, claude_model: str) -> dict:
+        """Resolve the provider settings for a Claude model name."""
         # If it's already an OpenAI model, assume it maps to the BIG model provider for now.
         # This is a fallback and could be improved.
         if claude_model.startswith("gpt-") or claude_model.startswith("o1-"):
-             return {
-                "model_name": claude_model, # return the original model name
-                "api_key": self.config.big_model_api_key,
-                "base_url": self.config.big_model_base_url,
-                "api_version": self.config.big_model_azure_api_version
-            }
+            return {"model_name": claude_model, **self._tier_settings("big")}  # return the original model name
 
         model_lower = claude_model.lower()
         if 'haiku' in model_lower:
+            return {"model_name": self.config.small_model_name, **self._tier_settings("small")}
+        # Default to big model for sonnet, opus, or unknown models
+        else:
+            return {"model_name": self.config.big_model_name, **self._tier_settings("big")}
+
+    def _tier_settings(self, tier: str) -> dict:
+        """Provider settings of the big or small tier."""
+        if tier == "small":
             return {
-                "model_name": self.config.small_model_name,
+                "tier": "small",
                 "api_key": self.config.small_model_api_key,
                 "base_url": self.config.small_model_base_url,
+                "upstreams": self.config.small_model_upstreams,
                 "api_version": self.config.small_model_azure_api_version
             }
-        # Default to big model for sonnet, opus, or unknown models
-        else:
-            return {
-                "model_name": self.config.big_model_name,
-                "api_key": self.config.big_model_api_key,
-                "base_url": self.config.big_model_base_url,
-                "api_version": self.config.big_model_azure_api_version
-            }
+        return {
+            "tier": "big",
+            "api_key": self.config.big_model_api_key,
+            "base_url": self.config.big_model_base_url,
+            "upstreams": self.config.big_model_upstreams,
+            "api_version": self.config.big_model_azure_api_version
+        }
 
-model_manager = ModelManager(config)
\ No newline at end of file
+model_manager = ModelManager(config, client_pool)
\ No newline at end of file
@@ -0,0 +1,221 @@
+import asyncio
+import math
+import re
+import time
+from typing import Any, Dict, Mapping, Optional
+
+from fastapi import HTTPException
+
+from src.core.tokenizer import token_counter
+
+# One component of an OpenAI reset duration such as "6m0s", "1.5s" or "20ms"
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+class RateLimitedError(HTTPException):
+    """Raised when a request would have to wait too long for rate limit budget."""
+
+    error_type = "rate_limit_error"
+
+    def __init__(self, detail: str, retry_after: Optional[float] = None):
+        headers = {"Retry-After": str(math.ceil(retry_after))} if retry_after is not None else None
+        super().__init__(status_code=429, detail=detail, headers=headers)
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds in an x-ratelimit-reset-* header ("1s", "6m0s", "20ms" or a bare number)."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def estimate_prompt_tokens(request: Dict[str, Any]) -> int:
+    """Prompt size of an OpenAI request, from the shared memoized token counter."""
+    return token_counter.count_openai_request(request)
+
+
+class TokenBucket:
+    """Bucket refilled continuously at ``capacity`` per minute.
+
+    ``ceiling`` is the configured per-minute limit; the provider's headers can
+    lower the capacity and refill rate below it, never raise them above it.
+    """
+
+    __slots__ = ("capacity", "rate", "level", "ceiling", "calibrations", "_updated")
+
+    def __init__(self, per_minute: float, ceiling: Optional[float] = None):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.ceiling = float(ceiling) if ceiling else None
+        # Charges taken before the latest calibration are already in the provider's numbers
+        self.calibrations = 0
+        self._updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` (capped at the capacity) is available."""
+        self.refill()
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 and self.rate > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        self.refill()
+        self.level -= amount
+
+    def give(self, amount: float) -> None:
+        self.refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def calibrate(self, limit: Optional[float], remaining: Optional[float], reset: Optional[float]) -> None:
+        """Adopt the provider's view of this budget."""
+        self.refill()
+        self.calibrations += 1
+        if limit:
+            self.capacity = min(self.ceiling, limit) if self.ceiling else limit
+            self.rate = self.capacity / 60.0
+        if remaining is not None:
+            if reset:
+                # Remaining budget the provider will have restored by the time it says it resets
+                self.rate = max(self.rate, (self.capacity - remaining) / reset)
+                if self.ceiling:
+                    self.rate = min(self.rate, self.ceiling / 60.0)
+            self.level = min(self.capacity, remaining)
+
+
+class Charge:
+    """Budget taken for one request, with the bucket calibrations it was taken under."""
+
+    __slots__ = ("tokens", "requests_calibration", "tokens_calibration")
+
+    def __init__(self, tokens: int, requests: Optional[TokenBucket], token_bucket: Optional[TokenBucket]):
+        self.tokens = tokens
+        self.requests_calibration = requests.calibrations if requests is not None else None
+        self.tokens_calibration = token_bucket.calibrations if token_bucket is not None else None
+
+
+class RateLimiter:
+    """Client-side RPM/TPM pacing for one upstream account.
+
+    Each request is pre-charged one request and its estimated prompt tokens
+    plus max_tokens, waiting (in arrival order) until both buckets can cover
+    it; the token charge is corrected once the actual usage is known. Buckets
+    are recalibrated from the provider's x-ratelimit-* headers, and are
+    created from them when no RPM/TPM is configured. The headers describe the
+    whole account, so their limits and remaining budgets are scaled by
+    ``share``, the fraction of the account this process paces for.
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, max_wait: float = 30.0, share: float = 1.0):
+        self.share = share
+        self.requests: Optional[TokenBucket] = TokenBucket(rpm, ceiling=rpm) if rpm > 0 else None
+        self.tokens: Optional[TokenBucket] = TokenBucket(tpm, ceiling=tpm) if tpm > 0 else None
+        self.max_wait = max_wait
+        self._lock = asyncio.Lock()
+        self.paced = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+    async def acquire(self, tokens: int) -> Charge:
+        """Wait for budget for one request of ``tokens`` tokens; returns the charge."""
+        async with self._lock:
+            waited = 0.0
+            while True:
+                wait = max(
+                    self.requests.wait_time(1) if self.requests is not None else 0.0,
+                    self.tokens.wait_time(tokens) if self.tokens is not None else 0.0,
+                )
+                if wait <= 0:
+                    break
+                if waited + wait > self.max_wait:
+                    self.rejected += 1
+                    raise RateLimitedError(
+                        f"Rate limit budget exhausted; retry in {wait:.1f}s", retry_after=wait
+                    )
+                if waited == 0:
+                    self.paced += 1
+                # Headers arriving meanwhile may change the budget, so re-check after sleeping
+                await asyncio.sleep(wait)
+                waited += wait
+            self.total_wait += waited
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            return Charge(tokens, self.requests, self.tokens)
+
+    def reconcile(self, charge: Charge, actual: int) -> None:
+        """Correct a pre-charge once the request's real token usage is known.
+
+        Skipped once the bucket has been recalibrated since the charge, since
+        the provider's remaining budget already counts the request.
+        """
+        if _current(self.tokens, charge.tokens_calibration) and charge.tokens != actual:
+            self.tokens.give(charge.tokens - actual)
+
+    def refund(self, charge: Charge) -> None:
+        """Return the budget charged for a request that was never sent."""
+        if _current(self.requests, charge.requests_calibration):
+            self.requests.give(1)
+        if _current(self.tokens, charge.tokens_calibration):
+            self.tokens.give(charge.tokens)
+
+    def observe_headers(self, headers: Mapping[str, str]) -> None:
+        """Recalibrate from x-ratelimit-limit/remaining/reset-{requests,tokens} headers."""
+        for kind in ("requests", "tokens"):
+            limit = _header_number(headers, f"x-ratelimit-limit-{kind}")
+            remaining = _header_number(headers, f"x-ratelimit-remaining-{kind}")
+            if limit is None and remaining is None:
+                continue
+            if limit is not None:
+                limit *= self.share
+            if remaining is not None:
+                remaining *= self.share
+            bucket = getattr(self, kind)
+            if bucket is None:
+                if not limit:
+                    continue
+                bucket = TokenBucket(limit)
+                setattr(self, kind, bucket)
+            bucket.calibrate(limit, remaining, parse_reset(headers.get(f"x-ratelimit-reset-{kind}")))
+
+    def stats(self) -> Dict[str, Any]:
+        """Bucket levels and pacing counters."""
+        stats: Dict[str, Any] = {
+            "paced": self.paced,
+            "rejected": self.rejected,
+            "total_wait": round(self.total_wait, 3),
+        }
+        for kind in ("requests", "tokens"):
+            bucket = getattr(self, kind)
+            if bucket is not None:
+                bucket.refill()
+                stats[kind] = {"per_minute": bucket.capacity, "available": round(bucket.level, 1)}
+        return stats
+
+
+def _current(bucket: Optional[TokenBucket], calibration: Optional[int]) -> bool:
+    """Whether a charge was taken from bucket and it has not been recalibrated since."""
+    return bucket is not None and bucket.calibrations == calibration
+
+
+def _header_number(headers: Mapping[str, str], name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
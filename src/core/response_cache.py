@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from src.core.config import config
+from src.core.logging import logger
+
+# Request fields that do not change the generated message
+_NON_SEMANTIC_FIELDS = ("stream", "stream_options")
+# Seconds between sweeps of expired files from the disk tier
+_DISK_SWEEP_INTERVAL = 300.0
+
+
+def canonical_request_key(openai_request: Dict[str, Any]) -> str:
+    """Hash a converted OpenAI request into a stable cache key.
+
+    The key covers the model, messages, tools and sampling parameters; stream
+    flags are ignored so streaming and non-streaming calls share entries.
+    """
+    canonical = {k: v for k, v in openai_request.items() if k not in _NON_SEMANTIC_FIELDS}
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def is_deterministic(claude_request) -> bool:
+    """Only greedy (temperature 0) requests are safe to answer from the cache."""
+    return claude_request.temperature == 0
+
+
+class ResponseCache:
+    """Two-tier exact-match cache of Claude responses.
+
+    An in-memory LRU bounded by TTL and total size sits in front of an optional
+    on-disk tier (one JSON file per key) that survives restarts. The disk tier
+    is swept of expired files every few minutes, and whenever its tracked size
+    exceeds RESPONSE_CACHE_DISK_MAX_BYTES, the oldest files are removed too.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._bytes = 0
+        # Size of the disk tier, unknown until the first sweep; writes run in worker threads
+        self._disk_bytes: Optional[int] = None
+        self._disk_swept_at = 0.0
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.reload()
+
+    def reload(self) -> None:
+        """Apply the current cache settings, dropping in-memory entries if disabled."""
+        self.enabled = self.config.response_cache_enabled
+        self.ttl = self.config.response_cache_ttl
+        self.max_bytes = self.config.response_cache_max_bytes
+        self.disk_dir = self.config.response_cache_dir or None
+        self.disk_max_bytes = self.config.response_cache_disk_max_bytes
+        self._disk_bytes = None
+        if not self.enabled:
+            self._entries.clear()
+            self._bytes = 0
+        else:
+            self._evict()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for key, or None on a miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, size, response = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return response
+            self._remove(key)
+
+        if self.disk_dir:
+            stored = await asyncio.to_thread(self._read_disk, key)
+            if stored is not None:
+                expires_at, response = stored
+                self._insert(key, response, expires_at)
+                self.disk_hits += 1
+                return response
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        """Store a response in memory and, in the background, on disk."""
+        expires_at = time.time() + self.ttl
+        encoded = self._insert(key, response, expires_at)
+        if encoded is None:
+            return
+        self.stores += 1
+        if self.disk_dir:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._write_disk(key, encoded, expires_at)
+            else:
+                loop.run_in_executor(None, self._write_disk, key, encoded, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current occupancy."""
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "disk_bytes": self._disk_bytes,
+            "disk_evictions": self.disk_evictions,
+        }
+
+    def _insert(self, key: str, response: Dict[str, Any], expires_at: float) -> Optional[str]:
+        encoded = json.dumps(response, ensure_ascii=False)
+        size = len(encoded)
+        if size > self.max_bytes:
+            return None
+        self._remove(key)
+        self._entries[key] = (expires_at, size, response)
+        self._bytes += size
+        self._evict()
+        return encoded
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stored.get("expires_at", 0) <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return stored["expires_at"], stored["response"]
+
+    def _write_disk(self, key: str, encoded_response: str, expires_at: float) -> None:
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(f'{{"expires_at": {expires_at}, "response": {encoded_response}}}')
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write response cache entry to disk: {e}")
+            return
+        with self._disk_lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+            if (
+                self._disk_bytes is None
+                or self._disk_bytes > self.disk_max_bytes
+                or time.time() - self._disk_swept_at > _DISK_SWEEP_INTERVAL
+            ):
+                self._sweep_disk()
+
+    def _sweep_disk(self) -> None:
+        """Remove expired files, then the oldest ones while the tier is over its size limit."""
+        now = time.time()
+        files = []
+        try:
+            with os.scandir(self.disk_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    # Files are written once, so the expiry is their write time plus the TTL
+                    if stat.st_mtime + self.ttl <= now:
+                        self._remove_file(entry.path)
+                    else:
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            logger.warning(f"Failed to sweep the response cache directory: {e}")
+            return
+        total = sum(size for _, size, _ in files)
+        if total > self.disk_max_bytes:
+            files.sort()
+            for _, size, path in files:
+                if total <= self.disk_max_bytes:
+                    break
+                if self._remove_file(path):
+                    total -= size
+                    self.disk_evictions += 1
+        self._disk_bytes = total
+        self._disk_swept_at = now
+
+    @staticmethod
+    def _remove_file(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+response_cache = ResponseCache(config)
+config.add_reload_listener(response_cache.reload)
@@ -0,0 +1,157 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from openai import APIConnectionError, APIStatusError
+
+from src.core.config import config
+from src.core.logging import logger
+
+T = TypeVar("T")
+
+# Provider statuses worth another attempt
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+# Most retry tokens the budget can bank for a burst of failures
+_BUDGET_BURST = 10.0
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Delay requested by the provider through Retry-After(-Ms) headers, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an upstream error is transient."""
+    if isinstance(error, APIConnectionError):
+        return True
+    if not isinstance(error, APIStatusError):
+        return False
+    should_retry = error.response.headers.get("x-should-retry")
+    if should_retry in ("true", "false"):
+        return should_retry == "true"
+    # An exhausted quota will not recover by waiting
+    if getattr(error, "code", None) == "insufficient_quota":
+        return False
+    return error.status_code in RETRYABLE_STATUS_CODES
+
+
+class RetryBudget:
+    """Process-wide token bucket limiting retries to a fraction of traffic.
+
+    Every request deposits ``ratio`` tokens and each retry spends one, plus a
+    small time-based floor so low traffic can still retry. When an upstream is
+    down, retries therefore add at most ~ratio extra load instead of
+    multiplying it by MAX_RETRIES.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.tokens = _BUDGET_BURST
+        self._last_refill = time.monotonic()
+
+    def on_request(self) -> None:
+        self._refill()
+        self.tokens = min(_BUDGET_BURST, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(_BUDGET_BURST, self.tokens + (now - self._last_refill) * self.min_per_second)
+        self._last_refill = now
+
+
+class RetryPolicy:
+    """Retry transient upstream failures with full-jitter exponential backoff."""
+
+    def __init__(self, config):
+        self.config = config
+        self.budget = RetryBudget(config.retry_budget_ratio, config.retry_budget_min_per_second)
+        self.retries = 0
+        self.budget_exhausted = 0
+        self.gave_up = 0
+        self.reload()
+
+    def reload(self) -> None:
+        """Apply the current retry settings."""
+        self.max_retries = self.config.max_retries
+        self.base_delay = self.config.retry_base_delay
+        self.max_delay = self.config.retry_max_delay
+        self.budget.ratio = self.config.retry_budget_ratio
+        self.budget.min_per_second = self.config.retry_budget_min_per_second
+
+    def backoff(self, attempt: int, error: Exception) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to give up now."""
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            # Waiting longer than our own ceiling would only stall Claude Code
+            return retry_after if retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def run(self, operation: Callable[[], Awaitable[T]]) -> T:
+        """Call operation(), retrying transient failures within the budget."""
+        self.budget.on_request()
+        attempt = 0
+        while True:
+            try:
+                return await operation()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if attempt >= self.max_retries:
+                    self.gave_up += 1
+                    raise
+                delay = self.backoff(attempt, e)
+                if delay is None:
+                    self.gave_up += 1
+                    raise
+                if not self.budget.try_spend():
+                    self.budget_exhausted += 1
+                    logger.warning(f"Retry budget exhausted, not retrying upstream error: {e}")
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.info(f"Upstream error ({e.__class__.__name__}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retry counters and remaining budget."""
+        return {
+            "max_retries": self.max_retries,
+            "retries": self.retries,
+            "budget_exhausted": self.budget_exhausted,
+            "gave_up": self.gave_up,
+            "budget_tokens": round(self.budget.tokens, 2),
+        }
+
+
+retry_policy = RetryPolicy(config)
+config.add_reload_listener(retry_policy.reload)
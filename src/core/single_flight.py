@@ -0,0 +1,197 @@
+import asyncio
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Set
+
+from src.conversion import sse
+from src.core.config import config
+from src.core.logging import logger
+
+
+class _Call:
+    """An in-flight non-streaming upstream call shared by identical requests."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Subscriber:
+    """Bounded buffer of SSE events for one attached client."""
+
+    __slots__ = ("events", "limit", "ready", "closed", "overflowed")
+
+    def __init__(self, limit: int):
+        self.events: Deque[Any] = deque()
+        self.limit = limit
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.overflowed = False
+
+    def push(self, event) -> bool:
+        if len(self.events) >= self.limit:
+            self.overflowed = True
+            self.close()
+            return False
+        self.events.append(event)
+        self.ready.set()
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+        self.ready.set()
+
+
+class StreamBroadcast:
+    """Fan one converted SSE stream out to every client that asked for it.
+
+    The source is opened once (``opened``) before anyone subscribes, so a
+    failure to open it reaches every caller as an error. Events already
+    emitted are replayed to late joiners, so each subscriber receives a
+    complete, correctly framed stream. The source is cancelled only when the
+    last subscriber detaches, or the last caller gives up waiting for it.
+    """
+
+    def __init__(self, opening: Awaitable[AsyncIterator[Any]], buffer_size: int, on_done: Callable[[], None]):
+        self._source = None
+        self._buffer_size = buffer_size
+        self._on_done = on_done
+        self._history = []
+        self._subscribers: Set[_Subscriber] = set()
+        self.done = False
+        self.waiters = 0
+        self.opened = asyncio.ensure_future(opening)
+        self.task = asyncio.create_task(self._pump())
+
+    async def _pump(self) -> None:
+        try:
+            # Callers get an error opening the source from ``opened`` themselves
+            self._source = await self.opened
+            async for event in self._source:
+                self._history.append(event)
+                for subscriber in list(self._subscribers):
+                    if not subscriber.push(event):
+                        self._subscribers.discard(subscriber)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            if self._source is None:
+                return
+            logger.error(f"Shared upstream stream failed: {e}")
+            event = sse.error("api_error", f"Streaming error: {str(e)}")
+            self._history.append(event)
+            for subscriber in self._subscribers:
+                subscriber.push(event)
+        finally:
+            self.done = True
+            for subscriber in self._subscribers:
+                subscriber.close()
+            self._on_done()
+            if self._source is not None:
+                await self._source.aclose()
+
+    async def subscribe(self):
+        """Yield the full event stream for one client."""
+        subscriber = _Subscriber(self._buffer_size)
+        backlog = list(self._history)
+        if self.done:
+            subscriber.closed = True
+        else:
+            self._subscribers.add(subscriber)
+        try:
+            for event in backlog:
+                yield event
+            while True:
+                while subscriber.events and not subscriber.overflowed:
+                    yield subscriber.events.popleft()
+                if subscriber.overflowed:
+                    logger.warning("Subscriber fell too far behind a shared stream, detaching it")
+                    yield sse.error("overloaded_error", "Client fell too far behind the shared stream")
+                    return
+                if subscriber.closed:
+                    return
+                subscriber.ready.clear()
+                await subscriber.ready.wait()
+        finally:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers and not self.done:
+                logger.info("Last subscriber detached, cancelling shared upstream stream")
+                self.task.cancel()
+
+
+class SingleFlight:
+    """Coalesce identical concurrent requests onto one upstream call."""
+
+    def __init__(self, config):
+        self.config = config
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, StreamBroadcast] = {}
+        self.coalesced_calls = 0
+        self.coalesced_streams = 0
+        self.reload()
+
+    def reload(self) -> None:
+        """Apply the current single-flight settings."""
+        self.enabled = self.config.single_flight_enabled
+        self.buffer_size = self.config.single_flight_buffer_events
+
+    async def call(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Run factory() once for all concurrent callers with the same key."""
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(self._calls, key, flight))
+        else:
+            self.coalesced_calls += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    async def stream(self, key: str, factory: Callable[[], Awaitable[AsyncIterator[Any]]]):
+        """Return an event iterator once the stream is open, attaching to an identical in-flight stream if any.
+
+        factory() opens the stream; its errors are raised to every caller waiting on it.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None or broadcast.done:
+
+            def on_done():
+                self._forget(self._streams, key, broadcast)
+
+            broadcast = StreamBroadcast(factory(), self.buffer_size, on_done)
+            self._streams[key] = broadcast
+        else:
+            self.coalesced_streams += 1
+        broadcast.waiters += 1
+        try:
+            await asyncio.shield(broadcast.opened)
+        finally:
+            broadcast.waiters -= 1
+            if broadcast.waiters == 0 and not broadcast.opened.done():
+                broadcast.opened.cancel()
+        return broadcast.subscribe()
+
+    def stats(self) -> Dict[str, Any]:
+        """Coalescing counters and current in-flight counts."""
+        return {
+            "enabled": self.enabled,
+            "in_flight_calls": len(self._calls),
+            "in_flight_streams": len(self._streams),
+            "coalesced_calls": self.coalesced_calls,
+            "coalesced_streams": self.coalesced_streams,
+        }
+
+    @staticmethod
+    def _forget(table: Dict[str, Any], key: str, value: Any) -> None:
+        if table.get(key) is value:
+            del table[key]
+
+
+single_flight = SingleFlight(config)
+config.add_reload_listener(single_flight.reload)
@@ -0,0 +1,202 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+import httpx
+
+from src.core.config import config
+
+# Timer of the request being handled; upstream clients stamp it from httpx event hooks
+_current_timer: contextvars.ContextVar[Optional["RequestTimer"]] = contextvars.ContextVar(
+    "request_timer", default=None
+)
+
+
+class RequestTimer:
+    """Where the time of one /v1/messages request went.
+
+    Stamps are perf_counter() readings taken as the request passes each
+    point. For streams, the time after the first chunk is accumulated as
+    waiting for upstream chunks, converting them, and blocked writing to the
+    client.
+    """
+
+    __slots__ = ("request_id", "model", "stream", "status", "started_at", "_stamps",
+                 "first_chunk_wait", "upstream_wait", "produce", "client_write")
+
+    def __init__(self):
+        self.request_id: Optional[str] = None
+        self.model: Optional[str] = None
+        self.stream = False
+        self.status = 200
+        self.started_at = time.time()
+        self._stamps: Dict[str, float] = {"start": time.perf_counter()}
+        self.first_chunk_wait = 0.0
+        self.upstream_wait = 0.0
+        self.produce = 0.0
+        self.client_write = 0.0
+
+    def stamp(self, point: str) -> None:
+        """Record that the request reached a point (the latest visit wins, e.g. after a retry)."""
+        self._stamps[point] = time.perf_counter()
+
+    def stamp_once(self, point: str) -> None:
+        if point not in self._stamps:
+            self._stamps[point] = time.perf_counter()
+
+    def _between(self, first: str, second: str) -> Optional[float]:
+        start = self._stamps.get(first)
+        end = self._stamps.get(second)
+        if start is None or end is None or end < start:
+            return None
+        return end - start
+
+    def phases(self) -> Dict[str, float]:
+        """Seconds per phase; phases the request never reached are left out."""
+        phases = {
+            "receive": self._between("start", "received"),
+            "parse": self._between("received", "parsed"),
+            "convert": self._between("parsed", "converted"),
+            "queue": self._between("converted", "upstream_sent"),
+        }
+        if self.stream:
+            phases["connect"] = self._between("upstream_sent", "upstream_headers")
+            # A single-flight follower gets no upstream headers; its whole wait is time to first token
+            ttft_from = "upstream_headers" if "upstream_headers" in self._stamps else "upstream_sent"
+            phases["ttft"] = self._between(ttft_from, "first_chunk")
+            phases["upstream_stream"] = self.upstream_wait
+            # Producing events includes every wait for upstream chunks, the first one too
+            phases["stream_convert"] = max(0.0, self.produce - self.upstream_wait - self.first_chunk_wait)
+            phases["client_write"] = self.client_write
+        else:
+            phases["upstream"] = self._between("upstream_sent", "upstream_done")
+            phases["convert_response"] = self._between("upstream_done", "response_converted")
+        return {name: value for name, value in phases.items() if value is not None}
+
+    def total(self) -> float:
+        return time.perf_counter() - self._stamps["start"]
+
+    def server_timing(self) -> str:
+        """The phases as a Server-Timing header value (milliseconds)."""
+        entries = [f"{name};dur={value * 1000:.1f}" for name, value in self.phases().items()]
+        entries.append(f"total;dur={self.total() * 1000:.1f}")
+        return ", ".join(entries)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "model": self.model,
+            "stream": self.stream,
+            "status": self.status,
+            "started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            "total_ms": round(self.total() * 1000, 1),
+            "phases_ms": {name: round(value * 1000, 1) for name, value in self.phases().items()},
+        }
+
+
+async def _on_upstream_request(request: httpx.Request) -> None:
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.stamp("upstream_sent")
+
+
+async def _on_upstream_response(response: httpx.Response) -> None:
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.stamp("upstream_headers")
+
+
+# httpx event hooks for upstream clients
+UPSTREAM_EVENT_HOOKS = {"request": [_on_upstream_request], "response": [_on_upstream_response]}
+
+
+class RequestTiming:
+    """Starts per-request timers and keeps the breakdown of recent slow requests.
+
+    Requests slower than SLOW_REQUEST_THRESHOLD seconds are kept in a ring
+    buffer of SLOW_REQUEST_LOG_SIZE entries.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._entries: deque = deque(maxlen=max(1, config.slow_request_log_size))
+        self.reload()
+
+    def reload(self) -> None:
+        self.enabled = self.config.request_timing_enabled
+        self.threshold = self.config.slow_request_threshold
+        size = max(1, self.config.slow_request_log_size)
+        if size != self._entries.maxlen:
+            self._entries = deque(self._entries, maxlen=size)
+
+    def start(self) -> Optional[RequestTimer]:
+        """Begin timing the current request, or None while timing is disabled."""
+        if not self.enabled:
+            return None
+        timer = RequestTimer()
+        _current_timer.set(timer)
+        return timer
+
+    def finish(self, timer: RequestTimer) -> None:
+        """Keep the timer's breakdown if the request was slow."""
+        if timer.total() >= self.threshold:
+            self._entries.append(timer.summary())
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Slow requests, newest first."""
+        return list(reversed(self._entries))
+
+    async def time_upstream(
+        self, timer: RequestTimer, stream: AsyncGenerator[Dict[str, Any], None]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Pass upstream chunks through, adding the time spent waiting for them."""
+        try:
+            waiting = time.perf_counter()
+            first = True
+            async for chunk in stream:
+                now = time.perf_counter()
+                if first:
+                    # Connecting and time to first token are reported on their own
+                    timer.first_chunk_wait = now - waiting
+                    timer.stamp_once("first_chunk")
+                    first = False
+                else:
+                    timer.upstream_wait += now - waiting
+                yield chunk
+                waiting = time.perf_counter()
+        finally:
+            await stream.aclose()
+
+    async def time_output(
+        self, timer: RequestTimer, events: AsyncGenerator[bytes, None]
+    ) -> AsyncGenerator[bytes, None]:
+        """Pass SSE events through, splitting producing them from writing them.
+
+        Ends the stream with a comment carrying the Server-Timing breakdown.
+        """
+        try:
+            producing = time.perf_counter()
+            async for event in events:
+                now = time.perf_counter()
+                timer.produce += now - producing
+                yield event
+                producing = time.perf_counter()
+                timer.client_write += producing - now
+            yield f": server-timing {timer.server_timing()}\n\n".encode()
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client went away mid-stream
+            timer.status = 499
+            raise
+        except Exception:
+            timer.status = 500
+            raise
+        finally:
+            self.finish(timer)
+            await events.aclose()
+
+
+request_timing = RequestTiming(config)
+config.add_reload_listener(request_timing.reload)
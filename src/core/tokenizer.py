@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from src.conversion.conversion_cache import fingerprint
+from src.core.config import config
+from src.core.logging import logger
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is an optional dependency
+    tiktoken = None
+
+# Vocabulary directory used when TOKENIZER_VOCAB_DIR is not set
+DEFAULT_VOCAB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "vocab")
+# Encoding for upstream models tiktoken does not know (local models, new releases)
+DEFAULT_ENCODING = "o200k_base"
+
+# tiktoken caches each vocabulary in TIKTOKEN_CACHE_DIR under the SHA-1 of its URL
+VOCAB_URL = "https://openaipublic.blob.core.windows.net/encodings/{name}.tiktoken"
+
+# Chat format overheads, as counted by OpenAI's chat models
+MESSAGE_OVERHEAD = 3
+REPLY_PRIMING = 3
+TOOL_CALL_OVERHEAD = 3
+TOOL_OVERHEAD = 8
+TOOLS_OVERHEAD = 12
+# Images are resized to at most ~1.15 megapixels, which Claude bills as about 1600 tokens
+IMAGE_TOKENS = 1600
+
+
+def vocab_path(name: str, vocab_dir: str) -> str:
+    """Where tiktoken's cache in vocab_dir keeps the vocabulary of an encoding."""
+    return os.path.join(vocab_dir, hashlib.sha1(VOCAB_URL.format(name=name).encode()).hexdigest())
+
+
+def _load_encoding(name: str, vocab_dir: str):
+    """The tiktoken encoding, if vocab_dir (used as tiktoken's cache) holds its vocabulary, or None."""
+    if tiktoken is None or not os.path.isfile(vocab_path(name, vocab_dir)):
+        return None
+    # tiktoken reads the cached file and checks it against the hash it pins
+    os.environ["TIKTOKEN_CACHE_DIR"] = vocab_dir
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"Could not load the {name} vocabulary from {vocab_dir}: {e}")
+        return None
+
+
+class TokenCounter:
+    """Counts the prompt tokens of Claude requests for the mapped upstream model.
+
+    Uses the model's BPE vocabulary through tiktoken, with TOKENIZER_VOCAB_DIR
+    as tiktoken's cache; encodings whose vocabulary is not there are never
+    downloaded. Without tiktoken or the vocabulary
+    file it falls back to about four characters per token. System prompt,
+    tool definitions, text, tool calls, tool results, images and the chat
+    format's per-message overhead are all counted.
+
+    Counts of content blocks, system prompts, tools arrays and converted
+    OpenAI messages are memoized by their exact, type-aware content key (see
+    fingerprint) in an LRU of TOKEN_COUNT_CACHE_SIZE entries, so a growing
+    conversation only tokenizes its new blocks. Entries keep references to
+    the content they counted.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._encodings: Dict[str, Any] = {}
+        self._models: Dict[str, str] = {}
+        self._cache: "OrderedDict[Tuple[str, str, Any], int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.max_entries = config.token_count_cache_size
+
+    def reload(self) -> None:
+        self._encodings.clear()
+        self._models.clear()
+        self._cache.clear()
+        self.max_entries = self.config.token_count_cache_size
+
+    def _memoized(self, kind: str, value: Any, encoding, count: Callable[[], int]) -> int:
+        """Cached result of count() for value; estimates are cheaper than the lookup."""
+        if encoding is None or self.max_entries <= 0:
+            return count()
+        key = (encoding.name, kind, fingerprint(value))
+        tokens = self._cache.get(key)
+        if tokens is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return tokens
+        self.misses += 1
+        tokens = self._cache[key] = count()
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return tokens
+
+    def encoding_for(self, model: str):
+        """The tiktoken encoding for an upstream model, or None to estimate."""
+        name = self._models.get(model)
+        if name is None:
+            try:
+                name = tiktoken.encoding_name_for_model(model) if tiktoken is not None else DEFAULT_ENCODING
+            except KeyError:
+                name = DEFAULT_ENCODING
+            self._models[model] = name
+        if name not in self._encodings:
+            vocab_dir = self.config.tokenizer_vocab_dir or DEFAULT_VOCAB_DIR
+            encoding = _load_encoding(name, vocab_dir)
+            if encoding is None:
+                logger.warning(
+                    f"No {name} vocabulary in {vocab_dir} (or tiktoken missing); estimating token counts. "
+                    f"Run fetch_vocab.py to download it"
+                )
+            self._encodings[name] = encoding
+        return self._encodings[name]
+
+    @staticmethod
+    def count_text(text: str, encoding) -> int:
+        if not text:
+            return 0
+        if encoding is None:
+            return (len(text) + 3) // 4
+        return len(encoding.encode_ordinary(text))
+
+    def count_block(self, block: Any, encoding) -> int:
+        """Tokens of one message content block (a model or a plain dict)."""
+        return self._memoized("block", block, encoding, lambda: self._count_block(block, encoding))
+
+    def _count_block(self, block: Any, encoding) -> int:
+        block_type = _field(block, "type")
+        if block_type == "text":
+            return self.count_text(_field(block, "text") or "", encoding)
+        if block_type == "image":
+            return IMAGE_TOKENS
+        if block_type == "tool_use":
+            return (
+                TOOL_CALL_OVERHEAD
+                + self.count_text(_field(block, "name") or "", encoding)
+                + self.count_text(json.dumps(_field(block, "input") or {}, ensure_ascii=False), encoding)
+            )
+        if block_type == "tool_result":
+            # Tool results become messages of their own upstream
+            return MESSAGE_OVERHEAD + self._count_result(_field(block, "content"), encoding)
+        return self.count_text(json.dumps(_plain(block), ensure_ascii=False, default=str), encoding)
+
+    def _count_result(self, content: Any, encoding) -> int:
+        if content is None:
+            return 0
+        if isinstance(content, str):
+            return self.count_text(content, encoding)
+        if isinstance(content, list):
+            return sum(self._count_block(item, encoding) for item in content)
+        return self._count_block(content, encoding)
+
+    def count_message(self, message: Any, encoding) -> int:
+        content = message.content
+        tokens = MESSAGE_OVERHEAD + 1  # role
+        if isinstance(content, str):
+            return tokens + self._memoized("text", content, encoding, lambda: self.count_text(content, encoding))
+        return tokens + sum(self.count_block(block, encoding) for block in content or ())
+
+    def count_system(self, system: Any, encoding) -> int:
+        if not system:
+            return 0
+        return self._memoized("system", system, encoding, lambda: self._count_system(system, encoding))
+
+    def _count_system(self, system: Any, encoding) -> int:
+        if isinstance(system, str):
+            return MESSAGE_OVERHEAD + 1 + self.count_text(system, encoding)
+        return MESSAGE_OVERHEAD + 1 + sum(self.count_text(block.text, encoding) for block in system)
+
+    def count_tools(self, tools: Optional[Iterable[Any]], encoding) -> int:
+        if not tools:
+            return 0
+        return self._memoized("tools", tools, encoding, lambda: self._count_tools(tools, encoding))
+
+    def _count_tools(self, tools: Iterable[Any], encoding) -> int:
+        tokens = TOOLS_OVERHEAD
+        for tool in tools:
+            tokens += (
+                TOOL_OVERHEAD
+                + self.count_text(tool.name, encoding)
+                + self.count_text(tool.description or "", encoding)
+                + self.count_text(json.dumps(_plain(tool.input_schema), ensure_ascii=False), encoding)
+            )
+        return tokens
+
+    def count_request(self, request: Any, model: str) -> int:
+        """Prompt tokens of a Claude messages (or count_tokens) request sent to ``model``."""
+        return self.count(request, self.encoding_for(model))
+
+    def count(self, request: Any, encoding) -> int:
+        """Prompt tokens of a request with the given encoding (None to estimate)."""
+        return (
+            REPLY_PRIMING
+            + self.count_system(request.system, encoding)
+            + self.count_tools(request.tools, encoding)
+            + sum(self.count_message(message, encoding) for message in request.messages)
+        )
+
+    def count_openai_request(self, request: Dict[str, Any]) -> int:
+        """Prompt tokens of a converted OpenAI chat request, for budgeting upstream calls."""
+        encoding = self.encoding_for(request.get("model") or "")
+        tokens = REPLY_PRIMING + sum(
+            self._memoized("openai", message, encoding, lambda message=message: self._count_openai_message(message, encoding))
+            for message in request.get("messages") or ()
+        )
+        tools = request.get("tools")
+        if tools:
+            tokens += self._memoized("openai_tools", tools, encoding, lambda: TOOLS_OVERHEAD + sum(
+                TOOL_OVERHEAD + self.count_text(json.dumps(tool, ensure_ascii=False), encoding) for tool in tools
+            ))
+        return tokens
+
+    def _count_openai_message(self, message: Dict[str, Any], encoding) -> int:
+        tokens = MESSAGE_OVERHEAD + 1
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += self.count_text(content, encoding)
+        elif content:
+            for part in content:
+                tokens += IMAGE_TOKENS if part.get("type") == "image_url" else self.count_text(part.get("text") or "", encoding)
+        for tool_call in message.get("tool_calls") or ():
+            function = tool_call["function"]
+            tokens += (
+                TOOL_CALL_OVERHEAD
+                + self.count_text(function["name"], encoding)
+                + self.count_text(function["arguments"], encoding)
+            )
+        return tokens
+
+    def stats(self) -> Dict[str, Any]:
+        """Encoding used per upstream model ("estimate" without a vocabulary) and cache counters."""
+        return {
+            "encodings": {
+                model: name if self._encodings.get(name) is not None else "estimate"
+                for model, name in self._models.items()
+            },
+            "cache_entries": len(self._cache),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+        }
+
+
+def _field(block: Any, name: str) -> Any:
+    if isinstance(block, dict):
+        return block.get(name)
+    return getattr(block, name, None)
+
+
+def _plain(value: Any) -> Any:
+    """JSON-serializable form of a pydantic model or msgspec struct."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "__struct_fields__"):
+        return {field: getattr(value, field) for field in value.__struct_fields__}
+    return value
+
+
+token_counter = TokenCounter(config)
+config.add_reload_listener(token_counter.reload)
@@ -0,0 +1,305 @@
+import asyncio
+import random
+import statistics
+import time
+from typing import Any, AsyncGenerator, Callable, Dict, List, NamedTuple, Optional
+
+from src.core.circuit_breaker import CLOSED, OPEN, CircuitBreaker, UpstreamUnavailableError
+from src.core.client import OpenAIClient
+from src.core.concurrency import OverloadedError
+from src.core.rate_limit import RateLimitedError
+from src.core.logging import logger
+from src.core.metrics import UpstreamSeries, metrics
+from src.models.openai import OpenAIStreamChunk
+
+# Supported endpoint selection strategies
+LEAST_OUTSTANDING = "least_outstanding"
+POWER_OF_TWO = "p2c"
+
+
+class UpstreamEndpoint(NamedTuple):
+    """One weighted replica serving a model tier."""
+
+    base_url: str
+    api_key: str
+    weight: float = 1.0
+
+
+def parse_upstreams(spec: str, default_base_url: str, default_api_key: str) -> List[UpstreamEndpoint]:
+    """Parse a comma-separated endpoint list: ``base_url[|weight[|api_key]]``.
+
+    An empty spec yields the tier's single configured endpoint.
+    """
+    endpoints = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = [part.strip() for part in entry.split("|")]
+        try:
+            weight = float(parts[1]) if len(parts) > 1 and parts[1] else 1.0
+        except ValueError:
+            logger.warning(f"Invalid upstream weight in {entry!r}, using 1")
+            weight = 1.0
+        if weight <= 0:
+            continue
+        api_key = parts[2] if len(parts) > 2 and parts[2] else default_api_key
+        endpoints.append(UpstreamEndpoint(parts[0], api_key, weight))
+    return endpoints or [UpstreamEndpoint(default_base_url, default_api_key)]
+
+
+class UpstreamGroup:
+    """Weighted set of pooled clients serving one model tier.
+
+    Exposes the same request interface as OpenAIClient and sends each request
+    to the member with the fewest outstanding requests relative to its weight,
+    either by scanning all members (least_outstanding) or by comparing two
+    weighted random picks (p2c). Hedged requests are spread across members.
+    Every member has a circuit breaker; ejected members get no traffic until a
+    half-open probe succeeds, so requests fail over to the healthy ones.
+    Requests that got the group before a config reload retired its clients
+    are sent to the tier's current group, with its current endpoints and keys.
+    """
+
+    def __init__(self, name: str, members: List[OpenAIClient], weights: List[float],
+                 strategy: str = LEAST_OUTSTANDING, hedger=None, config=None,
+                 successor: Optional[Callable[[str], "UpstreamGroup"]] = None):
+        self.name = name
+        self.members = members
+        # Current group of a tier, which takes over once a config reload retired this one
+        self.successor = successor
+        self.weights = weights
+        self.strategy = strategy
+        self.hedger = hedger
+        self.config = config
+        self.breakers = [CircuitBreaker(config) for _ in members] if config is not None else None
+        # Metric children per member and upstream model
+        self._metric_series: List[Dict[str, UpstreamSeries]] = [{} for _ in members]
+
+    @property
+    def in_flight(self) -> int:
+        return sum(member.in_flight for member in self.members)
+
+    def _select(self, exclude: Optional[List[int]] = None) -> int:
+        """Index of the member for the next request, avoiding excluded members when possible."""
+        candidates = range(len(self.members))
+        if self.breakers is not None:
+            candidates = [i for i in candidates if self.breakers[i].available()]
+            if not candidates:
+                raise UpstreamUnavailableError(
+                    f"All upstreams for the {self.name} model are unavailable (circuit open)"
+                )
+        if exclude:
+            remaining = [i for i in candidates if i not in exclude]
+            candidates = remaining or candidates
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == POWER_OF_TWO:
+            first, second = random.choices(candidates, weights=[self.weights[i] for i in candidates], k=2)
+            return min(first, second, key=self._load)
+        best = min(self._load(i) for i in candidates)
+        return random.choice([i for i in candidates if self._load(i) == best])
+
+    def _load(self, index: int) -> float:
+        return self.members[index].in_flight / self.weights[index]
+
+    async def _call(self, index: int, request: Dict[str, Any], request_id: Optional[str]) -> Dict[str, Any]:
+        """Non-streaming call to one member, reporting the outcome to its breaker."""
+        probe = self._acquire(index)
+        series = self._series(index, request.get("model"))
+        started = time.monotonic()
+        try:
+            response = await self._member(index).create_chat_completion(request, request_id)
+        except BaseException as e:
+            self._record_error(index, probe, e, series)
+            raise
+        self._record_success(index, probe, time.monotonic() - started, stream=False, series=series)
+        return response
+
+    async def _open_stream(self, index: int, request: Dict[str, Any], request_id: Optional[str]):
+        """Open a member stream and read its first chunk, reporting the outcome to its breaker.
+
+        Returns (stream, first_chunk); first_chunk is None for an empty stream.
+        """
+        probe = self._acquire(index)
+        series = self._series(index, request.get("model"))
+        started = time.monotonic()
+        stream = self._member(index).create_chat_completion_stream(request, request_id)
+        try:
+            first_chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            first_chunk = None
+        except BaseException as e:
+            self._record_error(index, probe, e, series)
+            await stream.aclose()
+            raise
+        self._record_success(index, probe, time.monotonic() - started, stream=True, series=series)
+        return stream, first_chunk
+
+    def _member(self, index: int) -> OpenAIClient:
+        """The client for a member, or a member of the tier's current group if it was retired.
+
+        The endpoints and keys of the tier may have changed with the reload, so
+        the request goes wherever the current group would send it. The caller
+        starts its request on the returned client without awaiting in between,
+        so the client counts it as in flight before it can close.
+        """
+        member = self.members[index]
+        if member.retired and self.successor is not None:
+            current = self.successor(self.name)
+            if current is not self:
+                member = current.members[current._select()]
+        return member
+
+    def _acquire(self, index: int) -> bool:
+        return self.breakers is not None and self.breakers[index].acquire()
+
+    def _series(self, index: int, model: Optional[str]) -> Optional[UpstreamSeries]:
+        if not metrics.enabled:
+            return None
+        series = self._metric_series[index].get(model)
+        if series is None:
+            series = self._metric_series[index][model] = metrics.upstream_series(
+                model or "", self.members[index].base_url
+            )
+        return series
+
+    def _record_error(self, index: int, probe: bool, error: BaseException,
+                      series: Optional[UpstreamSeries] = None) -> None:
+        status_code = getattr(error, "status_code", None)
+        if series is not None:
+            if isinstance(error, asyncio.CancelledError) or status_code == 499:
+                series.cancelled.inc()
+            elif isinstance(error, (OverloadedError, RateLimitedError)):
+                series.rejected.inc()
+            else:
+                series.error.inc()
+        if self.breakers is None:
+            return
+        breaker = self.breakers[index]
+        if isinstance(error, (asyncio.CancelledError, OverloadedError, RateLimitedError)) or status_code == 499:
+            # Nothing reached the endpoint, or the client left before it answered
+            breaker.release(probe)
+        elif status_code is not None and status_code < 500 and status_code != 408:
+            # The endpoint answered; client errors say nothing about its health
+            breaker.record_success(probe)
+        else:
+            was_open = breaker.state == OPEN
+            # Never eject the last healthy member; failing over needs somewhere to go
+            breaker.record_failure(probe, can_eject=self._has_healthy_peer(index))
+            if breaker.state == OPEN and not was_open:
+                logger.warning(f"Ejecting upstream {self.members[index].base_url}: {breaker.last_reason}")
+
+    def _record_success(self, index: int, probe: bool, latency: float, stream: bool,
+                        series: Optional[UpstreamSeries] = None) -> None:
+        if series is not None:
+            series.success.inc()
+            series.latency[stream].observe(latency)
+        if self.breakers is None:
+            return
+        breaker = self.breakers[index]
+        breaker.record_success(probe, latency, stream)
+        self._check_latency_outlier(index, stream)
+
+    def _has_healthy_peer(self, index: int) -> bool:
+        return any(other.state == CLOSED for i, other in enumerate(self.breakers) if i != index)
+
+    def _check_latency_outlier(self, index: int, stream: bool) -> None:
+        """Eject a member whose latency is far above that of its healthy peers."""
+        factor = self.config.breaker_latency_factor
+        breaker = self.breakers[index]
+        if factor <= 0 or breaker.latency_samples[stream] < self.config.breaker_min_requests:
+            return
+        peers = [
+            other.latency[stream]
+            for i, other in enumerate(self.breakers)
+            if i != index and other.state == CLOSED
+            and other.latency_samples[stream] >= self.config.breaker_min_requests
+        ]
+        # Never eject the last healthy member for being slow
+        if peers and breaker.latency[stream] > factor * statistics.median(peers):
+            breaker.trip(f"latency outlier ({breaker.latency[stream]:.2f}s vs {statistics.median(peers):.2f}s)")
+            logger.warning(f"Ejecting upstream {self.members[index].base_url}: {breaker.last_reason}")
+
+    async def create_chat_completion(
+        self, request: Dict[str, Any], request_id: Optional[str] = None, hedge: bool = False
+    ) -> Dict[str, Any]:
+        """Send a chat completion to the least loaded member, hedging it if requested."""
+        if not hedge or self.hedger is None:
+            return await self._call(self._select(), request, request_id)
+
+        tried: List[int] = []
+
+        def attempt():
+            index = self._select(exclude=tried)
+            tried.append(index)
+            return self._call(index, request, self._attempt_id(request_id, len(tried)))
+
+        return await self.hedger.run((self.name, request.get("model"), False), attempt)
+
+    async def create_chat_completion_stream(
+        self, request: Dict[str, Any], request_id: Optional[str] = None, hedge: bool = False
+    ) -> AsyncGenerator[OpenAIStreamChunk, None]:
+        """Stream a chat completion from the least loaded member.
+
+        When hedged, a stream slow to produce its first chunk is raced against a
+        second one, preferably on another member; the loser is closed.
+        """
+        if not hedge or self.hedger is None:
+            # Selecting on first iteration keeps the member's in-flight count exact
+            stream, first_chunk = await self._open_stream(self._select(), request, request_id)
+        else:
+            tried: List[int] = []
+
+            def attempt():
+                index = self._select(exclude=tried)
+                tried.append(index)
+                return self._open_stream(index, request, self._attempt_id(request_id, len(tried)))
+
+            async def discard(opened):
+                await opened[0].aclose()
+
+            stream, first_chunk = await self.hedger.run((self.name, request.get("model"), True), attempt, discard)
+        try:
+            if first_chunk is None:
+                return
+            yield first_chunk
+            async for chunk in stream:
+                yield chunk
+        finally:
+            # Close the member stream now, not whenever the generator is collected
+            await stream.aclose()
+
+    @staticmethod
+    def _attempt_id(request_id: Optional[str], attempt: int) -> Optional[str]:
+        # Each attempt needs its own id so cancelling one never unregisters the other
+        if request_id is None or attempt == 1:
+            return request_id
+        return f"{request_id}:hedge"
+
+    def cancel_request(self, request_id: str) -> bool:
+        """Cancel a request, including its hedge, on whichever members hold it."""
+        cancelled = False
+        for member in self.members:
+            for attempt_id in (request_id, f"{request_id}:hedge"):
+                cancelled = member.cancel_request(attempt_id) or cancelled
+        return cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-member weight, outstanding requests, concurrency and breaker state."""
+        endpoints = []
+        for index, member in enumerate(self.members):
+            endpoint = {
+                "base_url": member.base_url,
+                "weight": self.weights[index],
+                "in_flight": member.in_flight,
+                "concurrency": member.bulkhead.stats(),
+            }
+            if member.limiter is not None:
+                endpoint["adaptive_limit"] = member.limiter.stats()
+            if member.rate_limiter is not None:
+                endpoint["rate_limit"] = member.rate_limiter.stats()
+            if self.breakers is not None:
+                endpoint["breaker"] = self.breakers[index].stats()
+            endpoints.append(endpoint)
+        return {"strategy": self.strategy, "endpoints": endpoints}
@@ -2,12 +2,36 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from src.api.endpoints import router as api_router
 from src.web.routes import router as web_router
+import asyncio
 import uvicorn
+from contextlib import asynccontextmanager
 import sys
 from src.core.config import config
+from src.core.client_pool import client_pool
+from src.core.logging import RequestLogContextMiddleware
+from src.models.claude_fast import fast_decode_available
+from src.web.env_manager import env_manager
 from pathlib import Path
 
-app = FastAPI(title="Claude-to-OpenAI API Proxy", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Follow .env changes from other workers while serving; close pooled upstream connections on shutdown."""
+    env_watcher = None
+    if config.workers > 1 and config.config_watch_interval > 0:
+        # Changes saved through another worker's admin UI reach this one
+        env_watcher = asyncio.create_task(env_manager.watch(config.config_watch_interval))
+    try:
+        yield
+    finally:
+        if env_watcher is not None:
+            env_watcher.cancel()
+        await client_pool.aclose()
+
+app = FastAPI(title="Claude-to-OpenAI API Proxy", version="1.0.0", lifespan=lifespan)
+
+# Bind per-request logging context (route, sampling decision)
+app.add_middleware(RequestLogContextMiddleware)
 
 # Include API router
 app.include_router(api_router)
@@ -20,6 +44,7 @@ static_dir = Path(__file__).parent / "web" / "static"
 static_dir.mkdir(exist_ok=True)
 app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
+
 def main():
     if len(sys.argv) > 1 and sys.argv[1] == "--help":
         print("Claude-to-OpenAI API Proxy v1.0.0")
@@ -48,7 +73,13 @@ def main():
     print( "   --- Server & Performance ---")
     print(f"   Max Tokens Limit: {config.max_tokens_limit}")
     print(f"   Request Timeout: {config.request_timeout}s")
+    print(f"   Upstream Connections: {config.max_connections} (keep-alive {config.max_keepalive_connections}, expiry {config.keepalive_expiry}s)")
+    if config.fast_decode:
+        print(f"   Fast Decode: {'enabled' if fast_decode_available() else 'unavailable (pip install msgspec), using pydantic'}")
     print(f"   Server: {config.host}:{config.port}")
+    if config.workers > 1:
+        watching = f"checked every {config.config_watch_interval:g}s" if config.config_watch_interval > 0 else "not watched"
+        print(f"   Workers: {config.workers} (.env {watching})")
     print(f"   Web UI: http://{config.host}:{config.port}/login")
     print("")
 
@@ -67,6 +98,7 @@ def main():
         port=config.port,
         log_level=log_level,
         reload=False,
+        workers=config.workers,
     )
 
 
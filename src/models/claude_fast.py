@@ -0,0 +1,120 @@
+from typing import Any, ClassVar, Dict, List, Literal, Optional, Union
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from src.models.claude import ClaudeMessagesRequest
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - msgspec is an optional dependency
+    msgspec = None
+
+
+if msgspec is not None:
+    # Mirrors of the pydantic models in src.models.claude with the same fields
+    # and defaults, decoded straight from the raw body. The ``type`` class
+    # attributes keep them duck-type compatible with the request converter.
+
+    class ClaudeContentBlockText(msgspec.Struct, tag_field="type", tag="text"):
+        type: ClassVar[str] = "text"
+        text: str
+
+    class ClaudeContentBlockImage(msgspec.Struct, tag_field="type", tag="image"):
+        type: ClassVar[str] = "image"
+        source: Dict[str, Any]
+
+    class ClaudeContentBlockToolUse(msgspec.Struct, tag_field="type", tag="tool_use"):
+        type: ClassVar[str] = "tool_use"
+        id: str
+        name: str
+        input: Dict[str, Any]
+
+    class ClaudeContentBlockToolResult(msgspec.Struct, tag_field="type", tag="tool_result"):
+        type: ClassVar[str] = "tool_result"
+        tool_use_id: str
+        content: Union[str, List[Dict[str, Any]], Dict[str, Any]]
+
+    class ClaudeSystemContent(msgspec.Struct, tag_field="type", tag="text"):
+        type: ClassVar[str] = "text"
+        text: str
+
+    class ClaudeMessage(msgspec.Struct):
+        role: Literal["user", "assistant"]
+        content: Union[
+            str,
+            List[
+                Union[
+                    ClaudeContentBlockText,
+                    ClaudeContentBlockImage,
+                    ClaudeContentBlockToolUse,
+                    ClaudeContentBlockToolResult,
+                ]
+            ],
+        ]
+
+    class ClaudeTool(msgspec.Struct):
+        name: str
+        input_schema: Dict[str, Any]
+        description: Optional[str] = None
+
+    class ClaudeThinkingConfig(msgspec.Struct):
+        enabled: bool = True
+
+    class FastClaudeMessagesRequest(msgspec.Struct):
+        model: str
+        max_tokens: int
+        messages: List[ClaudeMessage]
+        system: Optional[Union[str, List[ClaudeSystemContent]]] = None
+        stop_sequences: Optional[List[str]] = None
+        stream: Optional[bool] = False
+        temperature: Optional[float] = 1.0
+        top_p: Optional[float] = None
+        top_k: Optional[int] = None
+        metadata: Optional[Dict[str, Any]] = None
+        tools: Optional[List[ClaudeTool]] = None
+        tool_choice: Optional[Dict[str, Any]] = None
+        thinking: Optional[ClaudeThinkingConfig] = None
+
+    _messages_request_decoder = msgspec.json.Decoder(FastClaudeMessagesRequest, strict=False)
+
+
+def fast_decode_available() -> bool:
+    """Whether the optional msgspec dependency is installed."""
+    return msgspec is not None
+
+
+def decode_messages_request(body: bytes, fast: bool = False):
+    """Decode a /v1/messages body, raising RequestValidationError when invalid.
+
+    With fast=True (and msgspec installed) the body is decoded into the
+    lightweight structs above; otherwise it is validated into
+    ClaudeMessagesRequest as before. A body msgspec rejects is validated
+    again by pydantic, so the lax coercions pydantic allows (``true`` as an
+    integer, ``"yes"`` as a boolean) are still accepted and invalid bodies
+    get exactly the same 422 response either way. The reverse does not
+    hold for a few inputs pydantic refuses and msgspec accepts: exponent
+    strings such as ``"1e3"`` for integer fields, and integers beyond 64 bits
+    for float fields.
+    """
+    if fast and msgspec is not None:
+        try:
+            return _messages_request_decoder.decode(body)
+        except (msgspec.ValidationError, msgspec.DecodeError):
+            pass
+    try:
+        return ClaudeMessagesRequest.model_validate_json(body)
+    except ValidationError as e:
+        errors = []
+        for error in e.errors(include_url=False):
+            if error["type"] == "json_invalid":
+                errors.append({
+                    "type": "json_invalid",
+                    "loc": ("body", 0),
+                    "msg": "JSON decode error",
+                    "input": {},
+                    "ctx": {"error": error["msg"]},
+                })
+            else:
+                errors.append({**error, "loc": ("body",) + tuple(error["loc"])})
+        raise RequestValidationError(errors) from None
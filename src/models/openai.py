@@ -0,0 +1,31 @@
+from typing import Any, Dict, List, Optional, TypedDict
+
+
+# Streaming chunk shapes handed from OpenAIClient to the response converters.
+# These mirror ChatCompletionChunk.model_dump(), so unset fields are present as None.
+
+class OpenAIFunctionDelta(TypedDict, total=False):
+    name: Optional[str]
+    arguments: Optional[str]
+
+class OpenAIToolCallDelta(TypedDict, total=False):
+    index: int
+    id: Optional[str]
+    type: Optional[str]
+    function: Optional[OpenAIFunctionDelta]
+
+class OpenAIChoiceDelta(TypedDict, total=False):
+    role: Optional[str]
+    content: Optional[str]
+    tool_calls: Optional[List[OpenAIToolCallDelta]]
+
+class OpenAIStreamChoice(TypedDict, total=False):
+    index: int
+    delta: OpenAIChoiceDelta
+    finish_reason: Optional[str]
+
+class OpenAIStreamChunk(TypedDict, total=False):
+    id: str
+    model: str
+    choices: List[OpenAIStreamChoice]
+    usage: Optional[Dict[str, Any]]
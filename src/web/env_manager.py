@@ -1,7 +1,9 @@
+import asyncio
+import hashlib
 import os
 from dotenv import load_dotenv, set_key, find_dotenv
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 class EnvConfig(BaseModel):
     # Big model settings
@@ -37,6 +39,7 @@ class EnvManager:
         if not self.env_file:
             self.env_file = ".env"
         load_dotenv(self.env_file)
+        self._env_file_state = self._file_state()
     
     def get_current_config(self) -> EnvConfig:
         """Get current configuration from environment variables"""
@@ -84,6 +87,8 @@ class EnvManager:
 
             # Trigger config reload in the main application
             self._reload_app_config()
+            # This process is up to date; other workers notice the new file state
+            self._env_file_state = self._file_state()
 
             return True
         except Exception as e:
@@ -99,4 +104,32 @@ class EnvManager:
         except Exception as e:
             print(f"Warning: Could not reload app config: {e}")
 
+    def _file_state(self) -> Optional[bytes]:
+        # Hash the contents: an edit that keeps the size can land within the
+        # filesystem's mtime granularity. The file is small enough to read on every poll.
+        try:
+            with open(self.env_file, "rb") as f:
+                return hashlib.sha256(f.read()).digest()
+        except OSError:
+            return None
+
+    def reload_if_changed(self) -> bool:
+        """Reload the .env file and app config if the file changed since this process last read it."""
+        state = self._file_state()
+        if state == self._env_file_state:
+            return False
+        self._env_file_state = state
+        load_dotenv(self.env_file, override=True)
+        self._reload_app_config()
+        return True
+
+    async def watch(self, interval: float):
+        """Poll the .env file so changes saved by another worker reach this one."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                print(f"Warning: Could not reload changed .env file: {e}")
+
 env_manager = EnvManager()
\ No newline at end of file
@@ -13,6 +13,7 @@ from src.web.auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from src.web.env_manager import env_manager, EnvConfig
+from src.core.timing import request_timing
 
 # Create templates directory if it doesn't exist
 templates_dir = Path(__file__).parent / "templates"
@@ -86,6 +87,15 @@ async def get_config_status(current_user: User = Depends(get_current_active_user
         "timestamp": env_manager.get_current_config().dict()
     }
 
+@router.get("/api/debug/slow-requests")
+async def get_slow_requests(current_user: User = Depends(get_current_active_user)):
+    """Phase timing breakdown of the most recent slow requests, newest first"""
+    return {
+        "enabled": request_timing.enabled,
+        "threshold_seconds": request_timing.threshold,
+        "requests": request_timing.entries(),
+    }
+
 @router.get("/api/models")
 async def get_models(base_url: str, api_key: str, current_user: User = Depends(get_current_active_user)):
     """Get available models from the specified API endpoint"""
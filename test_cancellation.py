@@ -1,130 +1,157 @@
 #!/usr/bin/env python3
 """
-Test script for HTTP request cancellation functionality.
-This script demonstrates how client disconnection cancels ongoing requests.
+Benchmark for HTTP request cancellation.
+
+Starts a mock upstream (benchmarks/mock_upstream.py) and a proxy pointed at
+it, disconnects clients mid-request and reports how long it takes from the
+client disconnect until the proxy closes its upstream connection, i.e. until
+the provider stops generating (and billing) tokens.
+
+Usage: python test_cancellation.py [--iterations 10]
 """
 
+import argparse
 import asyncio
-import httpx
-import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
 import time
+from pathlib import Path
 
-async def test_non_streaming_cancellation():
-    """Test cancellation for non-streaming requests."""
-    print("🧪 Testing non-streaming request cancellation...")
-    
-    async with httpx.AsyncClient(timeout=30) as client:
-        try:
-            # Start a long-running request
-            task = asyncio.create_task(
-                client.post(
-                    "http://localhost:8082/v1/messages",
-                    json={
-                        "model": "claude-3-5-sonnet-20241022",
-                        "max_tokens": 1000,
-                        "messages": [
-                            {"role": "user", "content": "Write a very long story about a journey through space that takes at least 500 words."}
-                        ]
-                    }
-                )
-            )
-            
-            # Cancel after 2 seconds
-            await asyncio.sleep(2)
-            task.cancel()
-            
+import httpx
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.mock_upstream import MockUpstream  # noqa: E402
+
+REQUEST = {
+    "model": "claude-3-5-sonnet-20241022",
+    "max_tokens": 1000,
+    "messages": [
+        {"role": "user", "content": "Write a very long story about a journey through space that takes at least 500 words."}
+    ],
+}
+# Give up waiting for the upstream close after this many seconds
+CLOSE_TIMEOUT = 10.0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_proxy(upstream: MockUpstream):
+    """Launch the proxy as a subprocess and wait until it answers /health."""
+    port = free_port()
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="benchmark",
+        OPENAI_BASE_URL=upstream.base_url,
+        HOST="127.0.0.1",
+        PORT=str(port),
+        LOG_LEVEL="WARNING",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "start_proxy.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
             try:
-                await task
-                print("❌ Request should have been cancelled")
-            except asyncio.CancelledError:
-                print("✅ Non-streaming request cancelled successfully")
-                
-        except Exception as e:
-            print(f"❌ Non-streaming test error: {e}")
-
-async def test_streaming_cancellation():
-    """Test cancellation for streaming requests."""
-    print("\n🧪 Testing streaming request cancellation...")
-    
+                await client.get(f"{url}/health")
+                return process, url
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Proxy did not start")
+
+
+async def wait_for_close(upstream: MockUpstream, index: int) -> float:
+    """Wait until upstream request number index has been closed or finished."""
+    deadline = time.perf_counter() + CLOSE_TIMEOUT
+    while time.perf_counter() < deadline:
+        if len(upstream.records) > index:
+            record = upstream.records[index]
+            if record.closed is not None:
+                return record.closed
+            if record.finished is not None:
+                return record.finished
+        await asyncio.sleep(0.001)
+    return float("inf")
+
+
+async def streaming_disconnect(url: str, upstream: MockUpstream) -> float:
+    """Read a few events of a stream, drop the connection, return seconds until upstream close."""
+    index = len(upstream.records)
     async with httpx.AsyncClient(timeout=30) as client:
+        async with client.stream("POST", f"{url}/v1/messages", json={**REQUEST, "stream": True}) as response:
+            events = 0
+            async for line in response.aiter_lines():
+                if line.startswith("event: content_block_delta"):
+                    events += 1
+                    if events >= 3:
+                        break
+        disconnected_at = time.perf_counter()
+    return await wait_for_close(upstream, index) - disconnected_at
+
+
+async def non_streaming_disconnect(url: str, upstream: MockUpstream) -> float:
+    """Abandon a non-streaming request while the upstream is still working on it."""
+    index = len(upstream.records)
+    async with httpx.AsyncClient(timeout=30) as client:
+        task = asyncio.create_task(client.post(f"{url}/v1/messages", json=REQUEST))
+        while len(upstream.records) <= index:
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.2)
+        task.cancel()
         try:
-            # Start streaming request
-            async with client.stream(
-                "POST",
-                "http://localhost:8082/v1/messages",
-                json={
-                    "model": "claude-3-5-sonnet-20241022",
-                    "max_tokens": 1000,
-                    "messages": [
-                        {"role": "user", "content": "Write a very long story about a journey through space that takes at least 500 words."}
-                    ],
-                    "stream": True
-                }
-            ) as response:
-                if response.status_code == 200:
-                    print("✅ Streaming request started successfully")
-                    
-                    # Read a few chunks then simulate client disconnect
-                    chunk_count = 0
-                    async for line in response.aiter_lines():
-                        if line.strip():
-                            chunk_count += 1
-                            print(f"📦 Received chunk {chunk_count}: {line[:100]}...")
-                            
-                            # Simulate client disconnect after 3 chunks
-                            if chunk_count >= 3:
-                                print("🔌 Simulating client disconnect...")
-                                break
-                    
-                    print("✅ Streaming request cancelled successfully")
-                else:
-                    print(f"❌ Streaming request failed: {response.status_code}")
-                    
-        except Exception as e:
-            print(f"❌ Streaming test error: {e}")
-
-async def test_server_running():
-    """Test if the server is running."""
-    print("🔍 Checking if server is running...")
-    
-    try:
-        async with httpx.AsyncClient(timeout=5) as client:
-            response = await client.get("http://localhost:8082/health")
-            if response.status_code == 200:
-                print("✅ Server is running and healthy")
-                return True
-            else:
-                print(f"❌ Server health check failed: {response.status_code}")
-                return False
-    except Exception as e:
-        print(f"❌ Cannot connect to server: {e}")
-        print("💡 Make sure to start the server with: python start_proxy.py")
-        return False
+            await task
+        except asyncio.CancelledError:
+            pass
+        disconnected_at = time.perf_counter()
+    return await wait_for_close(upstream, index) - disconnected_at
 
-async def main():
-    """Main test function."""
-    print("🚀 Starting HTTP request cancellation tests")
-    print("=" * 50)
-    
-    # Check if server is running
-    if not await test_server_running():
+
+def report(name: str, latencies):
+    completed = [latency for latency in latencies if latency != float("inf")]
+    print(f"\n📊 {name}: disconnect → upstream close over {len(latencies)} runs")
+    if not completed:
+        print(f"   ❌ upstream connection never closed within {CLOSE_TIMEOUT}s")
         return
-    
-    print("\n" + "=" * 50)
-    
-    # Test non-streaming cancellation
-    await test_non_streaming_cancellation()
-    
-    # Test streaming cancellation  
-    await test_streaming_cancellation()
-    
-    print("\n" + "=" * 50)
-    print("✅ All cancellation tests completed!")
-    print("\n💡 Note: The actual cancellation behavior depends on:")
-    print("   - Client implementation (httpx in this case)")
-    print("   - Network conditions")
-    print("   - Server response to client disconnection")
-    print("   - Whether the underlying OpenAI API supports cancellation")
+    ordered = sorted(completed)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"   p50 {statistics.median(ordered) * 1000:8.1f}ms")
+    print(f"   p95 {p95 * 1000:8.1f}ms")
+    print(f"   max {ordered[-1] * 1000:8.1f}ms")
+    if len(completed) < len(latencies):
+        print(f"   ⚠️ {len(latencies) - len(completed)} runs still open after {CLOSE_TIMEOUT}s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure disconnect-to-upstream-close latency")
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    # A slow, long generation so the proxy is always mid-request when the client leaves
+    upstream = await MockUpstream(ttft=0.05, chunk_interval=0.25, chunks=200).start()
+    process, url = await start_proxy(upstream)
+    print("🚀 Cancellation benchmark")
+    print(f"   Upstream: {upstream.base_url}  Proxy: {url}")
+    try:
+        streaming = [await streaming_disconnect(url, upstream) for _ in range(args.iterations)]
+        report("Streaming", streaming)
+        non_streaming = [await non_streaming_disconnect(url, upstream) for _ in range(args.iterations)]
+        report("Non-streaming", non_streaming)
+    finally:
+        process.terminate()
+        process.wait()
+        await upstream.stop()
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
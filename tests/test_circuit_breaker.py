@@ -0,0 +1,120 @@
+"""Tests for circuit breaker transitions and last-member protection."""
+
+import os
+import time
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker  # noqa: E402
+from src.core.upstream import UpstreamGroup  # noqa: E402
+
+
+def _config(**overrides):
+    settings = dict(
+        breaker_enabled=True,
+        breaker_consecutive_failures=3,
+        breaker_error_rate=0.5,
+        breaker_min_requests=4,
+        breaker_latency_factor=3.0,
+        breaker_base_ejection=30.0,
+        breaker_max_ejection=300.0,
+    )
+    settings.update(overrides)
+    return SimpleNamespace(**settings)
+
+
+def _end_ejection(breaker):
+    breaker._opened_until = time.monotonic() - 1
+
+
+def test_consecutive_failures_open_the_breaker():
+    breaker = CircuitBreaker(_config())
+    for _ in range(2):
+        breaker.record_failure(False)
+    assert breaker.state == CLOSED
+    breaker.record_failure(False)
+    assert breaker.state == OPEN
+    assert not breaker.available()
+
+
+def test_error_rate_opens_the_breaker():
+    breaker = CircuitBreaker(_config(breaker_consecutive_failures=100))
+    for ok in (True, False, True, False, False):
+        if ok:
+            breaker.record_success(False)
+        else:
+            breaker.record_failure(False)
+    assert breaker.state == OPEN
+    assert breaker.last_reason == "error rate 60%"
+
+
+def test_half_open_probe_success_closes():
+    breaker = CircuitBreaker(_config())
+    breaker.trip("test")
+    _end_ejection(breaker)
+    assert breaker.available()
+    assert breaker.state == HALF_OPEN
+    probe = breaker.acquire()
+    assert probe
+    # Only one probe at a time
+    assert not breaker.available()
+    breaker.record_success(probe)
+    assert breaker.state == CLOSED
+    assert breaker.available()
+
+
+def test_failed_probe_doubles_the_ejection():
+    breaker = CircuitBreaker(_config())
+    breaker.trip("test")
+    _end_ejection(breaker)
+    breaker.available()
+    breaker.record_failure(breaker.acquire())
+    assert breaker.state == OPEN
+    assert breaker.ejections == 2
+    assert 59 < breaker._opened_until - time.monotonic() <= 60
+
+
+def test_released_probe_lets_another_through():
+    breaker = CircuitBreaker(_config())
+    breaker.trip("test")
+    _end_ejection(breaker)
+    breaker.available()
+    breaker.release(breaker.acquire())
+    assert breaker.state == HALF_OPEN
+    assert breaker.available()
+
+
+def test_last_member_is_never_ejected():
+    breaker = CircuitBreaker(_config())
+    for _ in range(10):
+        breaker.record_failure(False, can_eject=False)
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 10
+
+
+def _group(size):
+    members = [SimpleNamespace(base_url=f"http://upstream{i}", in_flight=0) for i in range(size)]
+    return UpstreamGroup("big", members, [1.0] * size, config=_config())
+
+
+def test_group_keeps_its_last_healthy_member():
+    group = _group(2)
+    error = HTTPException(status_code=502, detail="boom")
+    for _ in range(3):
+        group._record_error(0, False, error)
+    assert group.breakers[0].state == OPEN
+    for _ in range(10):
+        group._record_error(1, False, error)
+    assert group.breakers[1].state == CLOSED
+    assert group._select() == 1
+
+
+def test_client_errors_do_not_count_as_failures():
+    group = _group(2)
+    for _ in range(5):
+        group._record_error(0, False, HTTPException(status_code=400, detail="bad request"))
+    assert group.breakers[0].state == CLOSED
+    assert group.breakers[0].consecutive_failures == 0
@@ -0,0 +1,153 @@
+"""Tests for the per-upstream bulkhead and adaptive concurrency limit."""
+
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.core.concurrency import AdaptiveLimit, Bulkhead, OverloadedError  # noqa: E402
+
+
+def test_unlimited_bulkhead_never_queues():
+    async def main():
+        bulkhead = Bulkhead(limit=0)
+        for _ in range(50):
+            await bulkhead.acquire()
+        return bulkhead
+
+    bulkhead = asyncio.run(main())
+    assert bulkhead.active == 50
+    assert bulkhead.queued == 0
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    async def main():
+        bulkhead = Bulkhead(limit=1, max_queue=10)
+        await bulkhead.acquire()
+        order = []
+
+        async def waiter(name):
+            await bulkhead.acquire()
+            order.append(name)
+
+        tasks = []
+        for name in "abc":
+            tasks.append(asyncio.ensure_future(waiter(name)))
+            await asyncio.sleep(0)
+        assert bulkhead.queue_depth == 3
+        for _ in range(3):
+            bulkhead.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order, bulkhead
+
+    order, bulkhead = asyncio.run(main())
+    assert order == ["a", "b", "c"]
+    assert bulkhead.active == 1
+    assert bulkhead.queued == 3
+
+
+def test_full_queue_fails_fast():
+    async def main():
+        bulkhead = Bulkhead(limit=1, max_queue=1)
+        await bulkhead.acquire()
+        queued = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError) as raised:
+            await bulkhead.acquire()
+        queued.cancel()
+        return raised.value, bulkhead
+
+    error, bulkhead = asyncio.run(main())
+    assert error.status_code == 529
+    assert "too many queued" in error.detail
+    assert bulkhead.rejected == 1
+
+
+def test_newcomer_does_not_jump_the_queue():
+    async def main():
+        bulkhead = Bulkhead(limit=1, max_queue=10)
+        await bulkhead.acquire()
+        first = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0)
+        # The freed slot goes straight to the waiter, not to a request arriving now
+        bulkhead.release()
+        newcomer = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0.01)
+        result = (first.done(), newcomer.done(), bulkhead.queue_depth)
+        newcomer.cancel()
+        return result
+
+    assert asyncio.run(main()) == (True, False, 1)
+
+
+def test_queue_timeout_raises_overloaded():
+    async def main():
+        bulkhead = Bulkhead(limit=1, max_queue=10, queue_timeout=0.01)
+        await bulkhead.acquire()
+        with pytest.raises(OverloadedError, match="no capacity within"):
+            await bulkhead.acquire()
+        return bulkhead
+
+    bulkhead = asyncio.run(main())
+    assert bulkhead.timeouts == 1
+    assert bulkhead.queue_depth == 0
+    assert bulkhead.active == 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        bulkhead = Bulkhead(limit=1, max_queue=10)
+        await bulkhead.acquire()
+        cancelled = asyncio.ensure_future(bulkhead.acquire())
+        waiting = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        bulkhead.release()
+        await waiting
+        return bulkhead
+
+    bulkhead = asyncio.run(main())
+    assert bulkhead.active == 1
+    assert bulkhead.queue_depth == 0
+
+
+def test_raising_the_limit_admits_waiters():
+    async def main():
+        bulkhead = Bulkhead(limit=1, max_queue=10)
+        await bulkhead.acquire()
+        waiters = [asyncio.ensure_future(bulkhead.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        bulkhead.set_limit(3)
+        await asyncio.gather(*waiters)
+        return bulkhead
+
+    assert asyncio.run(main()).active == 3
+
+
+def test_adaptive_limit_shrinks_when_latency_inflates():
+    bulkhead = Bulkhead()
+    limit = AdaptiveLimit(bulkhead, initial_limit=20, min_limit=2, max_limit=200)
+    bulkhead.active = 20
+    for _ in range(20):
+        limit.record(0.1, stream=False)
+    steady = bulkhead.limit
+    for _ in range(20):
+        limit.record(1.0, stream=False)
+    assert bulkhead.limit < steady
+    assert limit.decreases > 0
+
+
+def test_adaptive_limit_respects_bounds():
+    bulkhead = Bulkhead()
+    limit = AdaptiveLimit(bulkhead, initial_limit=7, min_limit=6, max_limit=8)
+    for _ in range(50):
+        limit.drop()
+    assert bulkhead.limit == 6
+    bulkhead.active = 100
+    for _ in range(200):
+        limit.record(0.1, stream=True)
+    assert bulkhead.limit == 8
@@ -0,0 +1,120 @@
+"""Regression tests for the conversion cache's message keys."""
+
+import copy
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.conversion.conversion_cache import conversion_cache, fingerprint  # noqa: E402
+from src.conversion.request_converter import convert_claude_to_openai  # noqa: E402
+from src.models.claude import ClaudeMessagesRequest  # noqa: E402
+
+
+def _tool_history(tool_input):
+    return ClaudeMessagesRequest(
+        model="claude-3-5-sonnet-20241022",
+        max_tokens=100,
+        messages=[
+            {"role": "user", "content": "Read the log."},
+            {"role": "assistant", "content": [
+                {"type": "tool_use", "id": "toolu_1", "name": "Read", "input": tool_input},
+            ]},
+            {"role": "user", "content": [
+                {"type": "tool_result", "tool_use_id": "toolu_1", "content": "ok"},
+            ]},
+        ],
+    )
+
+
+def _converted_arguments(tool_input):
+    messages = convert_claude_to_openai(_tool_history(tool_input), "gpt-4o")["messages"]
+    return json.loads(messages[1]["tool_calls"][0]["function"]["arguments"])
+
+
+def test_fingerprint_is_type_aware():
+    """Values whose hash() collides still get distinct keys."""
+    assert fingerprint(-1) != fingerprint(-2)
+    assert len({fingerprint(1), fingerprint(1.0), fingerprint(True)}) == 3
+    assert fingerprint({"offset": 1}) != fingerprint({"offset": True})
+    assert fingerprint(["a"]) != fingerprint({"a": None})
+
+
+def test_colliding_prefixes_are_not_reused():
+    """A cached prefix is only reused for equal messages."""
+    conversion_cache.enabled = True
+    try:
+        for first, second in ((-1, -2), (True, 1), (1, 1.0)):
+            assert _converted_arguments({"offset": first}) == {"offset": first}
+            arguments = _converted_arguments({"offset": second})
+            assert arguments == {"offset": second}
+            assert type(arguments["offset"]) is type(second)
+    finally:
+        conversion_cache.reload()
+
+
+def test_equal_prefix_is_reused():
+    conversion_cache.enabled = True
+    try:
+        _converted_arguments({"offset": 7})
+        hits = conversion_cache.hits
+        assert _converted_arguments({"offset": 7}) == {"offset": 7}
+        assert conversion_cache.hits == hits + 1
+    finally:
+        conversion_cache.reload()
+
+
+def _conversation(turns):
+    messages = [{"role": "user", "content": "Fix the bug."}]
+    for turn in range(turns):
+        messages.append({"role": "assistant", "content": [
+            {"type": "text", "text": "Reading the file."},
+            {"type": "tool_use", "id": f"toolu_{turn}", "name": "Read", "input": {"offset": turn, "limit": 1.0}},
+        ]})
+        messages.append({"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": f"toolu_{turn}", "content": "x = 1\n" * turn},
+        ]})
+    return {"model": "claude-3-5-sonnet-20241022", "max_tokens": 100, "messages": messages}
+
+
+def _convert(payload, spacing=None):
+    body = json.dumps(payload, indent=spacing).encode()
+    request = ClaudeMessagesRequest.model_validate_json(body)
+    return convert_claude_to_openai(request, "gpt-4o", body)
+
+
+def test_body_prefix_is_reused():
+    """Messages hashed from the raw body are reused by the next turn, and only for equal bytes."""
+    expected = convert_claude_to_openai(ClaudeMessagesRequest(**_conversation(4)), "gpt-4o")
+    conversion_cache.enabled = True
+    try:
+        _convert(_conversation(3))
+        hits, converted = conversion_cache.hits, conversion_cache.converted_messages
+        assert _convert(_conversation(4)) == expected
+        assert conversion_cache.hits == hits + 1
+        assert conversion_cache.converted_messages == converted + 2
+        # The same messages formatted differently are converted again, not confused
+        assert _convert(_conversation(4), spacing=2) == expected
+    finally:
+        conversion_cache.reload()
+
+
+def test_cached_messages_are_not_mutated():
+    """Converted messages shared through the cache come out of a request unchanged."""
+    from src.core.response_cache import canonical_request_key
+    from src.core.tokenizer import token_counter
+
+    conversion_cache.enabled = True
+    try:
+        first = _convert(_conversation(3))
+        snapshot = copy.deepcopy(first["messages"])
+        # What the endpoint and the upstream client do with a converted request
+        canonical_request_key(first)
+        token_counter.count_openai_request(first)
+        second = _convert(_conversation(4))
+        canonical_request_key(second)
+        token_counter.count_openai_request(second)
+        assert all(a is b for a, b in zip(first["messages"], second["messages"]))
+        assert first["messages"] == snapshot
+    finally:
+        conversion_cache.reload()
@@ -0,0 +1,38 @@
+"""Tests for detecting .env changes saved by another worker."""
+
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.web.env_manager import EnvManager  # noqa: E402
+
+
+def _manager(env_file):
+    manager = EnvManager.__new__(EnvManager)
+    manager.env_file = str(env_file)
+    return manager
+
+
+def test_same_size_edit_changes_the_state(tmp_path):
+    env_file = tmp_path / ".env"
+    env_file.write_text('LOG_LEVEL="INFO"\n')
+    manager = _manager(env_file)
+    before = manager._file_state()
+    stat = os.stat(env_file)
+    env_file.write_text('LOG_LEVEL="WARN"\n')
+    # Same size and, as on a coarse-grained filesystem, the same mtime
+    os.utime(env_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert manager._file_state() != before
+
+
+def test_unchanged_file_keeps_the_state(tmp_path):
+    env_file = tmp_path / ".env"
+    env_file.write_text('LOG_LEVEL="INFO"\n')
+    manager = _manager(env_file)
+    before = manager._file_state()
+    os.utime(env_file)
+    assert manager._file_state() == before
+
+
+def test_missing_file(tmp_path):
+    assert _manager(tmp_path / ".env")._file_state() is None
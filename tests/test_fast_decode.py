@@ -0,0 +1,69 @@
+"""Parity tests between the msgspec fast decode path and pydantic validation."""
+
+import json
+
+import pytest
+from fastapi.exceptions import RequestValidationError
+
+from src.models.claude_fast import decode_messages_request
+
+pytest.importorskip("msgspec")
+
+BASE = {"model": "claude-3-5-sonnet", "max_tokens": 100, "messages": [{"role": "user", "content": "hi"}]}
+FIELDS = ("model", "max_tokens", "stream", "temperature", "top_p", "top_k", "stop_sequences", "metadata", "system")
+VALUES = [True, False, None, 0, 1, 1.0, 1.5, "1", "1.0", "true", "yes", "off", "x", "", [], {}, ["a"], {"a": 1}]
+
+
+def _decode(body, fast):
+    try:
+        request = decode_messages_request(body, fast=fast)
+    except RequestValidationError as e:
+        return "error", e.errors()
+    return "ok", {field: getattr(request, field) for field in FIELDS}
+
+
+def _bodies():
+    for field in FIELDS:
+        for value in VALUES:
+            yield f"{field}={value!r}", dict(BASE, **{field: value})
+    yield "missing model", {key: value for key, value in BASE.items() if key != "model"}
+    yield "bad role", dict(BASE, messages=[{"role": "system", "content": "hi"}])
+    yield "unknown block", dict(BASE, messages=[{"role": "user", "content": [{"type": "video"}]}])
+    yield "tool without schema", dict(BASE, tools=[{"name": "Read"}])
+    yield "thinking", dict(BASE, thinking={"enabled": "false"})
+    yield "extra fields", dict(
+        BASE,
+        messages=[{"role": "user", "content": [{"type": "text", "text": "a", "cache_control": {"type": "ephemeral"}}]}],
+    )
+
+
+CASES = list(_bodies())
+
+
+@pytest.mark.parametrize("payload", [payload for _, payload in CASES], ids=[name for name, _ in CASES])
+def test_fast_decode_matches_pydantic(payload):
+    body = json.dumps(payload).encode()
+    assert _decode(body, fast=True) == _decode(body, fast=False)
+
+
+@pytest.mark.parametrize("body", [b"", b"{", b'{"model": ', b"[]", b"null"])
+def test_malformed_json_matches_pydantic(body):
+    assert _decode(body, fast=True) == _decode(body, fast=False)
+
+
+def test_lax_values_are_accepted():
+    body = json.dumps(dict(BASE, max_tokens=True, stream="yes")).encode()
+    status, fields = _decode(body, fast=True)
+    assert status == "ok"
+    assert fields["max_tokens"] == 1
+    assert fields["stream"] is True
+
+
+def test_error_items_keep_the_input():
+    body = json.dumps(dict(BASE, max_tokens="many")).encode()
+    with pytest.raises(RequestValidationError) as raised:
+        decode_messages_request(body, fast=True)
+    [error] = raised.value.errors()
+    assert error["loc"] == ("body", "max_tokens")
+    assert error["type"] == "int_parsing"
+    assert error["input"] == "many"
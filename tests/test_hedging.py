@@ -0,0 +1,107 @@
+"""Tests for hedged requests."""
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.core.hedging import Hedger  # noqa: E402
+
+
+def _hedger(**overrides):
+    settings = dict(
+        hedge_enabled=True,
+        hedge_tiers="small",
+        hedge_percentile=95.0,
+        hedge_min_samples=5,
+        hedge_min_delay=0.01,
+    )
+    settings.update(overrides)
+    hedger = Hedger(SimpleNamespace(**settings))
+    for _ in range(5):
+        hedger.record("key", 0.02)
+    return hedger
+
+
+def _attempts(*delays, errors=()):
+    """An attempt factory whose n-th call sleeps delays[n] and returns n (or raises)."""
+    calls = []
+
+    async def attempt():
+        index = len(calls)
+        calls.append(index)
+        await asyncio.sleep(delays[index])
+        if index in errors:
+            raise RuntimeError(f"attempt {index} failed")
+        return index
+
+    return attempt, calls
+
+
+def test_no_hedge_without_samples():
+    hedger = Hedger(SimpleNamespace(hedge_enabled=True, hedge_tiers="small", hedge_percentile=95.0,
+                                    hedge_min_samples=5, hedge_min_delay=0.01))
+    attempt, calls = _attempts(0.05)
+    assert asyncio.run(hedger.run("key", attempt)) == 0
+    assert calls == [0]
+    assert hedger.hedged == 0
+
+
+def test_fast_primary_is_not_hedged():
+    hedger = _hedger()
+    attempt, calls = _attempts(0.0)
+    assert asyncio.run(hedger.run("key", attempt)) == 0
+    assert calls == [0]
+    assert hedger.hedged == 0
+
+
+def test_slow_primary_is_hedged_and_loser_discarded():
+    hedger = _hedger()
+    attempt, calls = _attempts(0.2, 0.0)
+    discarded = []
+
+    async def discard(result):
+        discarded.append(result)
+
+    async def main():
+        result = await hedger.run("key", attempt, discard)
+        await asyncio.sleep(0.01)
+        return result
+
+    assert asyncio.run(main()) == 1
+    assert calls == [0, 1]
+    assert hedger.hedged == 1
+    assert hedger.hedge_wins == 1
+    # The primary was cancelled before producing a result
+    assert discarded == []
+
+
+def test_hedge_win_is_timed_from_the_primary_start():
+    hedger = _hedger()
+    attempt, _ = _attempts(0.2, 0.0)
+    asyncio.run(hedger.run("key", attempt))
+    # Hedged after ~0.02s; the recorded latency covers the wait before the hedge
+    assert hedger._windows["key"].samples[-1] >= 0.02
+
+
+def test_primary_error_is_reported_when_both_fail():
+    hedger = _hedger()
+    attempt, _ = _attempts(0.05, 0.0, errors=(0, 1))
+    with pytest.raises(RuntimeError, match="attempt 0"):
+        asyncio.run(hedger.run("key", attempt))
+
+
+def test_failed_hedge_falls_back_to_the_primary():
+    hedger = _hedger()
+    attempt, _ = _attempts(0.05, 0.0, errors=(1,))
+    assert asyncio.run(hedger.run("key", attempt)) == 0
+    assert hedger.hedge_wins == 0
+
+
+def test_enabled_for_tier():
+    hedger = _hedger(hedge_tiers="big, small")
+    assert hedger.enabled_for("big")
+    assert not _hedger(hedge_enabled=False).enabled_for("small")
@@ -0,0 +1,80 @@
+"""Tests for incremental tracking of tool-call arguments streamed as JSON fragments."""
+
+import json
+
+import pytest
+
+from src.conversion.json_stream import IncrementalJSONTracker
+
+DOCUMENTS = [
+    "{}",
+    '{"path": "/tmp/a.txt"}',
+    '{"text": "quote \\" and brace } and bracket ]"}',
+    '{"path": "C:\\\\dir\\\\", "n": [1, {"x": []}]}',
+    '{"u": "\\u00e9\\ud83c\\udf89", "nested": {"a": [[], [{}]]}}',
+    '  {"pad": true}',
+]
+
+
+def _feed(fragments):
+    tracker = IncrementalJSONTracker()
+    states = [tracker.feed(fragment) for fragment in fragments]
+    return tracker, states
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_complete_only_at_the_end_for_every_split(document):
+    # Splitting anywhere, including between a backslash and the character it escapes
+    for split in range(1, len(document)):
+        tracker, states = _feed([document[:split], document[split:]])
+        assert states == [False, True], split
+        assert tracker.text() == document
+        assert tracker.completion_suffix() == ""
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_one_character_fragments(document):
+    tracker, states = _feed(list(document))
+    assert states[-1]
+    assert not any(states[:-1])
+    assert json.loads(tracker.text()) == json.loads(document)
+
+
+def test_escaped_backslash_before_quote_closes_the_string():
+    # "a\\" ends the string; the backslash is itself escaped
+    tracker, states = _feed(['{"k": "a\\', '\\', '"', "}"])
+    assert states == [False, False, False, True]
+
+
+def test_escaped_quote_split_from_its_backslash():
+    tracker, _ = _feed(['{"k": "a\\', '"}'])
+    # The quote is escaped, so the string and object are still open
+    assert not tracker.complete
+    assert json.loads(tracker.text() + tracker.completion_suffix()) == {"k": 'a"}'}
+
+
+@pytest.mark.parametrize(
+    "fragments",
+    [
+        ['{"path": "/tmp'],
+        ['{"a": [1, {"b": 2'],
+        ['{"a": "x\\'],
+        ['{"a": [', '"b\\"c'],
+    ],
+)
+def test_completion_suffix_closes_truncated_documents(fragments):
+    tracker, _ = _feed(fragments)
+    assert not tracker.complete
+    json.loads(tracker.text() + tracker.completion_suffix())
+
+
+def test_nothing_received():
+    tracker, states = _feed(["", "  "])
+    assert states == [False, False]
+    assert tracker.completion_suffix() == "{}"
+    assert tracker.text() == "  "
+
+
+def test_empty_fragments_keep_the_state():
+    tracker, states = _feed(['{"a": 1', "", "}", ""])
+    assert states == [False, False, True, True]
@@ -0,0 +1,134 @@
+"""Tests for upstream retries, Retry-After handling and the retry budget."""
+
+import asyncio
+import os
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APIConnectionError, APIStatusError
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.core.retry import RetryBudget, RetryPolicy, is_retryable, retry_after_seconds  # noqa: E402
+
+_REQUEST = httpx.Request("POST", "http://upstream/v1/chat/completions")
+
+
+def _status_error(status_code, headers=None, code=None):
+    response = httpx.Response(status_code, headers=headers or {}, request=_REQUEST)
+    body = {"code": code} if code else None
+    return APIStatusError(f"status {status_code}", response=response, body=body)
+
+
+def _policy(**overrides):
+    settings = dict(
+        max_retries=2,
+        retry_base_delay=0.0,
+        retry_max_delay=8.0,
+        retry_budget_ratio=0.1,
+        retry_budget_min_per_second=1.0,
+    )
+    settings.update(overrides)
+    return RetryPolicy(SimpleNamespace(**settings))
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(_status_error(429, {"retry-after": "3"})) == 3.0
+    assert retry_after_seconds(_status_error(429, {"retry-after-ms": "250", "retry-after": "3"})) == 0.25
+    assert retry_after_seconds(_status_error(429)) is None
+    assert retry_after_seconds(_status_error(429, {"retry-after": "soon"})) is None
+    assert retry_after_seconds(ValueError("no response")) is None
+
+
+def test_retry_after_http_date():
+    header = formatdate(time.time() + 30, usegmt=True)
+    assert 25 < retry_after_seconds(_status_error(503, {"retry-after": header})) <= 30
+
+
+def test_is_retryable():
+    assert is_retryable(APIConnectionError(request=_REQUEST))
+    assert is_retryable(_status_error(503))
+    assert is_retryable(_status_error(429))
+    assert not is_retryable(_status_error(400))
+    assert not is_retryable(_status_error(429, code="insufficient_quota"))
+    assert not is_retryable(_status_error(503, {"x-should-retry": "false"}))
+    assert is_retryable(_status_error(400, {"x-should-retry": "true"}))
+    assert not is_retryable(ValueError("bug"))
+
+
+def test_backoff_honours_retry_after_up_to_the_ceiling():
+    policy = _policy(retry_max_delay=5.0)
+    assert policy.backoff(0, _status_error(429, {"retry-after": "2"})) == 2.0
+    # Longer than RETRY_MAX_DELAY: give up and let the client see it
+    assert policy.backoff(0, _status_error(429, {"retry-after": "60"})) is None
+    assert 0 <= policy.backoff(10, _status_error(503)) <= 5.0
+
+
+def _failing(*errors, result="ok"):
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return operation, calls
+
+
+def test_transient_errors_are_retried():
+    policy = _policy()
+    operation, calls = _failing(_status_error(503), APIConnectionError(request=_REQUEST))
+    assert asyncio.run(policy.run(operation)) == "ok"
+    assert len(calls) == 3
+    assert policy.retries == 2
+
+
+def test_gives_up_after_max_retries():
+    policy = _policy(max_retries=1)
+    operation, calls = _failing(_status_error(503), _status_error(503))
+    with pytest.raises(APIStatusError):
+        asyncio.run(policy.run(operation))
+    assert len(calls) == 2
+    assert policy.gave_up == 1
+
+
+def test_client_errors_are_not_retried():
+    policy = _policy()
+    operation, calls = _failing(_status_error(400))
+    with pytest.raises(APIStatusError):
+        asyncio.run(policy.run(operation))
+    assert len(calls) == 1
+
+
+def test_long_retry_after_is_returned_to_the_client():
+    policy = _policy(retry_max_delay=1.0)
+    operation, calls = _failing(_status_error(429, {"retry-after": "30"}))
+    with pytest.raises(APIStatusError):
+        asyncio.run(policy.run(operation))
+    assert len(calls) == 1
+    assert policy.gave_up == 1
+
+
+def test_budget_limits_retries():
+    budget = RetryBudget(ratio=0.5, min_per_second=0.0)
+    budget.tokens = 1.0
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    # Two requests deposit one retry
+    budget.on_request()
+    budget.on_request()
+    assert budget.try_spend()
+
+
+def test_exhausted_budget_stops_retrying():
+    policy = _policy(retry_budget_ratio=0.0, retry_budget_min_per_second=0.0)
+    policy.budget.tokens = 0.0
+    operation, calls = _failing(_status_error(503))
+    with pytest.raises(APIStatusError):
+        asyncio.run(policy.run(operation))
+    assert len(calls) == 1
+    assert policy.budget_exhausted == 1
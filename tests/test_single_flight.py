@@ -0,0 +1,196 @@
+"""Tests for single-flight coalescing and shared stream broadcast."""
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.core.single_flight import SingleFlight  # noqa: E402
+
+
+def _single_flight(buffer_events=1024):
+    return SingleFlight(SimpleNamespace(single_flight_enabled=True, single_flight_buffer_events=buffer_events))
+
+
+class _Source:
+    """An event source the test releases one event at a time."""
+
+    def __init__(self):
+        self.opened = 0
+        self.queue = asyncio.Queue()
+        self.closed = False
+
+    async def open(self):
+        self.opened += 1
+        return self._events()
+
+    async def _events(self):
+        try:
+            while True:
+                event = await self.queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self.closed = True
+
+
+async def _collect(events):
+    return [event async for event in events]
+
+
+def test_late_joiner_gets_the_full_stream():
+    async def main():
+        flight = _single_flight()
+        source = _Source()
+        first = await flight.stream("key", source.open)
+        first_task = asyncio.ensure_future(_collect(first))
+        for event in (b"a", b"b"):
+            source.queue.put_nowait(event)
+        await asyncio.sleep(0.01)
+        # Joins after two events were sent and gets them replayed
+        second = await flight.stream("key", source.open)
+        second_task = asyncio.ensure_future(_collect(second))
+        await asyncio.sleep(0.01)
+        source.queue.put_nowait(b"c")
+        source.queue.put_nowait(None)
+        return source, flight, await first_task, await second_task
+
+    source, flight, first, second = asyncio.run(main())
+    assert first == second == [b"a", b"b", b"c"]
+    assert source.opened == 1
+    assert flight.coalesced_streams == 1
+    assert flight.stats()["in_flight_streams"] == 0
+
+
+def test_joining_a_finished_stream_starts_a_new_one():
+    async def main():
+        flight = _single_flight()
+        source = _Source()
+        events = await flight.stream("key", source.open)
+        source.queue.put_nowait(b"a")
+        source.queue.put_nowait(None)
+        await _collect(events)
+        await flight.stream("key", source.open)
+        return source
+
+    assert asyncio.run(main()).opened == 2
+
+
+def test_open_error_reaches_every_caller():
+    async def main():
+        flight = _single_flight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream rejected")
+
+        return await asyncio.gather(
+            flight.stream("key", fail), flight.stream("key", fail), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_last_subscriber_leaving_cancels_the_source():
+    async def main():
+        flight = _single_flight()
+        source = _Source()
+        first = await flight.stream("key", source.open)
+        second = await flight.stream("key", source.open)
+        source.queue.put_nowait(b"a")
+        assert await first.__anext__() == b"a"
+        assert await second.__anext__() == b"a"
+        await first.aclose()
+        await asyncio.sleep(0.01)
+        closed_with_one_left = source.closed
+        await second.aclose()
+        await asyncio.sleep(0.01)
+        return closed_with_one_left, source.closed
+
+    assert asyncio.run(main()) == (False, True)
+
+
+def test_slow_subscriber_is_detached():
+    async def main():
+        flight = _single_flight(buffer_events=2)
+        source = _Source()
+        events = await flight.stream("key", source.open)
+        source.queue.put_nowait(b"a")
+        first = await events.__anext__()
+        # The client stops reading while more events arrive than its buffer holds
+        for event in (b"b", b"c", b"d"):
+            source.queue.put_nowait(event)
+        source.queue.put_nowait(None)
+        await asyncio.sleep(0.01)
+        return [first] + await _collect(events)
+
+    events = asyncio.run(main())
+    # Detached with an error instead of a silently truncated stream
+    assert events[0] == b"a"
+    assert len(events) == 2
+    assert b"overloaded_error" in events[-1]
+
+
+def test_calls_are_coalesced():
+    async def main():
+        flight = _single_flight()
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"id": "response"}
+
+        results = await asyncio.gather(*[flight.call("key", factory) for _ in range(3)])
+        return calls, results, flight
+
+    calls, results, flight = asyncio.run(main())
+    assert len(calls) == 1
+    assert results == [{"id": "response"}] * 3
+    assert flight.coalesced_calls == 2
+
+
+def test_call_error_reaches_every_caller():
+    async def main():
+        flight = _single_flight()
+
+        async def factory():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(*[flight.call("key", factory) for _ in range(2)], return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
+
+
+def test_calls_after_completion_run_again():
+    async def main():
+        flight = _single_flight()
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            return len(calls)
+
+        return [await flight.call("key", factory), await flight.call("key", factory)]
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+@pytest.mark.parametrize("events", [[b"x"], []])
+def test_subscriber_sees_source_end(events):
+    async def main():
+        flight = _single_flight()
+        source = _Source()
+        stream = await flight.stream("key", source.open)
+        for event in events:
+            source.queue.put_nowait(event)
+        source.queue.put_nowait(None)
+        return await _collect(stream)
+
+    assert asyncio.run(main()) == events
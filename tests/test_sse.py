@@ -0,0 +1,96 @@
+"""Tests that the byte-level SSE encoder matches the original json.dumps frames."""
+
+import json
+
+import pytest
+
+from src.conversion import sse
+from src.core.constants import Constants
+
+# Strings that exercise escaping: quotes, backslashes, control characters,
+# non-ASCII text and astral-plane emoji
+TEXTS = [
+    "",
+    "plain text",
+    'say "hi"\\n',
+    "line\nbreak\ttab\r\x00\x1f\x7f",
+    "naïve — 日本語",
+    "emoji 🎉",
+    "</script>\u2028\u2029",
+]
+
+
+def _frame(event_type, payload):
+    """The frame as the converters built it before the byte encoder."""
+    return f"event: {event_type}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("index", [0, 7, 12345])
+def test_text_delta(text, index):
+    expected = _frame(
+        Constants.EVENT_CONTENT_BLOCK_DELTA,
+        {"type": Constants.EVENT_CONTENT_BLOCK_DELTA, "index": index, "delta": {"type": Constants.DELTA_TEXT, "text": text}},
+    )
+    assert sse.text_delta(index, text) == expected
+
+
+@pytest.mark.parametrize("partial_json", TEXTS + ['{"path": "C:\\\\dir", "n": 1}', '{"a": ['])
+def test_input_json_delta(partial_json):
+    expected = _frame(
+        Constants.EVENT_CONTENT_BLOCK_DELTA,
+        {
+            "type": Constants.EVENT_CONTENT_BLOCK_DELTA,
+            "index": 2,
+            "delta": {"type": Constants.DELTA_INPUT_JSON, "partial_json": partial_json},
+        },
+    )
+    assert sse.input_json_delta(2, partial_json) == expected
+
+
+def test_fixed_frames():
+    assert sse.PING == _frame(Constants.EVENT_PING, {"type": Constants.EVENT_PING})
+    assert sse.MESSAGE_STOP == _frame(Constants.EVENT_MESSAGE_STOP, {"type": Constants.EVENT_MESSAGE_STOP})
+    assert sse.content_block_stop(3) == _frame(
+        Constants.EVENT_CONTENT_BLOCK_STOP, {"type": Constants.EVENT_CONTENT_BLOCK_STOP, "index": 3}
+    )
+    assert sse.text_block_start(0) == _frame(
+        Constants.EVENT_CONTENT_BLOCK_START,
+        {"type": Constants.EVENT_CONTENT_BLOCK_START, "index": 0, "content_block": {"type": Constants.CONTENT_TEXT, "text": ""}},
+    )
+
+
+def test_tool_use_block_start():
+    expected = _frame(
+        Constants.EVENT_CONTENT_BLOCK_START,
+        {
+            "type": Constants.EVENT_CONTENT_BLOCK_START,
+            "index": 1,
+            "content_block": {"type": Constants.CONTENT_TOOL_USE, "id": "call_1", "name": "Read \"file\"", "input": {}},
+        },
+    )
+    assert sse.tool_use_block_start(1, "call_1", 'Read "file"') == expected
+
+
+def test_message_frames():
+    message = {
+        "id": "msg_1",
+        "type": "message",
+        "role": Constants.ROLE_ASSISTANT,
+        "model": "claude-3-5-sonnet",
+        "content": [],
+        "stop_reason": None,
+        "stop_sequence": None,
+        "usage": {"input_tokens": 0, "output_tokens": 0},
+    }
+    assert sse.message_start(message) == _frame(
+        Constants.EVENT_MESSAGE_START, {"type": Constants.EVENT_MESSAGE_START, "message": message}
+    )
+    usage = {"input_tokens": 10, "output_tokens": 5}
+    assert sse.message_delta("end_turn", usage) == _frame(
+        Constants.EVENT_MESSAGE_DELTA,
+        {"type": Constants.EVENT_MESSAGE_DELTA, "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": usage},
+    )
+    assert sse.error("api_error", "boom ✗") == _frame(
+        "error", {"type": "error", "error": {"type": "api_error", "message": "boom ✗"}}
+    )
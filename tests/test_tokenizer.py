@@ -0,0 +1,42 @@
+"""Regression tests for the memoized token counts."""
+
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+tiktoken = pytest.importorskip("tiktoken")
+
+from src.core.config import config  # noqa: E402
+from src.core.tokenizer import TokenCounter  # noqa: E402
+from src.models.claude import ClaudeContentBlockToolUse  # noqa: E402
+
+
+@pytest.fixture
+def encoding():
+    """A byte-level encoding in which "-1" is a single token."""
+    ranks = {bytes([byte]): byte for byte in range(256)}
+    ranks[b"-1"] = 256
+    return tiktoken.Encoding(name="test", pat_str=r"\S+|\s+", mergeable_ranks=ranks, special_tokens={})
+
+
+def _tool_use(value):
+    return ClaudeContentBlockToolUse(type="tool_use", id="toolu_1", name="Read", input={"offset": value})
+
+
+def test_colliding_blocks_are_counted_separately(encoding):
+    """Blocks whose content hashes alike still get their own count."""
+    counter = TokenCounter(config)
+    for first, second in ((-1, -2), (1, True)):
+        expected = TokenCounter(config).count_block(_tool_use(second), encoding)
+        counter.count_block(_tool_use(first), encoding)
+        assert counter.count_block(_tool_use(second), encoding) == expected
+    assert counter.hits == 0
+
+
+def test_equal_blocks_are_memoized(encoding):
+    counter = TokenCounter(config)
+    tokens = counter.count_block(_tool_use(-1), encoding)
+    assert counter.count_block(_tool_use(-1), encoding) == tokens
+    assert counter.hits == 1